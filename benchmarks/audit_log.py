@@ -0,0 +1,72 @@
+"""Compares the latency of charging a subscription when the action is logged by the caller and when it is logged by
+the write-behind audit sink.
+
+Usage: python -m benchmarks.audit_log
+"""
+import functools
+import os
+import statistics
+import tempfile
+import time
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.core import api
+from gym_manager.core.base import String, Currency, Number, Subscription
+from gym_manager.core.security import (
+    SimpleSecurityHandler, Responsible, WriteBehindSecurityRepo, log_responsible, SecurityRepo)
+from gym_manager.migrations import migrate
+
+N_CHARGES = 300
+PROFILES = {
+    "default": {},
+    "wal": {"journal_mode": "wal", "synchronous": "normal"},
+}
+
+
+def _charge_latencies(security_repo: SecurityRepo) -> list[float]:
+    handler = SimpleSecurityHandler(security_repo, action_tags={"register_subscription_charge"},
+                                    needs_responsible={"register_subscription_charge"})
+    handler.add_responsible(Responsible(String("Admin"), String("code")))
+    handler.current_responsible = String("code")
+    log_responsible.config(handler)
+
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    subscription_repo = peewee.SqliteSubscriptionRepo()
+    client = client_repo.create(String("Name"), date(2022, 1, 1), date(2000, 1, 1), Number(1))
+    activity = activity_repo.create(String("Act"), Currency(100), String("Desc"))
+    subscription = Subscription(date(2022, 1, 1), client, activity)
+    subscription_repo.add(subscription)
+
+    latencies = []
+    for i in range(N_CHARGES):
+        create_transaction_fn = functools.partial(transaction_repo.create, "Cobro", date(2022, 1, 1), Currency(100),
+                                                  "Efectivo", String("Admin"), "Cobro", client)
+        start = time.perf_counter()
+        api.register_subscription_charge(subscription_repo, subscription, 2022, i % 12 + 1, create_transaction_fn)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    for profile_name, pragmas in PROFILES.items():
+        for sink in ("off", "on"):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                peewee.create_database(os.path.join(tmp_dir, "benchmark.db"), pragmas)
+                migrate()
+                security_repo = peewee.SqliteSecurityRepo()
+                if sink == "on":
+                    security_repo = WriteBehindSecurityRepo(security_repo)
+                latencies = _charge_latencies(security_repo)
+                if sink == "on":
+                    security_repo.close()
+                peewee.DATABASE_PROXY.close()
+
+            latencies.sort()
+            print(f"{profile_name:>7} profile, sink {sink:>3}: median {statistics.median(latencies) * 1000:.2f} ms, "
+                  f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
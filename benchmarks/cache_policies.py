@@ -0,0 +1,113 @@
+"""Compares the hit ratios of the "lru" and "2q" cache policies on the accesses to the transactions cache.
+
+The accesses are recorded while a scripted session runs against the real repositories: transactions are charged and
+listed at the desk, and from time to time the balance history of a past month is opened. The recorded trace is then
+replayed on caches of each policy. A trace saved as a json list of [phase, operation, key] can be replayed instead.
+
+Usage: python -m benchmarks.cache_policies [trace.json]
+"""
+import json
+import random
+import sys
+from datetime import date, timedelta
+
+from gym_manager import peewee
+from gym_manager.core.base import String, Number, Currency
+from gym_manager.core.persistence import LRUCache
+from gym_manager.migrations import migrate
+
+N_CLIENTS = 60
+HISTORY_DAYS = 120
+TRANSACTIONS_PER_DAY = 40
+SESSION_STEPS = 3_000
+REPORT_PROBABILITY = 0.01
+CACHE_LENS = (50, 128)
+
+
+class _RecordingCache(LRUCache):
+    """Records the keys looked up and stored. A value stored right after its lookup missed isn't recorded, because the
+    replay stores it after the miss.
+    """
+
+    def __init__(self, trace: list):
+        super().__init__(int, object, max_len=10 ** 6, check_types=False)
+        self.trace, self.phase, self._missed = trace, "desk", None
+
+    def get(self, key, default=None):
+        self.trace.append((self.phase, "get", key))
+        value = super().get(key, default)
+        self._missed = key if value is default else None
+        return value
+
+    def __setitem__(self, key, value):
+        if key != self._missed:
+            self.trace.append((self.phase, "set", key))
+        self._missed = None
+        super().__setitem__(key, value)
+
+
+def _record_trace() -> list:
+    peewee.create_database(":memory:")
+    migrate()
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    clients = [client_repo.create(String(f"Client {i}"), date(2020, 1, 1), date(2000, 1, 1), Number(i))
+               for i in range(N_CLIENTS)]
+
+    rnd, today = random.Random(7), date.today()
+    first_day = today - timedelta(days=HISTORY_DAYS)
+    for day in (first_day + timedelta(days=i) for i in range(HISTORY_DAYS)):
+        transactions = [transaction_repo.create("Cobro", day, Currency(100), "Efectivo", String("Admin"), "Cobro",
+                                                rnd.choice(clients)) for _ in range(TRANSACTIONS_PER_DAY)]
+        balance_repo.add(day, String("Admin"), transaction_repo.balance_summary(), transactions)
+
+    trace = []
+    transaction_repo.cache = cache = _RecordingCache(trace)
+    for _ in range(SESSION_STEPS):
+        if rnd.random() < REPORT_PROBABILITY:
+            cache.phase = "report"
+            month_start = first_day + timedelta(days=rnd.randrange(HISTORY_DAYS - 30))
+            for _ in balance_repo.all(month_start, month_start + timedelta(days=30)):
+                pass
+            cache.phase = "desk"
+        if rnd.random() < 0.1:
+            transaction_repo.create("Cobro", today, Currency(100), "Efectivo", String("Admin"), "Cobro",
+                                    rnd.choice(clients))
+        # The accounting view lists the transactions of the day that aren't in a balance yet, sometimes the older ones.
+        for _ in transaction_repo.all(page=1 if rnd.random() < 0.7 else 2, page_len=20):
+            pass
+    return trace
+
+
+def _replay(trace: list, policy: str, max_len: int) -> dict[str, float]:
+    cache = LRUCache(int, object, max_len, check_types=False, policy=policy)
+    hits, lookups = {}, {}
+    for phase, operation, key in trace:
+        if operation == "get":
+            lookups[phase] = lookups.get(phase, 0) + 1
+            if cache.get(key) is not None:
+                hits[phase] = hits.get(phase, 0) + 1
+            else:
+                cache[key] = key
+        else:
+            cache[key] = key
+    return {phase: hits.get(phase, 0) / lookups[phase] for phase in sorted(lookups)}
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as trace_file:
+            trace = [tuple(event) for event in json.load(trace_file)]
+    else:
+        trace = _record_trace()
+    print(f"{len(trace)} accesses")
+
+    for max_len in CACHE_LENS:
+        for policy in ("lru", "2q"):
+            ratios = ", ".join(f"{phase} {ratio:.1%}" for phase, ratio in _replay(trace, policy, max_len).items())
+            print(f"max_len {max_len:>4}, {policy:>3}: hit ratio {ratios}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Compares the latency of the client name search done with LIKE and with the full-text index, as the amount of clients
+grows.
+
+Usage: python -m benchmarks.client_search
+"""
+import random
+import string
+import timeit
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.migrations import migrate
+
+SIZES = (1_000, 10_000, 100_000)
+QUERIES = ("gonz", "gonzalez", "maria gon", "perez")
+# A few clients whose names are searched, among many others with random names.
+NAMES = ("María González", "Gonzalo Pérez", "Juan Gonzalez", "Ana Pérez")
+
+
+def _random_word(rnd: random.Random) -> str:
+    return "".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 9))).capitalize()
+
+
+def _fill(n_clients: int):
+    rnd = random.Random(n_clients)
+    rows = ((NAMES[i] if i < len(NAMES) else f"{_random_word(rnd)} {_random_word(rnd)}", date(2022, 1, 1),
+             date(2000, 1, 1), True) for i in range(n_clients))
+    with peewee.DATABASE_PROXY.atomic():
+        for batch in peewee.chunked(rows, 1024):
+            peewee.ClientTable.insert_many(batch, fields=[peewee.ClientTable.cli_name, peewee.ClientTable.admission,
+                                                          peewee.ClientTable.birth_day,
+                                                          peewee.ClientTable.is_active]).execute()
+
+
+def _page(predicate):
+    query = peewee.ClientTable.select().where(peewee.ClientTable.is_active, predicate)
+    return list(query.order_by(peewee.ClientTable.cli_name).paginate(1, 20))
+
+
+def main():
+    for n_clients in SIZES:
+        peewee.create_database(":memory:")
+        migrate()
+        _fill(n_clients)
+        for text in QUERIES:
+            like = timeit.timeit(lambda: _page(peewee.client_name_like(peewee.ClientTable, text)), number=20) / 20
+            match = timeit.timeit(lambda: _page(peewee.client_name_match(peewee.ClientTable, text)), number=20) / 20
+            print(f"{n_clients:>7} clients, '{text}': LIKE {like * 1000:.2f} ms, full-text {match * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
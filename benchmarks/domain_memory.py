@@ -0,0 +1,70 @@
+"""Measures the memory used by hydrated clients with five years of monthly charges.
+
+Clients are created with two subscriptions charged every month for five years, and are then hydrated by a fresh client
+repository, like after a start. The memory allocated while hydrating, measured with tracemalloc, is divided by the
+number of clients. The clients are kept alive by the repository cache, so nothing allocated is released before the
+measurement.
+
+Usage: python -m benchmarks.domain_memory
+"""
+import gc
+import tracemalloc
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.core.base import String, Currency
+from gym_manager.migrations import migrate
+
+N_CLIENTS = 50
+YEARS = 5
+ACTIVITIES = 2
+RESPONSIBLES = ("Admin", "Recepción", "Dueño")
+
+
+def _fill():
+    activity_repo = peewee.SqliteActivityRepo()
+    activities = [activity_repo.create(String(f"Activity {i}"), Currency(1000), String("Descr"))
+                  for i in range(ACTIVITIES)]
+    client_rows = [(f"Client {i}", date(2015, 1, 1), date(1990, 1, 1), True, i) for i in range(N_CLIENTS)]
+    peewee.ClientTable.insert_many(client_rows, fields=[peewee.ClientTable.cli_name, peewee.ClientTable.admission,
+                                                        peewee.ClientTable.birth_day, peewee.ClientTable.is_active,
+                                                        peewee.ClientTable.dni]).execute()
+    subscription_rows = [(date(2015, 1, 1), client_id, activity.id)
+                         for client_id in range(1, N_CLIENTS + 1) for activity in activities]
+    subscription_repo = peewee.SqliteSubscriptionRepo()
+    subscription_repo.add_all(subscription_rows)
+
+    charges = []
+    for client_id in range(1, N_CLIENTS + 1):
+        for activity in activities:
+            for month in range(YEARS * 12):
+                year = 2018 + month // 12
+                raw_transaction = ("Cobro", client_id, date(year, month % 12 + 1, 10), Currency(1000), "Efectivo",
+                                   RESPONSIBLES[month % len(RESPONSIBLES)], f"Cobro de {activity.name}", None)
+                charges.append((year, month % 12 + 1, client_id, activity.id, raw_transaction))
+    subscription_repo.import_charges(charges)
+
+
+def main():
+    peewee.create_database(":memory:")
+    migrate()
+    _fill()
+
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo(cache_len=0)
+    list(activity_repo.all())  # The activities are shared by all the clients, so they aren't measured.
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo, cache_len=N_CLIENTS)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    clients = list(client_repo.all())
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print(f"{len(clients)} clients, {YEARS * 12 * ACTIVITIES} charges each: {used / len(clients):,.0f} bytes per "
+          f"client")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compares loading a legacy MySQL dump into the staging database by reading it whole and running it as a script, with
+the streaming loader of gym_manager.parsing.
+
+Usage: python -m benchmarks.dump_ingestion
+"""
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from gym_manager.parsing import _create_temp_tables, transfer_backup
+
+N_PAYMENTS = 400_000
+ROWS_PER_INSERT = 1_000
+
+
+def _write_dump(dump_path: str):
+    with open(dump_path, 'w', encoding="utf-8") as dump:
+        for start in range(0, N_PAYMENTS, ROWS_PER_INSERT):
+            values = ",".join(f"('2022-{i % 12 + 1:02}-{i % 28 + 1:02}',{i},{i % 40},{i % 700}.50,'2022-01-01',1)"
+                              for i in range(start, start + ROWS_PER_INSERT))
+            dump.write(f"INSERT INTO `pago` VALUES {values};\n")
+
+
+def _whole_script(dump_path: str, conn: sqlite3.Connection):
+    with open(dump_path) as dump:
+        conn.executescript(dump.read().replace("`", ""))
+
+
+def _measure(load_fn, dump_path: str) -> tuple[float, int]:
+    conn = sqlite3.connect(":memory:")
+    _create_temp_tables(conn)
+    conn.execute("DROP TABLE pago")  # Without constraints, so the comparison is only about reading the dump.
+    conn.execute("CREATE TABLE pago (fecha date, id_cliente int, id_actividad int, importe float, fecha_cobro date, "
+                 "id_usuario int)")
+    tracemalloc.start()
+    start = time.perf_counter()
+    load_fn(dump_path, conn)
+    duration, peak = time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert conn.execute("SELECT count(*) FROM pago").fetchone()[0] == N_PAYMENTS
+    conn.close()
+    return duration, peak
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dump_path = os.path.join(tmp_dir, "dump.sql")
+        _write_dump(dump_path)
+        print(f"dump of {os.path.getsize(dump_path) / 2 ** 20:.1f} MiB")
+
+        loaders = {
+            "whole script": _whole_script,
+            "streaming": lambda path, conn: transfer_backup(path, conn, {"pago"}),
+        }
+        for name, load_fn in loaders.items():
+            duration, peak = _measure(load_fn, dump_path)
+            print(f"{name:>20}: {duration:.2f} s, peak python memory {peak / 2 ** 20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
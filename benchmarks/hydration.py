@@ -0,0 +1,83 @@
+"""Measures the hydration throughput of the repositories, in rows per second.
+
+First the validating constructors of the wrappers are compared with the trusted ones, used for the values read from the
+database. Then clients, transactions and contacts are listed by fresh repositories, so every row is hydrated.
+
+Usage: python -m benchmarks.hydration
+"""
+import timeit
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.contact.peewee import SqliteContactRepo
+from gym_manager.core.base import String, Number, Currency
+from gym_manager.migrations import migrate
+
+N_ROWS = 20_000
+REPEAT = 5
+
+
+def _rate(fn, n_rows: int) -> float:
+    return n_rows / min(timeit.repeat(fn, number=1, repeat=REPEAT))
+
+
+def _constructors():
+    names, dnis = [f"Client {i}" for i in range(N_ROWS)], list(range(N_ROWS))
+    rates = {
+        "String(name)": _rate(lambda: [String(name) for name in names], N_ROWS),
+        "String.trusted(name)": _rate(lambda: [String.trusted(name) for name in names], N_ROWS),
+        "Number(dni)": _rate(lambda: [Number(dni) for dni in dnis], N_ROWS),
+        "Number.trusted(dni)": _rate(lambda: [Number.trusted(dni) for dni in dnis], N_ROWS),
+        "Currency(cents / 100)": _rate(lambda: [Currency(dni / 100) for dni in dnis], N_ROWS),
+        "Currency.from_cents(cents)": _rate(lambda: [Currency.from_cents(dni) for dni in dnis], N_ROWS),
+    }
+    for name, rate in rates.items():
+        print(f"{name:>28}: {rate:>12,.0f} rows/s")
+
+
+def _fill():
+    client_rows = [(f"Client {i}", date(2015, 1, 1), date(1990, 1, 1), True, i) for i in range(N_ROWS)]
+    transaction_rows = [("Cobro", i + 1, date(2022, 1, 1), Currency(100), "Efectivo", "Admin", "Cobro")
+                        for i in range(N_ROWS)]
+    contact_rows = [(f"Contact {i}", "123456", "", "Street 123", "Descr", i + 1) for i in range(N_ROWS)]
+    with peewee.DATABASE_PROXY.atomic():
+        for batch in peewee.chunked(client_rows, 256):
+            peewee.ClientTable.insert_many(batch, fields=[
+                peewee.ClientTable.cli_name, peewee.ClientTable.admission, peewee.ClientTable.birth_day,
+                peewee.ClientTable.is_active, peewee.ClientTable.dni
+            ]).execute()
+    peewee.SqliteTransactionRepo().add_all(transaction_rows)
+    SqliteContactRepo().add_all(contact_rows)
+
+
+def _repositories():
+    peewee.create_database(":memory:")
+    migrate()
+    _fill()
+
+    def clients():
+        transaction_repo = peewee.SqliteTransactionRepo(cache_len=0)
+        client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo, cache_len=0)
+        for _ in client_repo.all():
+            pass
+
+    def transactions():
+        for _ in peewee.SqliteTransactionRepo(cache_len=0).all():
+            pass
+
+    def contacts():
+        for _ in SqliteContactRepo(cache_len=0).all():
+            pass
+
+    for name, fn in (("SqliteClientRepo.all", clients), ("SqliteTransactionRepo.all", transactions),
+                     ("SqliteContactRepo.all", contacts)):
+        print(f"{name:>28}: {_rate(fn, N_ROWS):>12,.0f} rows/s")
+
+
+def main():
+    _constructors()
+    _repositories()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Compares the latency of retrieving deep pages of the audit log with offsets and with keys.
+
+Usage: python -m benchmarks.pagination
+"""
+import timeit
+from datetime import datetime, timedelta
+
+from gym_manager import peewee
+from gym_manager.core.base import String
+from gym_manager.core.security import Responsible, SecurityRepo
+from gym_manager.migrations import migrate
+
+N_ACTIONS = 200_000
+PAGE_LEN = 20
+PAGES = (1, 100, 1_000, 9_000)
+
+
+def _fill():
+    security_repo = peewee.SqliteSecurityRepo()
+    security_repo.add_responsible(Responsible(String("Admin"), String("code")))
+    start = datetime(2020, 1, 1)
+    rows = ((start + timedelta(minutes=i), "code", "tag", f"Action {i}") for i in range(N_ACTIONS))
+    with peewee.DATABASE_PROXY.atomic():
+        for batch in peewee.chunked(rows, 1024):
+            peewee.ActionTable.insert_many(batch, fields=[peewee.ActionTable.when, peewee.ActionTable.responsible,
+                                                          peewee.ActionTable.action_tag,
+                                                          peewee.ActionTable.action_name]).execute()
+    return security_repo
+
+
+def main():
+    peewee.create_database(":memory:")
+    migrate()
+    security_repo = _fill()
+
+    for page in PAGES:
+        # Key of the last action of the previous page, as the PageIndex widget would have kept it.
+        previous = list(security_repo.actions(page - 1, PAGE_LEN)) if page > 1 else []
+        after = SecurityRepo.page_key(previous[-1]) if len(previous) > 0 else None
+
+        offset = timeit.timeit(lambda: list(security_repo.actions(page, PAGE_LEN)), number=20) / 20
+        key = timeit.timeit(lambda: list(security_repo.actions(page, PAGE_LEN, after=after)), number=20) / 20
+        print(f"page {page:>5}: offset {offset * 1000:.2f} ms, key {key * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
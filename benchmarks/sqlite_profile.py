@@ -0,0 +1,77 @@
+"""Measures write latency and read/write concurrency of the database under different connection profiles.
+
+Usage: python -m benchmarks.sqlite_profile [n_writes]
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.core.base import Currency, String
+
+PROFILES = {
+    "rollback journal": {},
+    "wal": {"journal_mode": "wal", "synchronous": "normal"},
+}
+
+
+def _config_profile() -> dict | None:
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.json")
+    with open(config_path) as config_file:
+        return json.load(config_file).get("sqlite_pragmas")
+
+
+def _run(pragmas: dict, n_writes: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        peewee.create_database(os.path.join(tmp_dir, "bench.db"), pragmas)
+        transaction_repo = peewee.SqliteTransactionRepo()
+        peewee.SqliteBalanceRepo(transaction_repo)
+        peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo)  # Creates the referenced tables.
+
+        stop, reads = threading.Event(), [0]
+
+        def reader():
+            while not stop.is_set():
+                peewee.TransactionTable.select().where(peewee.TransactionTable.balance.is_null()).count()
+                reads[0] += 1
+            peewee.DATABASE_PROXY.close()
+
+        reader_thread = threading.Thread(target=reader)
+        reader_thread.start()
+
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(n_writes):
+            write_start = time.perf_counter()
+            transaction_repo.create("Cobro", date.today(), Currency(100), "Efectivo", String("Admin"), "bench")
+            latencies.append(time.perf_counter() - write_start)
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        reader_thread.join()
+        peewee.DATABASE_PROXY.close()
+
+    return {"mean_write_ms": statistics.mean(latencies) * 1000,
+            "p95_write_ms": sorted(latencies)[int(len(latencies) * 0.95)] * 1000,
+            "concurrent_reads_per_s": reads[0] / elapsed}
+
+
+def main(n_writes: int = 500):
+    profiles = dict(PROFILES)
+    config_profile = _config_profile()
+    if config_profile is not None:
+        profiles["config.json"] = config_profile
+
+    for name, pragmas in profiles.items():
+        result = _run(pragmas, n_writes)
+        print(f"{name:>18}: mean write {result['mean_write_ms']:.3f} ms, p95 write {result['p95_write_ms']:.3f} ms, "
+              f"{result['concurrent_reads_per_s']:.0f} concurrent reads/s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,166 @@
+"""Hot/cold storage of the tables that only grow.
+
+Old transactions, subscription charges, actions and cancellations, and the inactive clients that are no longer
+referenced, are moved into an archive database that is ATTACHed to the main one. The main database keeps only the
+recent rows, so it stays small, fast to back up and cached in memory. The repositories read the archive only when the
+requested dates are older than the archive horizon.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import date, datetime, time
+
+from peewee import Model, IntegerField, DateField, Tuple, Field, Expression, OP, fn
+
+from gym_manager import peewee
+from gym_manager.booking.peewee import BookingTable, FixedBookingTable, CancelledLog, ArchivedCancelledLog
+from gym_manager.contact.peewee import ContactModel
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.peewee import (
+    DATABASE_PROXY, ARCHIVE_SCHEMA, ClientTable, TransactionTable, SubscriptionTable, SubscriptionCharge, ActionTable,
+    ArchivedClientTable, ArchivedTransactionTable, ArchivedSubscriptionCharge, ArchivedActionTable)
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveInfo(Model):
+    id = IntegerField(primary_key=True)
+    horizon = DateField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        schema = ARCHIVE_SCHEMA
+
+
+ARCHIVE_MODELS = (ArchiveInfo, ArchivedClientTable, ArchivedTransactionTable, ArchivedSubscriptionCharge,
+                  ArchivedActionTable, ArchivedCancelledLog)
+
+
+def attach(archive_path: str):
+    """Attaches the archive database, creating it if it doesn't exist, and makes the repositories read from it.
+    """
+    DATABASE_PROXY.attach(archive_path, ARCHIVE_SCHEMA)
+    DATABASE_PROXY.create_tables(ARCHIVE_MODELS)
+    info = ArchiveInfo.get_or_none()
+    # A fresh archive is empty, but it is still attached, so the horizon set by the first archive() call is used.
+    peewee.set_archive_horizon(date.min if info is None else info.horizon)
+    logger.info(f"Attached archive '{archive_path}' [horizon={peewee.archive_horizon()}].")
+
+
+def _field_pairs(model: type[Model], archived_model: type[Model]) -> list[tuple[Field, Field]]:
+    """Returns each field of *model* along with the field of *archived_model* that stores the same column.
+    """
+    return [(field, archived_model._meta.fields[field.name] if field.name in archived_model._meta.fields
+             else archived_model._meta.fields[field.column_name]) for field in model._meta.sorted_fields]
+
+
+def _archived(model: type[Model], archived_model: type[Model]):
+    """Returns a condition that holds for the rows of *model* that are in *archived_model* with the same values in every
+    column, not only with the same id.
+    """
+    # IS compares the nullable columns too, but the ids are compared with == so the lookup uses the primary key.
+    same_values = [Expression(field, OP.IS, archived_field) for field, archived_field in
+                   _field_pairs(model, archived_model) if not field.primary_key]
+    return fn.EXISTS(archived_model.select(archived_model.id).where(archived_model.id == model.id, *same_values))
+
+
+def _copy(model: type[Model], archived_model: type[Model], condition):
+    """Copies the rows of *model* that satisfy *condition* into *archived_model*. Rows that already were in the archive
+    are left as they are.
+
+    Raises:
+        PersistenceError if a row has the id of an archived row with different values.
+    """
+    conflicts = model.select(model.id).where(condition, model.id.in_(archived_model.select(archived_model.id)),
+                                             ~_archived(model, archived_model))
+    conflicting_ids = [id_ for id_, in conflicts.limit(10).tuples()]
+    if len(conflicting_ids) > 0:
+        raise PersistenceError(f"The rows [ids={conflicting_ids}] of '{model._meta.table_name}' can't be archived, "
+                               f"because there are other archived rows with the same ids.")
+
+    fields = [archived_field for _, archived_field in _field_pairs(model, archived_model)]
+    archived_model.insert_from(model.select().where(condition), fields).on_conflict_ignore().execute()
+
+
+def _delete(model: type[Model], archived_model: type[Model], condition) -> int:
+    """Deletes the rows of *model* that satisfy *condition* and that already are in *archived_model*.
+    """
+    return model.delete().where(condition, _archived(model, archived_model)).execute()
+
+
+def archive(horizon: date) -> dict[str, int]:
+    """Moves to the archive the rows older than *horizon*. The archive must be attached.
+
+    - Transactions bound to a balance older than *horizon*, unless a booking or a charge of the month of *horizon* (or
+    a later one) references them. Their subscription charges are moved with them.
+    - Actions and cancellations done before *horizon*.
+    - Inactive clients that aren't referenced by any hot row.
+
+    In WAL mode sqlite doesn't commit atomically across attached databases, so the rows are moved in two database
+    transactions. The first one copies them into the archive and is committed. The second one deletes from the main
+    database only the rows that are now in the archive, and advances the horizon. A crash between both leaves the rows
+    in both databases, and the next call removes them from the main one.
+
+    Returns:
+        The number of rows moved out of each table.
+
+    Raises:
+        PersistenceError if there is no archive attached.
+    """
+    if peewee.archive_horizon() is None:
+        raise PersistenceError("There is no archive attached.")
+
+    horizon_datetime = datetime.combine(horizon, time.min)
+    kept_charges = SubscriptionCharge.select(SubscriptionCharge.transaction).where(
+        Tuple(SubscriptionCharge.year, SubscriptionCharge.month) >= Tuple(horizon.year, horizon.month)
+    )
+    moved_transactions = TransactionTable.select(TransactionTable.id).where(
+        TransactionTable.balance < horizon,
+        TransactionTable.id.not_in(BookingTable.select(BookingTable.transaction)
+                                   .where(BookingTable.transaction.is_null(False))),
+        TransactionTable.id.not_in(FixedBookingTable.select(FixedBookingTable.transaction)
+                                   .where(FixedBookingTable.transaction.is_null(False))),
+        TransactionTable.id.not_in(kept_charges)
+    )
+    charges_condition = SubscriptionCharge.transaction.in_(moved_transactions)
+    transactions_condition = TransactionTable.id.in_(moved_transactions)
+    actions_condition = ActionTable.when < horizon_datetime
+    cancellations_condition = CancelledLog.cancel_datetime < horizon_datetime
+
+    def unreferenced_clients(ignore_moved: bool):
+        transactions = TransactionTable.select(TransactionTable.client).where(TransactionTable.client.is_null(False))
+        charges = SubscriptionCharge.select(SubscriptionCharge.client)
+        if ignore_moved:
+            # Before the deletion, the transactions and charges being moved still reference their clients.
+            transactions, charges = transactions.where(~transactions_condition), charges.where(~charges_condition)
+        referenced_clients = (
+            transactions
+            | SubscriptionTable.select(SubscriptionTable.client)
+            | charges
+            | ContactModel.select(ContactModel.client).where(ContactModel.client.is_null(False))
+        )
+        return ~ClientTable.is_active & ClientTable.id.not_in(referenced_clients)
+
+    with DATABASE_PROXY.atomic():
+        _copy(SubscriptionCharge, ArchivedSubscriptionCharge, charges_condition)
+        _copy(TransactionTable, ArchivedTransactionTable, transactions_condition)
+        _copy(ActionTable, ArchivedActionTable, actions_condition)
+        _copy(CancelledLog, ArchivedCancelledLog, cancellations_condition)
+        _copy(ClientTable, ArchivedClientTable, unreferenced_clients(ignore_moved=True))
+
+    moved = {}
+    with DATABASE_PROXY.atomic():
+        # Charges are deleted first, because they reference the transactions.
+        moved["subscription_charges"] = _delete(SubscriptionCharge, ArchivedSubscriptionCharge, charges_condition)
+        moved["transactions"] = _delete(TransactionTable, ArchivedTransactionTable, transactions_condition)
+        moved["actions"] = _delete(ActionTable, ArchivedActionTable, actions_condition)
+        moved["cancellations"] = _delete(CancelledLog, ArchivedCancelledLog, cancellations_condition)
+        moved["clients"] = _delete(ClientTable, ArchivedClientTable, unreferenced_clients(ignore_moved=False))
+
+        # The horizon never goes back, otherwise the rows archived with a later horizon wouldn't be read.
+        horizon = max(horizon, peewee.archive_horizon())
+        ArchiveInfo.replace(id=1, horizon=horizon).execute()
+
+    peewee.set_archive_horizon(horizon)
+    logger.info(f"Archived rows older than [horizon={horizon}] {moved}.")
+    return moved
@@ -0,0 +1,400 @@
+"""Online, compressed backups of the sqlite database.
+
+Backups are taken with the sqlite backup API, so they are consistent even if the database is being written, and are
+compressed with zstandard. They can be stored as a single file, or as a snapshot in a ChunkStore, that stores once each
+chunk of the database shared between snapshots.
+
+Usage:
+    python -m gym_manager.backup backup <database_path> <backup_dir>
+    python -m gym_manager.backup restore <backup_path> <database_path>
+    python -m gym_manager.backup snapshot <database_path> <store_dir>
+    python -m gym_manager.backup snapshots <store_dir>
+    python -m gym_manager.backup restore-snapshot <store_dir> <name> <database_path>
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from datetime import date, datetime
+from typing import Callable
+
+import zstandard
+
+from gym_manager.core.persistence import PersistenceError
+
+logger = logging.getLogger(__name__)
+
+BACKUP_SUFFIX = ".db.zst"
+
+
+@dataclasses.dataclass(frozen=True)
+class BackupStats:
+    """Stats of a backup. *database_size* is the size of the backed up database, and *backup_size* the amount of bytes
+    written to store the backup.
+    """
+    path: str
+    database_size: int
+    backup_size: int
+    duration: float
+
+    @property
+    def throughput(self) -> float:
+        """Bytes of the database backed up per second.
+        """
+        return self.database_size / self.duration if self.duration > 0 else float("inf")
+
+
+def _remove_if_exists(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _snapshot(database_path: str, snapshot_path: str, pages_per_step: int, step_sleep: float) -> int:
+    """Copies the database into *snapshot_path* with the sqlite backup API, and returns the size of the copy.
+    """
+    source, snapshot = sqlite3.connect(database_path), sqlite3.connect(snapshot_path)
+    try:
+        source.backup(snapshot, pages=pages_per_step, sleep=step_sleep)
+        return snapshot.execute("PRAGMA page_count").fetchone()[0] * snapshot.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        snapshot.close()
+        source.close()
+
+
+def _replace_verified(restored_path: str, database_path: str, source: str):
+    """Checks the integrity of the database in *restored_path*, and then uses it to replace the one in *database_path*.
+
+    Raises:
+        PersistenceError if the restored database doesn't pass the integrity check.
+    """
+    restored = sqlite3.connect(restored_path)
+    try:
+        result = [row[0] for row in restored.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as error:
+        raise PersistenceError(f"The backup '{source}' isn't a valid database.") from error
+    finally:
+        restored.close()
+    if result != ["ok"]:
+        raise PersistenceError(f"The backup '{source}' failed the integrity check: {result}.")
+
+    # A write-ahead log left by the replaced database would be applied over the restored one.
+    for suffix in ("-wal", "-shm"):
+        _remove_if_exists(database_path + suffix)
+    os.replace(restored_path, database_path)
+
+
+def create_backup(
+        database_path: str, backup_dir: str, pages_per_step: int = 1024, step_sleep: float = 0.01,
+        compression_level: int = 3
+) -> BackupStats:
+    """Creates a compressed backup of the database in *backup_dir*. The backup has the date in its name, so a backup
+    done in the same day replaces the previous one.
+
+    The database is copied *pages_per_step* pages at a time, sleeping *step_sleep* seconds between steps, so other
+    connections aren't blocked while the backup is done. The copy is done with its own connection, so this function can
+    be called from any thread.
+
+    Args:
+        database_path: path of the database to back up.
+        backup_dir: directory where the backup is stored.
+        pages_per_step: pages copied in each step.
+        step_sleep: seconds slept between steps.
+        compression_level: zstandard compression level.
+
+    Returns:
+        The stats of the created backup.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    dst = os.path.join(backup_dir, f"backup_{date.today().strftime('%Y_%m_%d')}{BACKUP_SUFFIX}")
+    snapshot_path, compressed_path = dst + ".snapshot", dst + ".tmp"
+
+    start = time.perf_counter()
+    try:
+        database_size = _snapshot(database_path, snapshot_path, pages_per_step, step_sleep)
+
+        compressor = zstandard.ZstdCompressor(level=compression_level, write_checksum=True)
+        with open(snapshot_path, 'rb') as snapshot_file, open(compressed_path, 'wb') as compressed_file:
+            compressor.copy_stream(snapshot_file, compressed_file)
+        # The previous backup is replaced only after the new one was fully written.
+        os.replace(compressed_path, dst)
+    finally:
+        _remove_if_exists(snapshot_path)
+        _remove_if_exists(compressed_path)
+
+    stats = BackupStats(dst, database_size, os.path.getsize(dst), time.perf_counter() - start)
+    logger.info(f"Created backup on {dst} [database_size={stats.database_size}, backup_size={stats.backup_size}, "
+                f"duration={stats.duration:.3f}s, throughput={stats.throughput / 2 ** 20:.2f}MiB/s].")
+    return stats
+
+
+def restore_backup(backup_path: str, database_path: str):
+    """Replaces the database with the one in the backup. The application must not be using the database.
+
+    The backup is decompressed next to the database and its integrity is checked before replacing the database, so a
+    damaged backup leaves the database untouched.
+
+    Args:
+        backup_path: path of the compressed backup.
+        database_path: path of the database to replace.
+
+    Raises:
+        PersistenceError if the backup can't be read or doesn't pass the integrity check.
+    """
+    restored_path = database_path + ".restore"
+    try:
+        try:
+            with open(backup_path, 'rb') as backup_file, open(restored_path, 'wb') as restored_file:
+                zstandard.ZstdDecompressor().copy_stream(backup_file, restored_file)
+        except zstandard.ZstdError as error:
+            raise PersistenceError(f"The backup '{backup_path}' can't be decompressed.") from error
+
+        _replace_verified(restored_path, database_path, backup_path)
+    finally:
+        _remove_if_exists(restored_path)
+
+    logger.info(f"Restored database {database_path} from backup {backup_path}.")
+
+
+@dataclasses.dataclass(frozen=True)
+class Snapshot:
+    name: str
+    created: datetime
+    size: int
+    chunks: tuple[str, ...]
+
+
+def _keep_newest_by(snapshots: list[Snapshot], period: Callable[[datetime], tuple], count: int) -> set[str]:
+    """Returns the names of the newest snapshot of each one of the *count* newest periods. *snapshots* must be sorted
+    from the newest to the oldest.
+    """
+    kept, periods = set(), set()
+    for snapshot in snapshots:
+        key = period(snapshot.created)
+        if key not in periods:
+            if len(periods) == count:
+                break
+            periods.add(key)
+            kept.add(snapshot.name)
+    return kept
+
+
+class ChunkStore:
+    """Stores database snapshots split in chunks. Each chunk is identified by the hash of its content, and it is
+    compressed and stored once, no matter how many snapshots include it. Each snapshot has a manifest, with the list of
+    its chunks. So the storage grows with the amount of chunks that change between snapshots, and not with the size of
+    the database times the amount of snapshots.
+
+    Chunks are written before the manifest that references them, and manifests are removed before their chunks, so an
+    interrupted backup or prune never leaves a snapshot with missing chunks.
+    """
+
+    def __init__(self, store_dir: str, chunk_len: int = 64 * 1024, compression_level: int = 3):
+        """Init method.
+
+        Args:
+            store_dir: directory of the store.
+            chunk_len: size of the chunks. It should be a multiple of the database page size, so a page change
+                affects only one chunk.
+            compression_level: zstandard compression level of the chunks.
+        """
+        self.store_dir = store_dir
+        self.chunk_len = chunk_len
+        self._chunks_dir = os.path.join(store_dir, "chunks")
+        self._manifests_dir = os.path.join(store_dir, "manifests")
+        self._compressor = zstandard.ZstdCompressor(level=compression_level, write_checksum=True)
+        os.makedirs(self._chunks_dir, exist_ok=True)
+        os.makedirs(self._manifests_dir, exist_ok=True)
+
+    def _chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self._chunks_dir, chunk_hash[:2], chunk_hash + ".zst")
+
+    def _manifest_path(self, name: str) -> str:
+        return os.path.join(self._manifests_dir, name + ".json")
+
+    def _new_name(self, when: datetime) -> str:
+        """Returns the name of a new snapshot created at *when*. Names have second precision, so a counter is appended
+        to the name of a snapshot created in the same second as an existing one, instead of overwriting it.
+        """
+        name = when.strftime("%Y_%m_%d_%H%M%S")
+        candidate, n = name, 1
+        while os.path.exists(self._manifest_path(candidate)):
+            candidate, n = f"{name}_{n}", n + 1
+        return candidate
+
+    def _put_chunk(self, chunk: bytes) -> tuple[str, int]:
+        """Stores the *chunk* if it isn't already stored. Returns its hash and the bytes written to store it.
+        """
+        chunk_hash = hashlib.blake2b(chunk, digest_size=20).hexdigest()
+        path = self._chunk_path(chunk_hash)
+        if os.path.exists(path):
+            return chunk_hash, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = self._compressor.compress(chunk)
+        with open(path + ".tmp", 'wb') as chunk_file:
+            chunk_file.write(compressed)
+        os.replace(path + ".tmp", path)
+        return chunk_hash, len(compressed)
+
+    def backup(
+            self, database_path: str, when: datetime | None = None, pages_per_step: int = 1024,
+            step_sleep: float = 0.01
+    ) -> BackupStats:
+        """Stores a snapshot of the database. The snapshot is taken the same way as in create_backup().
+
+        Args:
+            database_path: path of the database to back up.
+            when: creation datetime of the snapshot. If None, now is used.
+            pages_per_step: pages copied in each step.
+            step_sleep: seconds slept between steps.
+
+        Returns:
+            The stats of the snapshot. Its *backup_size* is the size of the chunks that weren't already stored.
+        """
+        when = datetime.now() if when is None else when
+        name = self._new_name(when)
+        snapshot_path = os.path.join(self.store_dir, name + ".snapshot")
+
+        start, written, chunks = time.perf_counter(), 0, []
+        try:
+            database_size = _snapshot(database_path, snapshot_path, pages_per_step, step_sleep)
+            with open(snapshot_path, 'rb') as snapshot_file:
+                while chunk := snapshot_file.read(self.chunk_len):
+                    chunk_hash, chunk_written = self._put_chunk(chunk)
+                    chunks.append(chunk_hash)
+                    written += chunk_written
+        finally:
+            _remove_if_exists(snapshot_path)
+
+        manifest_path = self._manifest_path(name)
+        with open(manifest_path + ".tmp", 'w') as manifest_file:
+            json.dump({"name": name, "created": when.isoformat(), "size": database_size, "chunks": chunks},
+                      manifest_file)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+        stats = BackupStats(manifest_path, database_size, written, time.perf_counter() - start)
+        logger.info(f"Stored snapshot {name} in {self.store_dir} [database_size={stats.database_size}, new_chunks_size="
+                    f"{stats.backup_size}, duration={stats.duration:.3f}s, throughput="
+                    f"{stats.throughput / 2 ** 20:.2f}MiB/s].")
+        return stats
+
+    def snapshots(self) -> list[Snapshot]:
+        """Returns the stored snapshots, from the newest to the oldest.
+        """
+        snapshots = []
+        for manifest_name in os.listdir(self._manifests_dir):
+            if manifest_name.endswith(".json"):
+                with open(os.path.join(self._manifests_dir, manifest_name)) as manifest_file:
+                    manifest = json.load(manifest_file)
+                snapshots.append(Snapshot(manifest["name"], datetime.fromisoformat(manifest["created"]),
+                                          manifest["size"], tuple(manifest["chunks"])))
+        return sorted(snapshots, key=lambda snapshot: (snapshot.created, snapshot.name), reverse=True)
+
+    def restore(self, name: str, database_path: str):
+        """Replaces the database with the snapshot *name*. The application must not be using the database.
+
+        Raises:
+            KeyError if there is no snapshot with the given *name*.
+            PersistenceError if a chunk of the snapshot is missing or damaged, or if the restored database doesn't pass
+                the integrity check. In those cases the database is left untouched.
+        """
+        snapshot = next((snapshot for snapshot in self.snapshots() if snapshot.name == name), None)
+        if snapshot is None:
+            raise KeyError(f"There is no snapshot [name={name}] in the store '{self.store_dir}'.")
+
+        restored_path = database_path + ".restore"
+        decompressor = zstandard.ZstdDecompressor()
+        try:
+            with open(restored_path, 'wb') as restored_file:
+                for chunk_hash in snapshot.chunks:
+                    try:
+                        with open(self._chunk_path(chunk_hash), 'rb') as chunk_file:
+                            chunk = decompressor.decompress(chunk_file.read())
+                    except (OSError, zstandard.ZstdError) as error:
+                        raise PersistenceError(f"The chunk {chunk_hash} of the snapshot {name} can't be read.") from error
+                    if hashlib.blake2b(chunk, digest_size=20).hexdigest() != chunk_hash:
+                        raise PersistenceError(f"The chunk {chunk_hash} of the snapshot {name} is damaged.")
+                    restored_file.write(chunk)
+            _replace_verified(restored_path, database_path, name)
+        finally:
+            _remove_if_exists(restored_path)
+
+        logger.info(f"Restored database {database_path} from snapshot {name} of {self.store_dir}.")
+
+    def prune(self, daily: int = 7, weekly: int = 4, monthly: int = 12) -> list[str]:
+        """Removes the snapshots that aren't kept by the retention rules, and the chunks that are no longer used.
+
+        The newest snapshot of each one of the last *daily* days, *weekly* weeks and *monthly* months with snapshots is
+        kept. The newest snapshot is always kept.
+
+        Returns:
+            The names of the removed snapshots.
+        """
+        snapshots = self.snapshots()
+        kept = (_keep_newest_by(snapshots, lambda created: (created.date(),), daily)
+                | _keep_newest_by(snapshots, lambda created: created.isocalendar()[:2], weekly)
+                | _keep_newest_by(snapshots, lambda created: (created.year, created.month), monthly)
+                | _keep_newest_by(snapshots, lambda created: (), 1))
+
+        removed = [snapshot.name for snapshot in snapshots if snapshot.name not in kept]
+        for name in removed:
+            os.remove(self._manifest_path(name))
+
+        used = {chunk_hash for snapshot in snapshots if snapshot.name in kept for chunk_hash in snapshot.chunks}
+        for chunk_dir in os.listdir(self._chunks_dir):
+            for chunk_name in os.listdir(os.path.join(self._chunks_dir, chunk_dir)):
+                if chunk_name.removesuffix(".zst") not in used:
+                    os.remove(os.path.join(self._chunks_dir, chunk_dir, chunk_name))
+
+        logger.info(f"Pruned snapshots {removed} of {self.store_dir}.")
+        return removed
+
+
+def main(args: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m gym_manager.backup", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backup_parser = subparsers.add_parser("backup", help="creates a compressed backup of the database")
+    backup_parser.add_argument("database_path")
+    backup_parser.add_argument("backup_dir")
+    restore_parser = subparsers.add_parser("restore", help="replaces the database with a verified backup")
+    restore_parser.add_argument("backup_path")
+    restore_parser.add_argument("database_path")
+    snapshot_parser = subparsers.add_parser("snapshot", help="stores a snapshot of the database in a chunk store")
+    snapshot_parser.add_argument("database_path")
+    snapshot_parser.add_argument("store_dir")
+    snapshots_parser = subparsers.add_parser("snapshots", help="lists the snapshots of a chunk store")
+    snapshots_parser.add_argument("store_dir")
+    restore_snapshot_parser = subparsers.add_parser("restore-snapshot",
+                                                    help="replaces the database with a verified snapshot")
+    restore_snapshot_parser.add_argument("store_dir")
+    restore_snapshot_parser.add_argument("name")
+    restore_snapshot_parser.add_argument("database_path")
+    parsed = parser.parse_args(args)
+
+    if parsed.command == "backup":
+        stats = create_backup(parsed.database_path, parsed.backup_dir)
+        print(f"{stats.path}: {stats.database_size} bytes compressed to {stats.backup_size} bytes in "
+              f"{stats.duration:.3f}s ({stats.throughput / 2 ** 20:.2f} MiB/s).")
+    elif parsed.command == "restore":
+        restore_backup(parsed.backup_path, parsed.database_path)
+        print(f"{parsed.database_path} restored from {parsed.backup_path}.")
+    elif parsed.command == "snapshot":
+        stats = ChunkStore(parsed.store_dir).backup(parsed.database_path)
+        print(f"{stats.path}: {stats.database_size} bytes stored with {stats.backup_size} bytes of new chunks in "
+              f"{stats.duration:.3f}s ({stats.throughput / 2 ** 20:.2f} MiB/s).")
+    elif parsed.command == "snapshots":
+        for snapshot in ChunkStore(parsed.store_dir).snapshots():
+            print(f"{snapshot.name}: {snapshot.size} bytes, {len(snapshot.chunks)} chunks.")
+    else:
+        ChunkStore(parsed.store_dir).restore(parsed.name, parsed.database_path)
+        print(f"{parsed.database_path} restored from snapshot {parsed.name}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,8 @@ from typing import Iterable, Generator, TypeAlias
 
 from gym_manager.core.api import CreateTransactionFn
 from gym_manager.core.base import Client, Activity, Transaction, OperationalError, String, Currency
-from gym_manager.core.persistence import FilterValuePair, ActivityRepo
+from gym_manager.core.events import domain_events, ActivityUpdated
+from gym_manager.core.persistence import FilterValuePair, PageKey
 from gym_manager.core.security import log_responsible
 
 BOOKING_TO_HAPPEN, BOOKING_CANCELLED, BOOKING_PAID = "To happen", "Cancelled", "Paid"
@@ -356,6 +357,9 @@ class BookingSystem:
         self.repo = repo
         self.fixed_booking_handler = FixedBookingHandler(self._courts.keys(), self.repo.all_fixed())
 
+        # The prices charged follow the changes done to the activities of the courts.
+        domain_events.subscribe(ActivityUpdated, self._on_activity_updated)
+
     @property
     def court_names(self) -> Iterable[str]:
         return self._courts.keys()
@@ -512,9 +516,10 @@ class BookingSystem:
 
         return booking
 
-    def update_prices(self, activity_repo: ActivityRepo):
+    def _on_activity_updated(self, event: ActivityUpdated):
         for court, activity in self._courts.items():
-            self._courts[court] = activity_repo.get(activity.id)
+            if activity.id == event.activity.id:
+                self._courts[court] = event.activity
 
 
 class BookingRepo(abc.ABC):
@@ -549,6 +554,21 @@ class BookingRepo(abc.ABC):
 
     @abc.abstractmethod
     def cancelled(
-            self, page: int = 1, page_len: int = 10, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int = 10, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Cancellation, None, None]:
+        """Retrieves the cancellations, from the newest to the oldest.
+
+        Args:
+            page: page to retrieve.
+            page_len: cancellations per page.
+            filters: filters to apply.
+            after: if given, retrieve the page that follows the cancellation with this key, instead of *page*.
+        """
         raise NotImplementedError
+
+    @staticmethod
+    def cancelled_page_key(cancellation: Cancellation) -> PageKey:
+        """Returns the key of *cancellation* in the listing done by cancelled().
+        """
+        return cancellation.cancel_datetime, cancellation.number
@@ -9,11 +9,11 @@ from peewee import (
 from playhouse.sqlite_ext import JSONField
 
 from gym_manager import peewee
-from gym_manager.booking.core import TempBooking, BookingRepo, Booking, FixedBooking, Cancellation
+from gym_manager.booking.core import TempBooking, BookingRepo, Booking, FixedBooking, Cancellation, ONE_DAY_TD
 from gym_manager.core.base import Transaction, String
 from gym_manager.core.persistence import (
     TransactionRepo, FilterValuePair, PersistenceError,
-    LRUCache)
+    LRUCache, PageKey, CacheBudget)
 from gym_manager.peewee import TransactionTable
 
 logger = logging.getLogger(__name__)
@@ -73,6 +73,27 @@ class CancelledLog(Model):
         database = peewee.DATABASE_PROXY
 
 
+class ArchivedCancelledLog(Model):
+    """Cancellations moved to the archive database.
+    """
+    id = IntegerField(primary_key=True)
+    cancel_datetime = DateTimeField()
+    responsible = CharField()
+    client_name = CharField()
+    when = DateField(null=True)
+    court = CharField()
+    start = TimeField()
+    end = TimeField()
+    is_fixed = BooleanField()
+    definitely_cancelled = BooleanField()
+
+    class Meta:
+        database = peewee.DATABASE_PROXY
+        schema = peewee.ARCHIVE_SCHEMA
+        table_name = "cancelledlog"
+        indexes = ((("cancel_datetime", "id"), False),)
+
+
 @dataclasses.dataclass(frozen=True)
 class TempBookingKey:
     when: datetime
@@ -88,14 +109,19 @@ class FixedBookingKey:
 
 class SqliteBookingRepo(BookingRepo):
 
-    def __init__(self, transaction_repo: TransactionRepo, cache_len: int) -> None:
+    def __init__(
+            self, transaction_repo: TransactionRepo, cache_len: int, cache_budget: CacheBudget | None = None
+    ) -> None:
         peewee.DATABASE_PROXY.create_tables([BookingTable, FixedBookingTable, CancelledLog])
 
         self.transaction_repo = transaction_repo
 
-        self.temp_booking_cache = LRUCache(TempBookingKey, TempBooking, max_len=cache_len)
-        self.fixed_booking_cache = LRUCache(FixedBookingKey, FixedBooking, max_len=cache_len)
-        self.cancellation_cache = LRUCache(int, Cancellation, max_len=int(cache_len / 2))
+        self.temp_booking_cache = LRUCache(TempBookingKey, TempBooking, max_len=cache_len, name="temp_bookings",
+                                           check_types=False, budget=cache_budget, shared_types=(Transaction,))
+        self.fixed_booking_cache = LRUCache(FixedBookingKey, FixedBooking, max_len=cache_len, name="fixed_bookings",
+                                            check_types=False, budget=cache_budget, shared_types=(Transaction,))
+        self.cancellation_cache = LRUCache(int, Cancellation, max_len=int(cache_len / 2), name="cancellations",
+                                           check_types=False, budget=cache_budget)
 
     def add(self, booking: Booking):
         # In both cases, Booking.transaction is ignored, because its supposed that a newly added booking won't have an
@@ -159,7 +185,8 @@ class SqliteBookingRepo(BookingRepo):
     def log_cancellation(
             self, cancel_datetime: datetime, responsible: String, booking: Booking, definitely_cancelled: bool
     ):
-        record = CancelledLog.create(cancel_datetime=cancel_datetime, responsible=responsible.as_primitive(),
+        record = CancelledLog.create(id=peewee.next_id(CancelledLog, ArchivedCancelledLog),
+                                     cancel_datetime=cancel_datetime, responsible=responsible.as_primitive(),
                                      client_name=booking.client_name, when=booking.when, court=booking.court,
                                      start=booking.start, end=booking.end, is_fixed=booking.is_fixed,
                                      definitely_cancelled=definitely_cancelled)
@@ -173,10 +200,9 @@ class SqliteBookingRepo(BookingRepo):
         bookings_q = BookingTable.select()
 
         if when is not None:
-            year, month, day = when.year, when.month, when.day
-            # noinspection PyPropertyAccess
-            bookings_q = bookings_q.where(year == BookingTable.when.year, month == BookingTable.when.month,
-                                          day == BookingTable.when.day)
+            # A range over the datetime is used instead of comparing its date parts, so the primary key index is used.
+            day_start = datetime.combine(when, time.min)
+            bookings_q = bookings_q.where(BookingTable.when >= day_start, BookingTable.when < day_start + ONE_DAY_TD)
 
         if court is not None:
             bookings_q = bookings_q.where(BookingTable.court == court)
@@ -186,7 +212,8 @@ class SqliteBookingRepo(BookingRepo):
 
         for record in prefetch(bookings_q, TransactionTable.select()):
             pk = TempBookingKey(record.court, record.when)
-            if pk not in self.temp_booking_cache:
+            booking = self.temp_booking_cache.get(pk)
+            if booking is None:
                 trans_record, transaction = record.transaction, None
                 if trans_record is not None:
                     transaction = self.transaction_repo.from_data(
@@ -197,19 +224,21 @@ class SqliteBookingRepo(BookingRepo):
 
                 when = record.when.date()
                 start = record.when.time()
-                self.temp_booking_cache[pk] = TempBooking(record.court, String(record.client_name), start, record.end,
-                                                          when, transaction, record.is_fixed)
+                booking = TempBooking(record.court, String.trusted(record.client_name), start, record.end, when,
+                                      transaction, record.is_fixed)
+                self.temp_booking_cache[pk] = booking
                 logger.getChild(type(self).__name__).info(
                     f"Creating Booking [booking.when={when}, booking.court={record.court}, booking.start={start}] from "
                     f"queried data."
                 )
 
-            yield self.temp_booking_cache[pk]
+            yield booking
 
     def all_fixed(self) -> Generator[FixedBooking, None, None]:
         for record in prefetch(FixedBookingTable.select(), TransactionTable.select()):
             pk = FixedBookingKey(record.day_of_week, record.court, record.start)
-            if pk not in self.fixed_booking_cache:
+            booking = self.fixed_booking_cache.get(pk)
+            if booking is None:
                 transaction_record, transaction = record.transaction, None
                 if transaction_record is not None:
                     transaction = self.transaction_repo.from_data(
@@ -217,33 +246,45 @@ class SqliteBookingRepo(BookingRepo):
                         transaction_record.amount, transaction_record.method, transaction_record.responsible,
                         transaction_record.description, client=None, balance_date=transaction_record.balance_id
                     )
-                self.fixed_booking_cache[pk] = FixedBooking(
-                    record.court, String(record.client_name), record.start, record.end, record.day_of_week,
+                booking = FixedBooking(
+                    record.court, String.trusted(record.client_name), record.start, record.end, record.day_of_week,
                     record.first_when, record.last_when, deserialize_inactive_dates(record.inactive_dates), transaction
                 )
+                self.fixed_booking_cache[pk] = booking
                 logger.getChild(type(self).__name__).info(
                     f"Creating Booking [booking.day_of_week={record.day_of_week},  booking.court={record.court}, "
                     f"booking.start={record.start}] from queried data."
                 )
 
-            yield self.fixed_booking_cache[pk]
+            yield booking
 
     def cancelled(
-            self, page: int = 1, page_len: int = 10, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int = 10, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Cancellation, None, None]:
         cancelled_q = CancelledLog.select()
+        # Cancellations older than the horizon are read only if the page needs them.
+        archived_q = ArchivedCancelledLog.select() if peewee.archive_horizon() is not None else None
 
         if filters is not None:
             for filter_, value in filters:
                 cancelled_q = cancelled_q.where(filter_.passes_in_repo(CancelledLog, value))
-
-        for record in cancelled_q.paginate(page, page_len).order_by(CancelledLog.cancel_datetime.desc()):
-            if record.id not in self.cancellation_cache:
-                self.cancellation_cache[record.id] = Cancellation(
-                    record.id, record.cancel_datetime, record.responsible, String(record.client_name),
+                if archived_q is not None:
+                    archived_q = archived_q.where(filter_.passes_in_repo(ArchivedCancelledLog, value))
+
+        cancelled = peewee.seek_across_tiers(
+            cancelled_q, archived_q, (CancelledLog.cancel_datetime, CancelledLog.id),
+            (ArchivedCancelledLog.cancel_datetime, ArchivedCancelledLog.id), page, page_len, after
+        )
+        for record in cancelled:
+            cancellation = self.cancellation_cache.get(record.id)
+            if cancellation is None:
+                cancellation = Cancellation(
+                    record.id, record.cancel_datetime, record.responsible, String.trusted(record.client_name),
                     record.when, record.court, record.start, record.end, record.is_fixed, record.definitely_cancelled
                 )
+                self.cancellation_cache[record.id] = cancellation
                 logger.getChild(type(self).__name__).info(
                     f"Creating Cancellation [cancellation.id={record.id}] from queried data."
                 )
-            yield self.cancellation_cache[record.id]
+            yield cancellation
@@ -2,6 +2,7 @@ import abc
 from typing import Iterable, Generator
 
 from gym_manager.core.base import String, Client, OperationalError
+from gym_manager.core.persistence import PageKey
 
 
 class Contact:
@@ -56,10 +57,24 @@ class ContactRepo(abc.ABC):
 
     @abc.abstractmethod
     def all(
-            self, page: int = 1, page_len: int | None = None, name: String | None = None
+            self, page: int = 1, page_len: int | None = None, name: String | None = None, after: PageKey | None = None
     ) -> Generator[Contact, None, None]:
+        """Retrieves the contacts, in the order they were created.
+
+        Args:
+            page: page to retrieve.
+            page_len: contacts per page. If None, retrieve all contacts.
+            name: if given, retrieve only the contacts whose name, or the name of its client, contains it.
+            after: if given, retrieve the page that follows the contact with this key, instead of *page*.
+        """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(contact: Contact) -> PageKey:
+        """Returns the key of *contact* in the listing done by all().
+        """
+        return contact.id,
+
     @abc.abstractmethod
     def add_all(self, raw_contacts: Iterable[tuple]):
         raise NotImplementedError
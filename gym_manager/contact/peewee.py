@@ -4,8 +4,8 @@ from peewee import Model, ForeignKeyField, CharField, IntegerField, JOIN, chunke
 
 from gym_manager.contact.core import ContactRepo, Contact
 from gym_manager.core.base import String, Client, Number
-from gym_manager.core.persistence import LRUCache, ClientView
-from gym_manager.peewee import ClientTable, DATABASE_PROXY
+from gym_manager.core.persistence import LRUCache, ClientView, PageKey, CacheBudget
+from gym_manager.peewee import ClientTable, DATABASE_PROXY, seek
 
 
 class ContactModel(Model):
@@ -22,10 +22,11 @@ class ContactModel(Model):
 
 
 class SqliteContactRepo(ContactRepo):
-    def __init__(self, cache_len: int = 64):
+    def __init__(self, cache_len: int = 64, cache_budget: CacheBudget | None = None):
         DATABASE_PROXY.create_tables([ClientTable, ContactModel])
 
-        self.cache = LRUCache(int, value_type=Contact, max_len=cache_len)
+        self.cache = LRUCache(int, value_type=Contact, max_len=cache_len, name="contacts", check_types=False,
+                              budget=cache_budget, shared_types=(Client,))
 
     def has_contact_info(self, client: Client) -> bool:
         return ContactModel.get_or_none(client_id=client.id) is not None
@@ -57,25 +58,28 @@ class SqliteContactRepo(ContactRepo):
         ContactModel.delete().where(ContactModel.client_id == client.id).execute()
 
     def all(
-            self, page: int = 1, page_len: int | None = None, name: String | None = None
+            self, page: int = 1, page_len: int | None = None, name: String | None = None, after: PageKey | None = None
     ) -> Generator[Contact, None, None]:
-        query = ContactModel.select().join(ClientTable, JOIN.LEFT_OUTER).where((ClientTable.is_active) |
-                                                                               (ClientTable.is_active.is_null()))
+        # The client is selected with the contact, otherwise it is queried again for each contact.
+        query = (ContactModel.select(ContactModel, ClientTable)
+                 .join(ClientTable, JOIN.LEFT_OUTER)
+                 .where((ClientTable.is_active) | (ClientTable.is_active.is_null())))
 
         if name is not None:
             query = query.where((ContactModel.c_name.contains(name.as_primitive()))
                                 | (ClientTable.cli_name.contains(name.as_primitive())))
 
-        if page_len is not None:
-            query = query.paginate(page, page_len)
+        if page_len is not None or after is not None:
+            query = seek(query, (ContactModel.id,), page, page_len, after)
 
         for record in query:
             client, client_record = None, record.client
             if client_record is not None:
-                client = ClientView(client_record.id, String(client_record.cli_name), "SqliteContactRepo.all",
-                                    Number(client_record.dni if client_record.dni is not None else ""))
-            yield Contact(record.id, String(record.c_name), String(record.tel1), String(record.tel2),
-                          String(record.direction), String(record.description), client)
+                client = ClientView.of(client_record.id, String.trusted(client_record.cli_name),
+                                       "SqliteContactRepo.all", Number.trusted(client_record.dni))
+            yield Contact(record.id, String.trusted(record.c_name), String.trusted(record.tel1),
+                          String.trusted(record.tel2), String.trusted(record.direction),
+                          String.trusted(record.description), client)
 
     def add_all(self, raw_contacts: Iterable[tuple]):
         with DATABASE_PROXY.atomic():
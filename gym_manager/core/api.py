@@ -177,7 +177,7 @@ def close_balance(
         transaction_repo: TransactionRepo,
         balance_repo: BalanceRepo,
         balance: Balance,
-        transactions: list[Transaction],
+        transactions: list[Transaction] | None,
         balance_date: date,
         responsible: String,
         create_extraction_fn: CreateTransactionFn | None = None
@@ -188,7 +188,8 @@ def close_balance(
         transaction_repo: repository implementation that registers transactions.
         balance_repo: repository implementation that registers balances.
         balance: balance to close.
-        transactions: transactions included in the balance.
+        transactions: transactions included in the balance. If None, all the transactions that aren't bound to a
+            balance are included, and they are bound by the repository without being created.
         balance_date: date when the balance was done.
         responsible: responsible for closing the balance.
         create_extraction_fn: function used to create the extraction.
@@ -200,7 +201,8 @@ def close_balance(
     if create_extraction_fn is not None:
         # Creates the extraction done at the end of the day.
         extraction = create_extraction_fn()
-        transactions.append(extraction)
+        if transactions is not None:
+            transactions.append(extraction)
 
         # Adds the extraction to the balance.
         if extraction.method not in balance["Extracción"]:
@@ -208,11 +210,11 @@ def close_balance(
         balance["Extracción"][extraction.method].increase(extraction.amount)
         balance["Extracción"]["Total"].increase(extraction.amount)
 
-    balance_repo.add(balance_date, responsible, balance)
-
-    for transaction in transactions:
-        transaction.balance_date = balance_date
-        transaction_repo.bind_to_balance(transaction, balance_date)
+    # The balance is added and the transactions are bound to it atomically.
+    balance_repo.add(balance_date, responsible, balance, transactions)
+    if transactions is not None:  # Otherwise, the repository updates the bound transactions.
+        for transaction in transactions:
+            transaction.balance_date = balance_date
 
     logger.getChild(__name__).info(f"Responsible [responsible={responsible}] closed the balance [balance={balance}] of "
                                    f"[balance_date={balance_date}].")
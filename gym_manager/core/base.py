@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 import abc
+import bisect
 import decimal
 import functools
 import logging
-from collections import defaultdict
+import sys
 from dataclasses import dataclass, field
 from datetime import date, timedelta
 from decimal import Decimal, InvalidOperation
@@ -76,10 +77,20 @@ class ValidationError(Exception):
 class Validatable(abc.ABC):
     """Interface used as a base for classes that wrap primive values that should be validated.
     """
+    __slots__ = ("_value",)
 
     def __init__(self, value: Any, **validate_args):
         self._value = self.validate(value, **validate_args)
 
+    @classmethod
+    def trusted(cls, value: Any) -> Validatable:
+        """Wraps the primitive *value* without validating it. Used for values that were validated before being stored,
+        like the ones read from a repository.
+        """
+        validatable = cls.__new__(cls)
+        validatable._value = value
+        return validatable
+
     def __str__(self) -> str:
         return str(self._value)
 
@@ -108,8 +119,9 @@ class Validatable(abc.ABC):
 
 @functools.total_ordering
 class Number(Validatable):
-    """int wrapper.
+    """Immutable int wrapper.
     """
+    __slots__ = ()
     OPTIONAL_INT: ClassVar[int] = -1
 
     def __eq__(self, other: int | Number) -> bool:
@@ -171,14 +183,29 @@ class Number(Validatable):
             )
         return int_value
 
+    @classmethod
+    def trusted(cls, value: int | None) -> Number:
+        """Wraps the int *value* without validating it. None is stored as the optional number.
+        """
+        return super().trusted(Number.OPTIONAL_INT if value is None else value)
+
     def as_primitive(self) -> Any | None:
         int_value = super().as_primitive()
         return int_value if int_value != Number.OPTIONAL_INT else None
 
 
 class String(Validatable):
-    """str wrapper that supports empty str and str with a max length.
+    """Immutable str wrapper that supports empty str and str with a max length.
     """
+    __slots__ = ()
+
+    @classmethod
+    def interned(cls, value: str) -> String:
+        """Returns a String of *value* shared by all the calls done with an equal *value*, for the values that repeat a
+        lot, like the responsible of the transactions. The validation is skipped, so *value* must be a valid one, like
+        the values read from a repository.
+        """
+        return _interned_string(value)
 
     def __eq__(self, other: str | String) -> bool:
         if isinstance(other, type(self._value)):
@@ -228,8 +255,9 @@ class String(Validatable):
 
 
 class Currency(Validatable):
-    """Decimal wrapper that supports a max currency value.
+    """Decimal wrapper that supports a max currency value. It isn't immutable, see increase(), so it is never shared.
     """
+    __slots__ = ()
 
     # noinspection PyShadowingBuiltins
     @classmethod
@@ -277,6 +305,20 @@ class Currency(Validatable):
         build('(' if sign else '')
         return ''.join(reversed(result))
 
+    @classmethod
+    def from_cents(cls, cents: int) -> Currency:
+        """Creates a Currency from an integer amount of cents. The validation is skipped, because any int is a valid
+        amount of cents.
+        """
+        currency = cls.__new__(cls)
+        currency._value = Decimal(cents).scaleb(-2)
+        return currency
+
+    def as_cents(self) -> int:
+        """Returns the currency as an integer amount of cents. Fractions of a cent are rounded.
+        """
+        return int(self._value.scaleb(2).to_integral_value())
+
     def __eq__(self, other: Currency) -> bool:
         if isinstance(other, type(self)):
             return self._value == other.as_primitive()
@@ -315,10 +357,15 @@ class Currency(Validatable):
         return Currency(self._value * n)
 
 
+@functools.lru_cache(maxsize=4096)
+def _interned_string(value: str) -> String:
+    return String.trusted(sys.intern(value))
+
+
 Balance: TypeAlias = dict[str, dict[str, Currency]]
 
 
-@dataclass
+@dataclass(slots=True)
 class Client:
     """Stores information about a client.
     """
@@ -368,7 +415,7 @@ class Client:
         return self._subscriptions[activity_name]
 
 
-@dataclass
+@dataclass(slots=True)
 class Activity:
     """Stores general information about an activity.
     """
@@ -382,10 +429,56 @@ class Activity:
     removed: bool = field(compare=False, default=False)
 
 
-defaultdict_list = functools.partial(defaultdict, list)
+class ChargeLedger:
+    """Charges of a subscription, by year and month.
 
+    Besides the charges, the ledger keeps the charged amount and the last charge of each month, so the queries done for
+    every month of a charge table don't iterate or sort.
+    """
+    __slots__ = ("_months", "_charges")
+
+    def __init__(self) -> None:
+        # Charged amount and last charge of each month, by year. Nested dicts, so no key tuple is created per month.
+        self._months: dict[int, dict[int, tuple[Decimal, Transaction]]] = {}
+        self._charges: dict[int, list[tuple[int, Transaction]]] = {}  # Month and charge, sorted by month.
+
+    def add(self, year: int, month: int, transaction: Transaction):
+        amount = Decimal(0) if transaction.amount is None else transaction.amount.as_primitive()
+        months = self._months.setdefault(year, {})
+        summary = months.get(month)
+        if summary is None:
+            months[month] = amount, transaction
+        else:
+            total, last = summary
+            months[month] = total + amount, transaction if transaction.id >= last.id else last
+
+        bisect.insort(self._charges.setdefault(year, []), (month, transaction), key=_charge_month)
+
+    def charges(self, year: int) -> Iterable[tuple[int, Transaction]]:
+        return iter(self._charges.get(year, ()))
+
+    def is_charged(self, year: int, month: int) -> bool:
+        return month in self._months.get(year, ())
+
+    def charged_amount(self, year: int, month: int) -> Decimal:
+        months = self._months.get(year)
+        summary = None if months is None else months.get(month)
+        return Decimal(0) if summary is None else summary[0]
+
+    def last_charge(self, year: int, month: int) -> Transaction:
+        """Returns the charge of the month with the greatest id.
 
-@dataclass
+        Raises:
+            KeyError if the month wasn't charged.
+        """
+        return self._months[year][month][1]
+
+
+def _charge_month(charge: tuple[int, Transaction]) -> int:
+    return charge[0]
+
+
+@dataclass(slots=True)
 class Subscription:
     """Stores information about a client's subscription in an activity.
     """
@@ -393,34 +486,30 @@ class Subscription:
     when: date
     client: Client
     activity: Activity
-    _transactions: dict[tuple[int, int], list[Transaction]] = field(default_factory=defaultdict_list, compare=False,
-                                                                    init=False)
+    _ledger: ChargeLedger = field(default_factory=ChargeLedger, compare=False, init=False)
 
-    def transactions(self, year: int):
-        for month in range(1, 12):
-            for transaction in self._transactions[(year, month)]:
-                yield month, transaction
+    def transactions(self, year: int) -> Iterable[tuple[int, Transaction]]:
+        """Yields the month and the transaction of each charge done for the *year*, sorted by month.
+        """
+        return self._ledger.charges(year)
 
     def add_transaction(self, year: int, month: int, transaction: Transaction):
-        self._transactions[(year, month)].append(transaction)
+        self._ledger.add(year, month, transaction)
 
     def charged_amount(self, year: int, month: int) -> Currency:
-        amount = Currency(0)
-        for transaction in self._transactions[(year, month)]:
-            amount.increase(transaction.amount)
-        return amount
+        # Currencies are mutable, so a new one is returned. The Decimal it wraps is immutable, so it is shared.
+        return Currency.trusted(self._ledger.charged_amount(year, month))
 
     def last_transaction(self, year: int, month: int) -> Transaction:
-        _transactions = sorted(self._transactions[(year, month)], key=lambda transaction: transaction.id)
-        return _transactions[-1]
+        return self._ledger.last_charge(year, month)
 
     def is_charged(self, year: int, month: int):
         """Checks if the subscription has a registered charge in the *month* and *year*.
         """
-        return len(self._transactions[year, month]) > 0
+        return self._ledger.is_charged(year, month)
 
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     """Stores information about a transaction.
     """
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from typing import Callable, Any
+from weakref import WeakMethod, ref
+
+from gym_manager.core.base import Client, Activity, Transaction
+
+
+@dataclass(frozen=True)
+class ClientUpdated:
+    """The *client* was created, reactivated or had its data changed.
+    """
+    client: Client
+
+
+@dataclass(frozen=True)
+class ClientRemoved:
+    client: Client
+
+
+@dataclass(frozen=True)
+class ActivityUpdated:
+    """The name, price or description of the *activity* changed.
+    """
+    activity: Activity
+
+
+@dataclass(frozen=True)
+class ActivityRemoved:
+    activity: Activity
+
+
+@dataclass(frozen=True)
+class TransactionsBound:
+    """The *transactions* were bound to the balance of *balance_date*.
+    """
+    transactions: tuple[Transaction, ...]
+    balance_date: date
+
+
+class EventBus:
+    """In-process publish/subscribe of domain change events, used to keep the caches consistent.
+
+    Handlers are held through weak references, so subscribing doesn't keep a repository alive. The handlers of an event
+    are called synchronously by publish(), in the order they subscribed.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: dict[type, list[ref]] = defaultdict(list)
+
+    def subscribe(self, event_type: type, handler: Callable[[Any], None]):
+        """Calls *handler* with every published event of type *event_type*.
+        """
+        handler_ref = WeakMethod(handler) if hasattr(handler, "__self__") else ref(handler)
+        self._handlers[event_type].append(handler_ref)
+
+    def publish(self, event: Any):
+        handlers = self._handlers.get(type(event))
+        if handlers is None:
+            return
+
+        for handler_ref in tuple(handlers):  # A handler may subscribe others.
+            handler = handler_ref()
+            if handler is not None:
+                handler(event)
+        handlers[:] = [handler_ref for handler_ref in handlers if handler_ref() is not None]
+
+    def n_handlers(self, event_type: type) -> int:
+        return sum(1 for handler_ref in self._handlers.get(event_type, ()) if handler_ref() is not None)
+
+
+# Bus shared by the repositories and the booking system.
+domain_events = EventBus()
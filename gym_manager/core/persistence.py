@@ -1,22 +1,22 @@
 from __future__ import annotations
 
 import abc
-import logging
-import os
-import shutil
+import functools
+import itertools
+import sys
 from collections import OrderedDict
-from datetime import date
-from typing import Generator, Type, Any, Iterable, TypeAlias, ClassVar
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Generator, Type, Any, Iterable, TypeAlias, ClassVar, ContextManager
+from weakref import WeakSet, WeakValueDictionary
 
 from gym_manager.core.base import Client, Activity, Currency, String, Number, Subscription, Transaction, Filter, Balance
 
 FilterValuePair: TypeAlias = tuple[Filter, str]
-
-
-def create_backup(database_path: str, backup_dir: str):
-    os.makedirs(backup_dir, exist_ok=True)
-    dst = shutil.copy(database_path, os.path.join(backup_dir, f"backup_{date.today().strftime('%Y_%m_%d')}.db"))
-    logging.getLogger(__name__).getChild(__name__).info(f"Created backup on {dst}")
+# Opaque position of an object inside a paginated listing, built from the values the listing is sorted by. Passing the
+# key of the last object of a page as the *after* argument of the listing retrieves the next page.
+PageKey: TypeAlias = tuple
 
 
 class PersistenceError(Exception):
@@ -25,65 +25,311 @@ class PersistenceError(Exception):
         super().__init__(*args)
 
 
+@dataclass(frozen=True)
+class CacheStats:
+    """Counters of an LRUCache since it was created.
+    """
+    name: str
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    max_len: int
+    bytes_used: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return 0 if lookups == 0 else self.hits / lookups
+
+
+# Types that don't reference other objects.
+_LEAF_TYPES = frozenset({int, float, bool, str, bytes, type(None), date, datetime, time, timedelta, Decimal})
+
+
+@functools.cache
+def _slot_names(cls: type) -> tuple[str, ...]:
+    names = []
+    for base in cls.__mro__:
+        slots = base.__dict__.get("__slots__", ())
+        names.extend((slots,) if isinstance(slots, str) else slots)
+    return tuple(name for name in names if name not in ("__dict__", "__weakref__"))
+
+
+def estimate_size(obj: Any, shared_types: tuple[Type, ...] = ()) -> int:
+    """Estimates the bytes used by *obj* and by the objects it references, adding the sys.getsizeof of each one.
+
+    Referenced objects of *shared_types* aren't counted, because they are owned by another cache.
+    """
+    size, seen, pending = 0, set(), [obj]
+    while len(pending) > 0:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if type(current) in _LEAF_TYPES:
+            size += sys.getsizeof(current)
+            continue
+        if current is not obj and isinstance(current, shared_types):
+            continue
+
+        size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        elif not isinstance(current, type) and not callable(current):
+            if hasattr(current, "__dict__"):  # The attribute names are shared by all the instances, so aren't counted.
+                size += sys.getsizeof(current.__dict__)
+                pending.extend(current.__dict__.values())
+            pending.extend(getattr(current, name) for name in _slot_names(type(current)) if hasattr(current, name))
+    return size
+
+
+class CacheBudget:
+    """Memory ceiling shared by many caches.
+
+    Each cache created with the budget estimates the size of the values it stores. When the sum of all of them exceeds
+    *max_bytes*, the least recently used value among all the caches is discarded until they fit again.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.bytes_used = 0
+        self._clock = itertools.count()
+        self._caches: WeakSet[LRUCache] = WeakSet()
+
+    def register(self, cache: LRUCache):
+        self._caches.add(cache)
+
+    def tick(self) -> int:
+        """Returns the time of a use of a cached value, greater than the time of all previous uses.
+        """
+        return next(self._clock)
+
+    def enforce(self):
+        """Discards the least recently used values of the caches until they fit in the budget.
+        """
+        while self.bytes_used > self.max_bytes:
+            caches = [cache for cache in self._caches if len(cache) > 0]
+            if len(caches) == 0:
+                break
+            min(caches, key=lambda cache: cache.last_use(cache.victim())).evict()
+
+
+_MISSING = object()
+
+
 class LRUCache:
+    """Keeps up to *max_len* values, discarding the least recently used one when a new value doesn't fit.
+
+    With the "2q" *policy* the cache resists scans, like listing hundreds of transactions for a report. Keys seen once
+    wait in a FIFO queue that holds a quarter of the cache. A key that is used again while it is in that queue, or
+    shortly after it was discarded from it, moves to the main LRU queue. So a scan only replaces the keys of the FIFO
+    queue, and the keys that are used repeatedly stay cached.
+
+    If a *budget* is given, the size of each value is estimated when it is stored, without counting the referenced
+    objects of *shared_types*, and the values are also discarded to keep all the caches of the budget under its
+    ceiling.
+
+    Lookups done with get() or [] count as hits or misses, so the stats of each cache show if its size works. If
+    *check_types* is True, keys and values that aren't instances of *key_type* and *value_type* raise TypeError.
+    """
 
-    def __init__(self, key_type: Type, value_type: Type, max_len: int) -> None:
+    # All the live caches, so their stats can be reported together.
+    instances: ClassVar[WeakSet[LRUCache]] = WeakSet()
+
+    def __init__(
+            self, key_type: Type, value_type: Type, max_len: int, name: str | None = None, check_types: bool = True,
+            policy: str = "lru", budget: CacheBudget | None = None, shared_types: tuple[Type, ...] = ()
+    ) -> None:
+        if policy not in ("lru", "2q"):
+            raise ValueError(f"The LRUCache policy must be 'lru' or '2q', but received '{policy}'.")
         self.key_type = key_type
         self.value_type = value_type
+        self.name = value_type.__name__ if name is None else name
+        self.check_types = check_types
+        self.policy = policy
 
         self.max_len = max_len
+        # The most recently used key is the last one.
         self._cache = OrderedDict()
+        # Keys seen once, and the keys recently discarded from them (without their values). Only used by "2q".
+        self._recent = OrderedDict() if policy == "2q" else None
+        self._ghosts = OrderedDict() if policy == "2q" else None
+        self._recent_len, self._ghosts_len = max(1, max_len // 4), max(1, max_len // 2)
+
+        # Estimated size and time of the last use of each value. Only used if there is a budget.
+        self.budget, self.shared_types = budget, shared_types
+        self._sizes: dict[Any, int] | None = None if budget is None else {}
+        self._uses: dict[Any, int] | None = None if budget is None else {}
+        if budget is not None:
+            budget.register(self)
+
+        self.hits, self.misses, self.evictions = 0, 0, 0
+        LRUCache.instances.add(self)
+
+    def _check_key(self, key: Any):
+        if not isinstance(key, self.key_type):
+            raise TypeError(f"The LRUCache expected a '{self.key_type}' as key, but received a '{type(key)}'.")
 
     def __len__(self) -> int:
-        return len(self._cache)
+        return len(self._cache) if self._recent is None else len(self._cache) + len(self._recent)
+
+    def _lookup(self, key: Any) -> Any:
+        if self.check_types:
+            self._check_key(key)
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            value = _MISSING if self._recent is None else self._recent.pop(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return _MISSING
+            self._cache[key] = value  # The key was used twice, so it moves to the main queue.
+        else:
+            value = self._cache[key]
+        self.hits += 1
+        if self._uses is not None:
+            self._uses[key] = self.budget.tick()
+        return value
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Returns the value of *key*, or *default* if the cache doesn't contain it.
+        """
+        value = self._lookup(key)
+        return default if value is _MISSING else value
 
     def __getitem__(self, key: Any) -> Any:
-        if not isinstance(key, self.key_type):
-            raise TypeError(f"The LRUCache expected a '{self.key_type}' as key, but received a '{type(key)}'.")
-        if key not in self._cache:  # There is one implicit __getitem__ call.
+        value = self._lookup(key)
+        if value is _MISSING:
             raise KeyError(f"The LRUCache does not contains the key '{key}'.")
-
-        self._cache.move_to_end(key, last=False)  # There is one implicit __getitem__ call.
-        return self._cache[key]
+        return value
 
     def __setitem__(self, key: Any, value: Any):
-        if not isinstance(key, self.key_type):
-            raise TypeError(f"The LRUCache expected a '{self.key_type}' as key, but received a '{type(key)}'.")
-        if not isinstance(value, self.value_type):
-            raise TypeError(f"The LRUCache expected a '{self.value_type}' as value, but received a '{type(value)}'.")
+        if self.check_types:
+            self._check_key(key)
+            if not isinstance(value, self.value_type):
+                raise TypeError(f"The LRUCache expected a '{self.value_type}' as value, but received a "
+                                f"'{type(value)}'.")
+
+        if self._recent is None or key in self._cache:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+        elif self._recent.pop(key, _MISSING) is not _MISSING or self._ghosts.pop(key, _MISSING) is not _MISSING:
+            self._cache[key] = value
+        else:
+            self._recent[key] = value
+        if len(self) > self.max_len:
+            self.evict()
+
+        if self.budget is not None and key in self:
+            size = estimate_size(value, self.shared_types)
+            self.budget.bytes_used += size - self._sizes.get(key, 0)
+            self._sizes[key], self._uses[key] = size, self.budget.tick()
+            self.budget.enforce()
+
+    def victim(self) -> Any:
+        """Returns the key that would be discarded next.
+        """
+        if self._recent is not None and (len(self._recent) > self._recent_len or len(self._cache) == 0):
+            return next(iter(self._recent))
+        return next(iter(self._cache))  # The LRU key.
 
-        self._cache[key] = value
-        self._cache.move_to_end(key, last=False)
-        if len(self._cache) > self.max_len:  # Removes the LRU key in case the cache len is exceeded.
-            self._cache.popitem(last=True)
+    def last_use(self, key: Any) -> int:
+        """Returns the time of the last use of *key*, as given by the budget.
+        """
+        return self._uses[key]
+
+    def evict(self):
+        """Discards the value of victim().
+        """
+        key = self.victim()
+        if self._recent is not None and key in self._recent:
+            del self._recent[key]
+            self._ghosts[key] = None
+            if len(self._ghosts) > self._ghosts_len:
+                self._ghosts.popitem(last=False)
+        else:
+            del self._cache[key]
+        self._forget(key)
+        self.evictions += 1
+
+    def _forget(self, key: Any):
+        if self.budget is not None:
+            self.budget.bytes_used -= self._sizes.pop(key)
+            del self._uses[key]
 
     def pop(self, key: Any):
-        if not isinstance(key, self.key_type):
-            raise TypeError(f"The LRUCache expected a '{self.key_type}' as key, but received a '{type(key)}'.")
-        if key not in self._cache:
+        if self.check_types:
+            self._check_key(key)
+        if key in self._cache:
+            self._cache.pop(key)
+        elif self._recent is not None and key in self._recent:
+            self._recent.pop(key)
+        else:
             raise KeyError(f"The LRUCache does not contains the key '{key}'.")
-        self._cache.pop(key)
+        self._forget(key)
 
     def __contains__(self, key: Any) -> bool:
-        return key in self._cache
+        return key in self._cache or (self._recent is not None and key in self._recent)
 
     def __iter__(self):
-        yield from iter(self._cache)
+        """Yields the keys from the most recently used to the least recently used. With the "2q" policy, the keys used
+        more than once come first.
+        """
+        yield from reversed(self._cache)
+        if self._recent is not None:
+            yield from reversed(self._recent)
+
+    def items(self) -> Iterable[tuple[Any, Any]]:
+        """Yields the cached (key, value) pairs in the order of __iter__, without counting them as lookups.
+        """
+        for key in self:
+            yield key, self._cache[key] if key in self._cache else self._recent[key]
+
+    def values(self) -> Iterable[Any]:
+        for _, value in self.items():
+            yield value
 
     def move_to_front(self, key: Any):
-        if not isinstance(key, self.key_type):
-            raise TypeError(f"The LRUCache expected a '{self.key_type}' as key, but received a '{type(key)}'.")
-        if key not in self._cache:
-            raise KeyError(f"The LRUCache does not contains the key '{key}'.")
-        self._cache.move_to_end(key, last=False)
+        if self.check_types:
+            self._check_key(key)
+        if self._recent is not None and key in self._recent:
+            self._cache[key] = self._recent.pop(key)
+        else:
+            self._cache.move_to_end(key)  # Raises KeyError if the key isn't in the cache.
+        if self._uses is not None:
+            self._uses[key] = self.budget.tick()
+
+    def stats(self) -> CacheStats:
+        bytes_used = 0 if self._sizes is None else sum(self._sizes.values())
+        return CacheStats(self.name, self.hits, self.misses, self.evictions, len(self), self.max_len, bytes_used)
+
+
+def cache_stats() -> list[CacheStats]:
+    """Returns the stats of all the live caches.
+    """
+    return [cache.stats() for cache in LRUCache.instances]
 
 
 class ClientView(Client):
     """Stores only the client's dni and number. Could evolve into a proxy if needed later.
     """
+    __slots__ = ("created_by", "__weakref__")  # Views are referenced weakly by the ClientViewMap.
 
     repository: ClassVar[ClientRepo] = None
 
+    @classmethod
+    def of(cls, id_: int, name: String, created_by: str, dni: Number) -> ClientView:
+        """Returns the live view of the client with *id_*, or creates one with the given data if there is none.
+        """
+        if cls.repository is None:
+            raise AttributeError("ClassVar 'repository' wasn't set in ClientView.")
+        view = cls.repository.get_view(id_)
+        return view if view is not None else cls(id_, name, created_by, dni)
+
     def __init__(self, id_: int, name: String, created_by: str, dni: Number):
         self.id = id_
         self.dni = dni
@@ -94,7 +340,14 @@ class ClientView(Client):
             raise AttributeError("ClassVar 'repository' wasn't set in ClientView.")
         self.repository.register_view(self)
 
+    def __reduce__(self):
+        # The view only has some of the client's slots, and it is registered again in the repository when loaded.
+        return ClientView.of, (self.id, self.name, self.created_by, self.dni)
+
     def __getattr__(self, attr_name):
+        if attr_name.startswith("__") and attr_name.endswith("__"):
+            # Protocols such as pickle and copy look up optional dunder methods, and expect an AttributeError.
+            raise AttributeError(attr_name)
         raise NotImplementedError(f"The object '{type(self).__name__}' created by '{self.created_by}' has no "
                                   f"implementation of '{attr_name}'.")
 
@@ -106,6 +359,42 @@ class ClientView(Client):
         return repr(self)
 
 
+class ClientViewMap:
+    """Identity map of the live ClientView objects, indexed by client id and by dni. Only weak references are held, so
+    a view is dropped as soon as no transaction, booking or contact uses it.
+    """
+
+    def __init__(self) -> None:
+        self._by_id: WeakValueDictionary[int, ClientView] = WeakValueDictionary()
+        self._by_dni: WeakValueDictionary[int, ClientView] = WeakValueDictionary()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, view: ClientView):
+        """Adds the *view*, replacing the one with the same id, if there is one.
+        """
+        self._by_id[view.id] = view
+        if view.dni.as_primitive() is not None:
+            self._by_dni[view.dni.as_primitive()] = view
+
+    def get(self, id_: int) -> ClientView | None:
+        return self._by_id.get(id_)
+
+    def match(self, dni: Number) -> ClientView | None:
+        """Returns a live view whose dni is *dni*, if there is one.
+        """
+        return None if dni.as_primitive() is None else self._by_dni.get(dni.as_primitive())
+
+    def refresh(self, view: ClientView, client: Client):
+        """Copies the dni and name of *client* into the *view*.
+        """
+        if view.dni.as_primitive() is not None and self._by_dni.get(view.dni.as_primitive()) is view:
+            del self._by_dni[view.dni.as_primitive()]
+        view.dni, view.name = client.dni, client.name
+        self.add(view)
+
+
 class ClientRepo(abc.ABC):
     """Clients repository interface.
     """
@@ -140,7 +429,8 @@ class ClientRepo(abc.ABC):
 
     @abc.abstractmethod
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Client, None, None]:
         """Retrieve all the clients in the repository.
 
@@ -148,19 +438,49 @@ class ClientRepo(abc.ABC):
             page: page to retrieve.
             page_len: clients per page. If None, retrieve all clients.
             filters: filters to apply.
+            after: if given, retrieve the page that follows the client with this key, instead of *page*.
         """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(client: Client) -> PageKey:
+        """Returns the key of *client* in the listing done by all().
+        """
+        return client.name.as_primitive(), client.id
+
     @abc.abstractmethod
     def count(self, filters: list[FilterValuePair] | None = None) -> int:
         """Counts the number of clients in the repository.
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def name_match(self, to_filter, filter_value) -> Any:
+        """Translate function of the filters by client name. It matches the clients that have a name with words
+        starting with the ones in *filter_value*.
+
+        Args:
+            to_filter: the client table, or the one that references it, as the repository sees it.
+            filter_value: name to look for.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def recently_served(self, limit: int) -> list[int]:
+        """Returns the ids of the *limit* active clients with the most recent transactions, the most recent first.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def register_view(self, view: ClientView):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_view(self, id_: int) -> ClientView | None:
+        """Returns the live view of the client with *id_*, if there is one.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_all(self, raw_clients: Iterable[tuple]):
         """Adds the clients in the iterable directly into the repository, without creating Client objects.
@@ -210,10 +530,25 @@ class ActivityRepo(abc.ABC):
 
     @abc.abstractmethod
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Activity, None, None]:
+        """Retrieve all the activities in the repository.
+
+        Args:
+            page: page to retrieve.
+            page_len: activities per page. If None, retrieve all activities.
+            filters: filters to apply.
+            after: if given, retrieve the page that follows the activity with this key, instead of *page*.
+        """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(activity: Activity) -> PageKey:
+        """Returns the key of *activity* in the listing done by all().
+        """
+        return activity.name.as_primitive(), activity.id
+
     @abc.abstractmethod
     def n_subscribers(self, activity: Activity) -> int:
         """Returns the number of clients subscribed in the given *activity*.
@@ -267,6 +602,18 @@ class SubscriptionRepo(abc.ABC):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def import_charges(self, raw_charges: Iterable[tuple]) -> int:
+        """Adds the charges in the iterable along with their transactions, without creating Transaction objects.
+
+        Each charge is a tuple (year, month, client_id, activity_id, raw_transaction), where raw_transaction is the
+        tuple expected by TransactionRepo.add_raw.
+
+        Returns:
+            The number of imported charges.
+        """
+        raise NotImplementedError
+
 
 class TransactionRepo(abc.ABC):
     """Transaction repository interface.
@@ -277,7 +624,7 @@ class TransactionRepo(abc.ABC):
 
     @abc.abstractmethod
     def from_data(
-            self, id_: int, type_: str | None = None, when: date | None = None, raw_amount: str | None = None,
+            self, id_: int, type_: str | None = None, when: date | None = None, amount: Currency | None = None,
             method: str | None = None, raw_responsible: str | None = None, description: str | None = None,
             client: Client | None = None, balance_date: date | None = None
     ) -> Transaction:
@@ -299,14 +646,57 @@ class TransactionRepo(abc.ABC):
     @abc.abstractmethod
     def all(
             self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
-            without_balance: bool = True, balance_date: date | None = None
+            without_balance: bool = True, balance_date: date | None = None, after: PageKey | None = None
     ) -> Generator[Transaction, None, None]:
+        """Retrieves the transactions, from the newest to the oldest.
+
+        Args:
+            page: page to retrieve.
+            page_len: transactions per page. If None, retrieve all transactions.
+            filters: filters to apply.
+            without_balance: if True, retrieve only the transactions that aren't bound to a balance.
+            balance_date: if given, retrieve only the transactions bound to the balance of this date.
+            after: if given, retrieve the page that follows the transaction with this key, instead of *page*.
+        """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(transaction: Transaction) -> PageKey:
+        """Returns the key of *transaction* in the listing done by all().
+        """
+        return transaction.id,
+
     @abc.abstractmethod
     def bind_to_balance(self, transaction: Transaction, balance_date: date):
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def balance_summary(self, balance_date: date | None = None) -> Balance:
+        """Sums the amounts of the transactions, grouped by type and by method. Each type also has the sum of all its
+        methods under the key "Total".
+
+        Args:
+            balance_date: if given, sum the transactions bound to the balance of this date. If not, sum the transactions
+                that aren't bound to any balance.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def bind_to_balance_many(self, transactions: Iterable[Transaction], balance_date: date):
+        """Binds all the *transactions* to the balance of *balance_date*, without updating them one by one.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def bind_unbalanced(self, balance_date: date) -> tuple[Transaction, ...]:
+        """Binds all the transactions that aren't bound to a balance to the balance of *balance_date*, without creating
+        them.
+
+        Returns:
+            The already created transactions that were bound, so their balance date can be updated.
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def add_raw(self, raw: tuple) -> int:
         """Adds the transaction directly into the repository, without creating Transaction objects. This method should
@@ -325,6 +715,14 @@ class TransactionRepo(abc.ABC):
 
     @abc.abstractmethod
     def charges_by_activity(self, activity: Activity, when: date) -> Generator[Transaction, None, None]:
+        """Retrieves the charges of *activity* registered for the month of *when*.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def charges_total_by_activity(self, activity: Activity, when: date) -> Currency:
+        """Returns the sum of the charges of *activity* registered for the month of *when*.
+        """
         raise NotImplementedError
 
 
@@ -333,9 +731,33 @@ class BalanceRepo(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def add(self, when: date, responsible: String, balance: Balance):
+    def add(
+            self, when: date, responsible: String, balance: Balance, transactions: Iterable[Transaction] | None = ()
+    ):
+        """Adds the *balance* of *when* and binds the *transactions* to it. Both things are done atomically, so either
+        the balance is added with all its transactions bound, or nothing is done. If *transactions* is None, all the
+        transactions that aren't bound to a balance are bound to it.
+        """
         raise NotImplementedError
 
     @abc.abstractmethod
     def all(self, from_date: date, to_date: date) -> Generator[tuple[date, String, Balance], None, None]:
         raise NotImplementedError
+
+
+class ImportLog(abc.ABC):
+    """Records the completed stages of the imports of legacy data, so an interrupted import can be resumed.
+    """
+
+    @abc.abstractmethod
+    def completed(self, import_id: str) -> set[str]:
+        """Returns the stages of the import *import_id* that were completed.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stage(self, import_id: str, stage: str) -> ContextManager[None]:
+        """Returns a context manager that runs the *stage* of the import *import_id*. The changes done inside it are
+        committed along with the checkpoint of the stage, so a failed stage leaves nothing behind.
+        """
+        raise NotImplementedError
@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import abc
 import logging
+import queue
+import threading
 from datetime import datetime
 from typing import Callable, ClassVar, Generator, TypeAlias, Iterable, Any
 
 from gym_manager.core.base import String
+from gym_manager.core.persistence import PageKey
 
 logger = logging.getLogger(__name__)
 
@@ -89,6 +92,17 @@ class log_responsible:
 Action: TypeAlias = tuple[datetime, Responsible, str, str]
 
 
+class LoggedAction(tuple):
+    """Action retrieved from a SecurityRepo. It is unpacked and compared as an Action, and it also has the *id* with
+    which it was logged, so actions logged at the same datetime can be told apart.
+    """
+
+    def __new__(cls, id_: int, when: datetime, responsible: Responsible, action_tag: str, action_name: str):
+        action = super().__new__(cls, (when, responsible, action_tag, action_name))
+        action.id = id_
+        return action
+
+
 class SecurityRepo(abc.ABC):
     @abc.abstractmethod
     def responsible(self) -> Generator[Responsible, None, None]:
@@ -102,10 +116,141 @@ class SecurityRepo(abc.ABC):
     def log_action(self, when: datetime, responsible: Responsible, action_tag: str, action_name: str):
         raise NotImplementedError
 
+    def log_actions(self, actions: Iterable[Action]):
+        """Logs all the *actions*. Implementations should override this method if they can log many actions at once.
+        """
+        for when, responsible, action_tag, action_name in actions:
+            self.log_action(when, responsible, action_tag, action_name)
+
+    def close_connection(self):
+        """Closes the connection that the calling thread opened to the repository, if there is one. Implementations that
+        open a connection per thread should override this method.
+        """
+
     @abc.abstractmethod
-    def actions(self, page: int = 1, page_len: int = 20, tag: str | None = None) -> Generator[Action, None, None]:
+    def actions(
+            self, page: int = 1, page_len: int = 20, tag: str | None = None, after: PageKey | None = None
+    ) -> Generator[Action, None, None]:
+        """Retrieves the logged actions, from the newest to the oldest.
+
+        Args:
+            page: page to retrieve.
+            page_len: actions per page.
+            tag: if given, retrieve only the actions with this tag.
+            after: if given, retrieve the page that follows the action with this key, instead of *page*.
+        """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(action: LoggedAction) -> PageKey:
+        """Returns the key of *action* in the listing done by actions(). Actions are identified by the datetime in which
+        they were logged, and by their id if there are many actions with the same datetime.
+        """
+        return action[0], action.id
+
+
+class WriteBehindSecurityRepo(SecurityRepo):
+    """Wraps a SecurityRepo, so actions are logged by a background thread instead of by the caller.
+
+    The actions are put in a bounded queue, that is drained in batches by the background thread. If the queue is full,
+    the caller waits until there is room in it. The pending actions are logged before reading them with actions(), and
+    when close() is called.
+
+    With the SYNC durability, actions are logged by the caller, the same way as the wrapped repo does. With ASYNC
+    durability, an action may be lost if the process dies before its batch is logged.
+    """
+
+    SYNC: ClassVar[str] = "sync"
+    ASYNC: ClassVar[str] = "async"
+
+    _STOP: ClassVar[object] = object()
+
+    def __init__(
+            self, security_repo: SecurityRepo, durability: str = ASYNC, queue_len: int = 1024, batch_len: int = 64
+    ):
+        """Init method.
+
+        Args:
+            security_repo: repository where the actions are logged.
+            durability: SYNC or ASYNC.
+            queue_len: max amount of actions waiting to be logged.
+            batch_len: max amount of actions logged at once.
+
+        Raises:
+            ValueError if *durability* isn't SYNC or ASYNC.
+        """
+        if durability not in (self.SYNC, self.ASYNC):
+            raise ValueError(f"Unknown [durability={durability}], expected '{self.SYNC}' or '{self.ASYNC}'.")
+
+        self.security_repo = security_repo
+        self.durability = durability
+        self.batch_len = batch_len
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_len)
+        self._writer: threading.Thread | None = None
+        if durability == self.ASYNC:
+            self._writer = threading.Thread(target=self._write_batches, name="WriteBehindSecurityRepo", daemon=True)
+            self._writer.start()
+
+    def _write_batches(self):
+        try:
+            stop = False
+            while not stop:
+                batch = [self._queue.get()]
+                while len(batch) < self.batch_len:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                stop = any(item is self._STOP for item in batch)
+                actions = [item for item in batch if item is not self._STOP]
+                try:
+                    if len(actions) > 0:
+                        self.security_repo.log_actions(actions)
+                except Exception:
+                    # The thread keeps running, so the following actions can still be logged.
+                    logger.getChild(type(self).__name__).exception(f"Failed to log [actions={actions}].")
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        finally:
+            # The writer thread opened its own connection when it logged the first batch.
+            self.security_repo.close_connection()
+
+    def responsible(self) -> Generator[Responsible, None, None]:
+        yield from self.security_repo.responsible()
+
+    def add_responsible(self, responsible: Responsible):
+        self.security_repo.add_responsible(responsible)
+
+    def log_action(self, when: datetime, responsible: Responsible, action_tag: str, action_name: str):
+        if self._writer is None:
+            self.security_repo.log_action(when, responsible, action_tag, action_name)
+        else:
+            if not self._writer.is_alive():
+                raise RuntimeError("The WriteBehindSecurityRepo was closed.")
+            self._queue.put((when, responsible, action_tag, action_name))
+
+    def actions(
+            self, page: int = 1, page_len: int = 20, tag: str | None = None, after: PageKey | None = None
+    ) -> Generator[Action, None, None]:
+        self.flush()
+        yield from self.security_repo.actions(page, page_len, tag, after)
+
+    def flush(self):
+        """Waits until all the queued actions are logged.
+        """
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Logs the queued actions and stops the background thread.
+        """
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(self._STOP)
+            self._writer.join()
+
 
 class SecurityHandler(abc.ABC):
     @property
@@ -150,7 +295,9 @@ class SecurityHandler(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def actions(self, page: int = 1, page_len: int = 20, tag: str | None = None) -> Iterable[Action]:
+    def actions(
+            self, page: int = 1, page_len: int = 20, tag: str | None = None, after: PageKey | None = None
+    ) -> Iterable[Action]:
         raise NotImplementedError
 
 
@@ -233,5 +380,7 @@ class SimpleSecurityHandler(SecurityHandler):
         if action_level in self._needs_responsible:
             self.security_repo.log_action(datetime.now(), self.current_responsible, action_level, action_description)
 
-    def actions(self, page: int = 1, page_len: int = 20, tag: str | None = None) -> Iterable[Action]:
-        yield from self.security_repo.actions(page, page_len, tag)
+    def actions(
+            self, page: int = 1, page_len: int = 20, tag: str | None = None, after: PageKey | None = None
+    ) -> Iterable[Action]:
+        yield from self.security_repo.actions(page, page_len, tag, after)
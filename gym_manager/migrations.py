@@ -0,0 +1,156 @@
+"""Versioned schema migrations.
+
+The schema version of the database is stored in its PRAGMA user_version. Each migration upgrades the schema one version,
+and migrations are applied in order, so an existing database is taken from its current version to the latest one.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Callable, TypeAlias
+
+from gym_manager.booking.peewee import BookingTable, FixedBookingTable, CancelledLog
+from gym_manager.contact.peewee import ContactModel
+from gym_manager.core.base import Currency
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.peewee import (
+    DATABASE_PROXY, ClientTable, ClientSearch, ActivityTable, BalanceTable, TransactionTable, SubscriptionTable,
+    SubscriptionCharge, ResponsibleTable, ActionTable, ChangeCounter)
+from gym_manager.stock.peewee import ItemModel
+
+logger = logging.getLogger(__name__)
+
+Migration: TypeAlias = Callable[[], None]
+
+MODELS = (ClientTable, ActivityTable, BalanceTable, TransactionTable, SubscriptionTable, SubscriptionCharge,
+          ResponsibleTable, ActionTable, BookingTable, FixedBookingTable, CancelledLog, ContactModel, ItemModel)
+# Tables of the objects that are cached and saved in the warm-start snapshot. Each change done to them increases the
+# ChangeCounter.
+TRACKED_MODELS = (ClientTable, ActivityTable, TransactionTable, SubscriptionTable, SubscriptionCharge, FixedBookingTable)
+
+
+def _hot_path_indexes():
+    """Adds the indexes used by the paginated listings and by the monthly charges lookup. Foreign keys aren't included
+    here, because peewee already indexes them when creating the tables.
+    """
+    indexes = (
+        # Active clients ordered by name, used by SqliteClientRepo.all and count.
+        ClientTable.index(ClientTable.cli_name, name="clienttable_active_cli_name", where=ClientTable.is_active),
+        ActivityTable.index(ActivityTable.act_name, name="activitytable_act_name"),
+        # Charges of an activity in a given month.
+        SubscriptionCharge.index(SubscriptionCharge.activity, SubscriptionCharge.year, SubscriptionCharge.month,
+                                 name="subscriptioncharge_activity_year_month"),
+        ActionTable.index(ActionTable.when, name="actiontable_when"),
+        ActionTable.index(ActionTable.action_tag, ActionTable.when, name="actiontable_action_tag_when"),
+        CancelledLog.index(CancelledLog.cancel_datetime, name="cancelledlog_cancel_datetime"),
+        ItemModel.index(ItemModel.item_name, name="itemmodel_item_name"),
+    )
+    for index in indexes:
+        DATABASE_PROXY.execute(index)
+
+
+def _client_search_index():
+    """Creates the full-text index of client names, the triggers that keep it in sync with ClientTable, and fills it
+    with the existing clients.
+    """
+    ClientSearch.create_table()
+    # The BEFORE INSERT trigger covers INSERT OR REPLACE, that doesn't fire delete triggers when replacing a row.
+    DATABASE_PROXY.execute_sql(
+        """CREATE TRIGGER IF NOT EXISTS clienttable_search_bi BEFORE INSERT ON clienttable BEGIN
+            INSERT INTO clientsearch(clientsearch, rowid, cli_name)
+            SELECT 'delete', id, cli_name FROM clienttable WHERE id = new.id;
+        END"""
+    )
+    DATABASE_PROXY.execute_sql(
+        """CREATE TRIGGER IF NOT EXISTS clienttable_search_ai AFTER INSERT ON clienttable BEGIN
+            INSERT INTO clientsearch(rowid, cli_name) VALUES (new.id, new.cli_name);
+        END"""
+    )
+    DATABASE_PROXY.execute_sql(
+        """CREATE TRIGGER IF NOT EXISTS clienttable_search_ad AFTER DELETE ON clienttable BEGIN
+            INSERT INTO clientsearch(clientsearch, rowid, cli_name) VALUES ('delete', old.id, old.cli_name);
+        END"""
+    )
+    DATABASE_PROXY.execute_sql(
+        """CREATE TRIGGER IF NOT EXISTS clienttable_search_au AFTER UPDATE OF id, cli_name ON clienttable BEGIN
+            INSERT INTO clientsearch(clientsearch, rowid, cli_name) VALUES ('delete', old.id, old.cli_name);
+            INSERT INTO clientsearch(rowid, cli_name) VALUES (new.id, new.cli_name);
+        END"""
+    )
+    ClientSearch.rebuild()
+
+
+def _currency_columns_to_cents():
+    """Converts the currency columns, that stored Decimal strings, into integer amounts of cents. Tables created with
+    the current schema already have integer columns, so they are skipped.
+    """
+    for model, field in ((TransactionTable, TransactionTable.amount), (ActivityTable, ActivityTable.price),
+                         (ItemModel, ItemModel.price)):
+        table, column = model._meta.table_name, field.column_name
+        pk = model._meta.primary_key.column_name
+        if {col.name: col.data_type for col in DATABASE_PROXY.get_columns(table)}[column].upper() == "INTEGER":
+            continue
+
+        cents_column = f"{column}_cents"
+        DATABASE_PROXY.execute_sql(f'ALTER TABLE "{table}" ADD COLUMN "{cents_column}" INTEGER NOT NULL DEFAULT 0')
+        # The conversion is done with Currency instead of in sql, so the amounts aren't rounded as floats.
+        rows = DATABASE_PROXY.execute_sql(f'SELECT "{pk}", "{column}" FROM "{table}"').fetchall()
+        DATABASE_PROXY.connection().executemany(f'UPDATE "{table}" SET "{cents_column}" = ? WHERE "{pk}" = ?',
+                                                ((Currency(amount).as_cents(), id_) for id_, amount in rows))
+        DATABASE_PROXY.execute_sql(f'ALTER TABLE "{table}" DROP COLUMN "{column}"')
+        DATABASE_PROXY.execute_sql(f'ALTER TABLE "{table}" RENAME COLUMN "{cents_column}" TO "{column}"')
+
+
+def _change_counter():
+    """Creates the counter of changes done to the tables whose objects are cached, and the triggers that increase it.
+    """
+    ChangeCounter.create_table()
+    ChangeCounter.insert(id=1, seq=0).on_conflict_ignore().execute()
+    for model in TRACKED_MODELS:
+        table = model._meta.table_name
+        for prefix, operation in (("ai", "INSERT"), ("au", "UPDATE"), ("ad", "DELETE")):
+            DATABASE_PROXY.execute_sql(
+                f"""CREATE TRIGGER IF NOT EXISTS {table}_changes_{prefix} AFTER {operation} ON {table} BEGIN
+                    UPDATE changecounter SET seq = seq + 1 WHERE id = 1;
+                END"""
+            )
+
+
+# The migration in position i upgrades the schema from version i to version i + 1.
+MIGRATIONS: tuple[Migration, ...] = (
+    _hot_path_indexes,
+    _client_search_index,
+    _currency_columns_to_cents,
+    _change_counter,
+)
+
+
+def schema_version() -> int:
+    """Returns the schema version of the database.
+    """
+    return DATABASE_PROXY.pragma('user_version')
+
+
+def migrate() -> int:
+    """Creates the missing tables and applies the pending migrations. Each migration is applied atomically, along with
+    the update of the schema version.
+
+    Returns:
+        The schema version after the migration.
+
+    Raises:
+        PersistenceError if the database schema is newer than the latest known migration.
+    """
+    DATABASE_PROXY.create_tables(MODELS)
+
+    version = schema_version()
+    if version > len(MIGRATIONS):
+        raise PersistenceError(f"The [schema_version={version}] of the database is newer than the latest known "
+                               f"[version={len(MIGRATIONS)}].")
+
+    for new_version, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        with DATABASE_PROXY.atomic():
+            migration()
+            DATABASE_PROXY.pragma('user_version', new_version)
+        logger.info(f"Migrated database schema to [version={new_version}] with '{migration.__name__}'.")
+
+    return schema_version()
@@ -1,14 +1,24 @@
+import codecs
+import contextlib
+import hashlib
 import json
 import logging
 import os
+import re
 import sqlite3
+import time
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from sqlite3 import Connection
+from typing import Callable, Generator, TypeAlias
 
 from gym_manager.booking.core import BookingSystem
 from gym_manager.contact.core import ContactRepo
 from gym_manager.core.base import String
-from gym_manager.core.persistence import ActivityRepo, ClientRepo, SubscriptionRepo, TransactionRepo, BalanceRepo
+from gym_manager.core.persistence import (
+    ActivityRepo, ClientRepo, SubscriptionRepo, TransactionRepo, BalanceRepo, PersistenceError, ImportLog)
+
+logger = logging.getLogger(__name__)
 
 
 def _create_temp_tables(db: Connection):
@@ -90,34 +100,165 @@ def _create_temp_tables(db: Connection):
     return {'usuario', 'actividad', 'cliente', 'cliente_actividad', 'item_texto_caja', 'pago'}
 
 
-def clean_up(backup_path: str, tables: set) -> str:
-    """Takes the content of a .sql file and generates the insert instructions of the values that belong to *tables*.
+# Header of the INSERT statements of a MySQL dump. The values start right after it.
+INSERT_HEADER_RE = re.compile(r"^INSERT INTO `?(\w+)`?(?: \([^)]*\))? VALUES\s*", re.MULTILINE)
+# A complete tuple of values. Parentheses can only appear inside the quoted strings, so they don't end the tuple. The
+# loops are unrolled, so a tuple cut at the end of the buffer fails in linear time instead of backtracking.
+TUPLE = r"\([^'()]*(?:'[^'\\]*(?:(?:\\.|'')[^'\\]*)*'[^'()]*)*\)"
+TUPLE_RE = re.compile(TUPLE, re.DOTALL)
+# What may come before a tuple that wasn't fully read yet.
+TUPLE_START_RE = re.compile(r"\s*(?:\(|$)")
+VALUE_RE = re.compile(r"'((?:[^'\\]|\\.|'')*)'|[^,]+", re.DOTALL)
+ESCAPE_RE = re.compile(r"\\(.)|''", re.DOTALL)
+MYSQL_ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a"}
+
+ProgressFn: TypeAlias = Callable[[int, int], None]
+
+
+def _unescape(match: re.Match) -> str:
+    if match.group(1) is None:  # A doubled quote.
+        return "'"
+    return MYSQL_ESCAPES.get(match.group(1), match.group(1))
+
+
+def _parse_value(match: re.Match) -> str | int | float | None:
+    if match.group(1) is not None:
+        return ESCAPE_RE.sub(_unescape, match.group(1))
+    raw = match.group(0).strip()
+    if raw == "NULL":
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        return float(raw)
+
+
+def parse_tuples(table: str, tuples: list[str]) -> tuple[str, list[tuple]]:
+    """Parses the text of the value *tuples* of an INSERT statement of *table* into python tuples.
+    """
+    return table, [tuple(_parse_value(match) for match in VALUE_RE.finditer(tuple_, 1, len(tuple_) - 1))
+                   for tuple_ in tuples]
+
+
+def iter_inserts(
+        backup_path: str, tables: set[str], batch_len: int = 2000, block_len: int = 1 << 20,
+        progress_fn: ProgressFn | None = None
+) -> Generator[tuple[str, str], None, None]:
+    """Streams the value tuples of the INSERT statements of a MySQL dump, without loading the whole dump in memory.
+
+    The tuples are split with a regex that matches a whole batch at a time, so the tuples aren't handled one by one in
+    python.
+
+    Args:
+        backup_path: path of the .sql dump.
+        tables: tables whose values are retrieved. The values of other tables are skipped.
+        batch_len: max amount of tuples in each batch.
+        block_len: bytes read from the dump at a time.
+        progress_fn: called with the bytes read so far and the size of the dump, each time a block is read.
 
     Returns:
-         The filepath of the temporary .sql file that contains the cleaned up.
+        Pairs (table, tuples), where tuples is the text of at most *batch_len* comma separated value tuples of the
+        table.
+
+    Raises:
+        PersistenceError if the dump ends in the middle of an INSERT statement.
     """
-    dst = "../adjusted_backup.sql"
-    with open(backup_path) as backup:
-        with open(dst, 'w') as cleaned_up_backup:
-            for line in backup:
-                if line.startswith("INSERT"):  # Insert values in the backup in the corresponding temporary table.
-                    _, _, table, _, values = line.split(' ', 4)
-                    table = table.removesuffix("`").removeprefix("`")
+    batch_re = re.compile(rf"\s*{TUPLE}(?:\s*,\s*{TUPLE}){{0,{batch_len - 1}}}", re.DOTALL)
+    total, read = os.path.getsize(backup_path), 0
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer, pos, table, eof = "", 0, None, False
+
+    with open(backup_path, 'rb') as dump:
+        while True:
+            if table is None:
+                header = INSERT_HEADER_RE.search(buffer, pos)
+                if header is not None:
+                    table, pos = header.group(1), header.end()
+                    continue
+                # Only the last line is kept, because it may be the start of a header that wasn't fully read yet.
+                pos = max(pos, buffer.rfind("\n", pos) + 1)
+            else:
+                batch = batch_re.match(buffer, pos)
+                # A batch that reaches the end of the buffer may be followed by more tuples, so it is retried with more
+                # data. Otherwise, the batch ends before the first tuple that wasn't fully read yet.
+                if batch is not None and (batch.end() < len(buffer) or eof):
                     if table in tables:
-                        sql_query = f"INSERT INTO {table} VALUES {values}".replace(r"\'", "")
-                        cleaned_up_backup.write(sql_query)
-    return dst
+                        yield table, batch.group(0).lstrip()
+                    pos = batch.end()
+                    separator = buffer[pos:pos + 1]
+                    if separator == ",":
+                        pos += 1
+                        continue
+                    if separator == ";" or (separator == "" and eof):
+                        table = None
+                        continue
+                    raise PersistenceError(f"Unexpected '{separator}' after a tuple of the table '{table}'.")
+                elif eof:
+                    raise PersistenceError(f"The dump '{backup_path}' ends in an INSERT statement of '{table}'.")
+                elif TUPLE_START_RE.match(buffer, pos) is None:
+                    # Otherwise the rest of the dump would be read into the buffer looking for the end of the tuple.
+                    raise PersistenceError(f"Expected a tuple of the table '{table}' in the dump '{backup_path}'.")
+
+            if eof:
+                return
+            block = dump.read(block_len)
+            read, eof = read + len(block), len(block) == 0
+            buffer, pos = buffer[pos:] + decoder.decode(block, final=eof), 0
+            if progress_fn is not None:
+                progress_fn(read, total)
+
+
+def to_sqlite(tuples: str) -> str:
+    """Rewrites the MySQL escapes of the strings in the value *tuples*, so they can be used in a sqlite statement.
+    """
+    return ESCAPE_RE.sub(_sqlite_escape, tuples)
+
+
+def _sqlite_escape(match: re.Match) -> str:
+    char = "'" if match.group(1) is None else MYSQL_ESCAPES.get(match.group(1), match.group(1))
+    if char == "'":
+        return "''"
+    # sqlite doesn't accept NUL chars in the sql text, so it is concatenated to the string.
+    return "'||char(0)||'" if char == "\0" else char
 
 
-def transfer_backup(backup_path: str, conn: Connection):
-    """Parses the .sql file in *filepath* so the old database backup can be "loaded" into the current database.
+def transfer_backup(
+        backup_path: str, conn: Connection, tables: set[str], batch_len: int = 2000,
+        progress_fn: ProgressFn | None = None
+) -> tuple[dict[str, int], dict[str, int]]:
+    """Loads the values of *tables* in the MySQL dump *backup_path* into the staging database *conn*, where the tables
+    were already created.
 
-    This parsing is made by creating a temporary in memory database. The old tables are created and populated, and then
-    its contents are adjusted and inserted into the existing tables.
+    The dump is streamed, so the memory used depends on *batch_len* and not on the size of the dump. Each batch is
+    inserted with one multi-row INSERT, so the values are parsed by sqlite. If sqlite rejects a batch, its values are
+    parsed in python and the rows with a wrong number of values are skipped.
+
+    Args:
+        backup_path: path of the .sql dump.
+        conn: staging database.
+        tables: tables to load.
+        batch_len: tuples inserted at a time.
+        progress_fn: called with the bytes read so far and the size of the dump.
+
+    Returns:
+        The amount of rows loaded into each table, and the amount of rows rejected from each table.
     """
-    with open(backup_path) as adjusted_backup:
-        script = adjusted_backup.read()
-        conn.executescript(script)
+    columns = {table: len(conn.execute(f"PRAGMA table_info({table})").fetchall()) for table in tables}
+    loaded, rejected = {table: 0 for table in tables}, {table: 0 for table in tables}
+
+    for table, tuples in iter_inserts(backup_path, tables, batch_len, progress_fn=progress_fn):
+        try:
+            loaded[table] += conn.execute(f"INSERT INTO {table} VALUES {to_sqlite(tuples)}").rowcount
+        except sqlite3.OperationalError:
+            _, rows = parse_tuples(table, TUPLE_RE.findall(tuples))
+            valid = [row for row in rows if len(row) == columns[table]]
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * columns[table])})", valid)
+            loaded[table] += len(valid)
+            rejected[table] += len(rows) - len(valid)
+    conn.commit()
+
+    logger.info(f"Loaded {loaded} rows from '{backup_path}'. Rejected rows with a wrong number of values: {rejected}.")
+    return loaded, rejected
 
 
 def _insert_activities(conn: Connection, activity_repo: ActivityRepo):
@@ -150,14 +291,25 @@ def _insert_clients(conn: Connection, client_repo: ClientRepo, contact_repo: Con
         contact_repo.add_all(gen)
 
 
+SUBSCRIPTIONS_QUERY = ("select min(p.fecha), p.id_cliente, p.id_actividad "
+                       "from pago p "
+                       "where (p.id_cliente, p.id_actividad) in ("
+                       "    select id_cliente, id_actividad "
+                       "    from cliente_actividad"
+                       ") and p.fecha >= (?) "
+                       "group by p.id_cliente, p.id_actividad")
+
+CHARGES_QUERY = ("select p.id_cliente, max(p.fecha), sum(p.importe), p.id_actividad, c.nombre, a.descripcion, u.usuario "
+                 "from pago p "
+                 "inner join actividad a on p.id_actividad = a.id "
+                 "inner join cliente c on p.id_cliente = c.id "
+                 "inner join usuario u on p.id_usuario = u.id "
+                 "where p.fecha >= (?) and p.fecha <= (?)"
+                 "group by p.id_cliente, p.id_actividad, strftime('%m-%Y', p.fecha)")
+
+
 def _insert_subscriptions(conn: Connection, subscription_repo: SubscriptionRepo, since: date):
-    gen = (raw for raw in conn.execute("select min(p.fecha), p.id_cliente, p.id_actividad "
-                                       "from pago p "
-                                       "where (p.id_cliente, p.id_actividad) in ("
-                                       "    select id_cliente, id_actividad "
-                                       "    from cliente_actividad"
-                                       ") and p.fecha >= (?) "
-                                       "group by p.id_cliente, p.id_actividad", (since,)))
+    gen = (raw for raw in conn.execute(SUBSCRIPTIONS_QUERY, (since,)))
     subscription_repo.add_all(gen)
 
 
@@ -166,32 +318,45 @@ def _extract_year_month(raw_date: str) -> tuple[int, int]:
     return year, month
 
 
-def _register_subscription_charging(
-        conn: Connection, subscription_repo: SubscriptionRepo, transaction_repo: TransactionRepo, since: date, to: date
-):
+def _register_subscription_charging(conn: Connection, subscription_repo: SubscriptionRepo, since: date, to: date):
     """This function extracts charges from the old database. If there is at least one charge in a given (month, year),
     then the given monthly subscription is considered charged, no matter the total amount that was charged.
     """
     to = str(to)
-    charges = (raw for raw in conn.execute(
-        "select p.id_cliente, max(p.fecha), sum(p.importe), p.id_actividad, c.nombre, a.descripcion, u.usuario "
-        "from pago p "
-        "inner join actividad a on p.id_actividad = a.id "
-        "inner join cliente c on p.id_cliente = c.id "
-        "inner join usuario u on p.id_usuario = u.id "
-        "where p.fecha >= (?) and p.fecha <= (?)"
-        "group by p.id_cliente, p.id_actividad, strftime('%m-%Y', p.fecha)", (since, to)
-    ))
+    charges = (raw for raw in conn.execute(CHARGES_QUERY, (since, to)))
 
     # Balance date is date.min to avoid parsed transactions to be included in the daily balance of the day when the
     # parsing is done.
     sub_charges = ((*_extract_year_month(raw[1]), raw[0], raw[3],
-                    transaction_repo.add_raw(("Cobro", raw[0], raw[1], raw[2], "Efectivo", raw[6],
-                                              f"Cobro por '{raw[5]}' a cliente '{raw[4]}' en app vieja",
-                                              date.min if raw[1] != to else None)))
+                    ("Cobro", raw[0], raw[1], raw[2], "Efectivo", raw[6],
+                     f"Cobro por '{raw[5]}' a cliente '{raw[4]}' en app vieja", date.min if raw[1] != to else None))
                    for raw in charges)
 
-    subscription_repo.register_raw_charges(sub_charges)
+    subscription_repo.import_charges(sub_charges)
+
+
+def _add_parsing_balance(balance_repo: BalanceRepo):
+    # This balance is created so the transactions parsed are not included in the daily balance of the day when the
+    # parsing is done.
+    if not balance_repo.balance_done(date.min):
+        balance_repo.add(date.min, String("Admin"), {})
+
+
+# Stages of the import, in the order they are done. Each one is committed along with its checkpoint.
+IMPORT_STAGES = ("activities", "clients", "subscriptions", "balance", "charges")
+# Upper bound of the time it takes to write a row into a migrated database, measured importing 20k to 100k rows of
+# each stage. It is used to project the duration of an import.
+WRITE_SECONDS_PER_ROW = 50e-6
+
+
+def import_id(backup_path: str, since: date) -> str:
+    """Returns the id of the import of the dump *backup_path* from *since*, based on the content of the dump.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(backup_path, "rb") as dump:
+        while len(block := dump.read(1 << 20)) > 0:
+            digest.update(block)
+    return f"{digest.hexdigest()}:{since}"
 
 
 def parse(
@@ -202,26 +367,95 @@ def parse(
         balance_repo: BalanceRepo,
         since: date,
         backup_path: str,
-        contact_repo: ContactRepo | None = None
-):
+        contact_repo: ContactRepo | None = None,
+        progress_fn: ProgressFn | None = None,
+        import_log: ImportLog | None = None
+) -> list[str]:
+    """Imports the data of the legacy MySQL dump *backup_path* into the repositories.
+
+    The import is done in the stages of IMPORT_STAGES. If *import_log* is given, each stage is committed along with its
+    checkpoint, and the stages that were completed by a previous run of the same import are skipped, so an import that
+    failed halfway is resumed by running it again.
+
+    Returns:
+        The stages done by this run.
+    """
+    id_ = import_id(backup_path, since)
+    completed = set() if import_log is None else import_log.completed(id_)
+    if completed.issuperset(IMPORT_STAGES):
+        logger.info(f"The dump '{backup_path}' was already imported [import_id={id_}].")
+        return []
+
     conn = sqlite3.connect(':memory:')
 
     tables = _create_temp_tables(conn)  # The tables aren't created from the backup file to avoid any problems.
-    backup_path = clean_up(backup_path, tables)
-    transfer_backup(backup_path, conn)
+    transfer_backup(backup_path, conn, tables, progress_fn=progress_fn)
+
+    stages = {
+        "activities": lambda: _insert_activities(conn, activity_repo),
+        "clients": lambda: _insert_clients(conn, client_repo, contact_repo),
+        "subscriptions": lambda: _insert_subscriptions(conn, subscription_repo, since),
+        "balance": lambda: _add_parsing_balance(balance_repo),
+        "charges": lambda: _register_subscription_charging(conn, subscription_repo, since, date.today())
+    }
+    done = []
+    for stage in IMPORT_STAGES:
+        if stage in completed:
+            logger.info(f"Skipped stage '{stage}' of [import_id={id_}], it was completed by a previous run.")
+            continue
+        with contextlib.nullcontext() if import_log is None else import_log.stage(id_, stage):
+            stages[stage]()
+        done.append(stage)
+        logger.info(f"Completed stage '{stage}' of [import_id={id_}].")
 
-    _insert_activities(conn, activity_repo)
-    _insert_clients(conn, client_repo, contact_repo)
-    _insert_subscriptions(conn, subscription_repo, since)
+    conn.close()
+    return done
 
-    # This balance is created so the transactions parsed are not included in the daily balance of the day when the
-    # parsing is done.
-    balance_repo.add(date.min, String("Admin"), {})
-    _register_subscription_charging(conn, subscription_repo, transaction_repo, since, date.today())
 
+@dataclass(frozen=True)
+class ImportStats:
+    """What an import of a legacy dump would do.
+
+    Attributes:
+        loaded: rows read from the dump into each staging table.
+        rejected: rows of each staging table that couldn't be read.
+        written: rows that each stage of the import would write.
+        load_duration: seconds it took to read the dump.
+        projected_duration: seconds the import would take, reading the dump included.
+    """
+    loaded: dict[str, int]
+    rejected: dict[str, int]
+    written: dict[str, int]
+    load_duration: float
+    projected_duration: float
+
+
+def dry_run(backup_path: str, since: date, progress_fn: ProgressFn | None = None) -> ImportStats:
+    """Reads the dump *backup_path* as parse() does, and reports what importing it from *since* would do, without
+    writing anything into the repositories.
+    """
+    conn = sqlite3.connect(':memory:')
+    start = time.perf_counter()
+    loaded, rejected = transfer_backup(backup_path, conn, _create_temp_tables(conn), progress_fn=progress_fn)
+    load_duration = time.perf_counter() - start
+
+    def count(query: str, params: tuple = ()) -> int:
+        return conn.execute(f"select count(*) from ({query})", params).fetchone()[0]
+
+    written = {
+        "activities": loaded["actividad"],
+        "clients": loaded["cliente"],
+        "subscriptions": count(SUBSCRIPTIONS_QUERY, (since,)),
+        "balance": 1,
+        "charges": count(CHARGES_QUERY, (since, str(date.today()))),
+    }
     conn.close()
 
-    os.remove("../adjusted_backup.sql")
+    # Each charge also writes its transaction, and each client its contact.
+    written_rows = sum(written.values()) + written["charges"] + written["clients"]
+    stats = ImportStats(loaded, rejected, written, load_duration, load_duration + written_rows * WRITE_SECONDS_PER_ROW)
+    logger.info(f"Dry run of '{backup_path}': {stats}.")
+    return stats
 
 
 def load_bookings(booking_system: BookingSystem, path: str):
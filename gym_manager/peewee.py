@@ -1,36 +1,208 @@
 from __future__ import annotations
 
+import heapq
+import itertools
 import logging
+import sys
+from contextlib import contextmanager
 from datetime import date, datetime
-from typing import Generator, Iterable
+from decimal import Decimal
+from typing import Generator, Iterable, Any
 
 from peewee import (
     SqliteDatabase, Model, IntegerField, CharField, DateField, BooleanField, TextField, ForeignKeyField,
-    CompositeKey, prefetch, Proxy, JOIN, DateTimeField, chunked)
-from playhouse.sqlite_ext import JSONField
+    CompositeKey, prefetch, Proxy, JOIN, DateTimeField, chunked, fn, Tuple, Value, Field)
+from playhouse.sqlite_ext import JSONField, FTS5Model, SearchField, RowIDField
 
 from gym_manager.core.base import (
     Client, Number, String, Currency, Activity, Transaction, Subscription,
     Balance)
+from gym_manager.core.events import (
+    domain_events, ClientUpdated, ClientRemoved, ActivityUpdated, ActivityRemoved, TransactionsBound)
 from gym_manager.core.persistence import (
     ClientRepo, ActivityRepo, TransactionRepo, SubscriptionRepo, LRUCache,
-    BalanceRepo, FilterValuePair, PersistenceError, ClientView)
-from gym_manager.core.security import SecurityRepo, Responsible, Action, log_responsible
+    BalanceRepo, FilterValuePair, PersistenceError, ClientView, PageKey, ImportLog, CacheBudget, ClientViewMap)
+from gym_manager.core.security import SecurityRepo, Responsible, Action, LoggedAction, log_responsible
 
 logger = logging.getLogger(__name__)
 
 DATABASE_PROXY = Proxy()
 
+# Pragmas that are always applied, regardless of the configured connection profile.
+REQUIRED_PRAGMAS = {'foreign_keys': 1}
+# Pragmas reported by connection_profile().
+PROFILE_PRAGMAS = ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout',
+                   'foreign_keys')
 
-def create_database(url: str):
-    database = SqliteDatabase(url, pragmas={'foreign_keys': 1})
+# Name under which the archive database is attached.
+ARCHIVE_SCHEMA = "archive"
+# Rows dated before this date may have been moved to the archive. It is None while there is no archive attached.
+_archive_horizon: date | None = None
+
+
+def create_database(url: str, pragmas: dict[str, Any] | None = None):
+    """Creates the database and links it with the DATABASE_PROXY.
+
+    Args:
+        url: path of the sqlite database file.
+        pragmas: connection profile (journal_mode, synchronous, cache_size, mmap_size, temp_store, busy_timeout, ...)
+            applied each time a connection is opened. *REQUIRED_PRAGMAS* are always applied.
+    """
+    pragmas = {} if pragmas is None else dict(pragmas)
+    pragmas.update(REQUIRED_PRAGMAS)
+    database = SqliteDatabase(url, pragmas=pragmas)
     DATABASE_PROXY.initialize(database)
+    set_archive_horizon(None)
+
+
+def archive_horizon() -> date | None:
+    """Returns the date before which rows may live in the archive database, or None if there is no archive attached.
+    """
+    return _archive_horizon
+
+
+def set_archive_horizon(horizon: date | None):
+    """Sets the date before which the repositories also have to look for rows in the archive database.
+    """
+    global _archive_horizon
+    _archive_horizon = horizon
+
+
+def next_id(model: type[Model], archived_model: type[Model]) -> int | None:
+    """Returns an id for a new row of *model* that isn't used by *model* nor by *archived_model*, or None if there is no
+    archive attached, so sqlite picks it.
+
+    Sqlite gives a new row the greatest id of its table plus one. Once the rows with the greatest ids are archived, the
+    ids they had would be given again, and the new rows would be mixed up with the archived ones.
+    """
+    if archive_horizon() is None:
+        return None
+    return max(model.select(fn.MAX(model.id)).scalar() or 0,
+               archived_model.select(fn.MAX(archived_model.id)).scalar() or 0) + 1
+
+
+def with_new_ids(
+        rows: Iterable[tuple], fields: list[Field], model: type[Model], archived_model: type[Model]
+) -> tuple[Iterable[tuple], list[Field]]:
+    """Prepends to each one of the *rows* to insert into *model* an id given by next_id(), and the id field to
+    *fields*. If there is no archive attached, *rows* and *fields* are returned as they are.
+
+    The rows must be inserted in the same database transaction in which this function is called.
+    """
+    first_id = next_id(model, archived_model)
+    if first_id is None:
+        return rows, fields
+    return ((id_, *row) for id_, row in zip(itertools.count(first_id), rows)), [model.id, *fields]
+
+
+def connection_profile() -> dict[str, Any]:
+    """Returns the values of the pragmas in *PROFILE_PRAGMAS* that are in effect in the current connection.
+    """
+    return {pragma: DATABASE_PROXY.pragma(pragma) for pragma in PROFILE_PRAGMAS}
+
+
+def seek(query, order_by: tuple[Field, ...], page: int, page_len: int | None, after: PageKey | None = None,
+         descending: bool = False):
+    """Orders *query* by the *order_by* columns and limits it to one page.
+
+    If *after* is given, the page holds the rows that come after the one with that key, and *page* is ignored. The
+    rows before the key are skipped with an index lookup instead of an offset, so deep pages cost the same as the first
+    one.
+
+    Args:
+        query: query to paginate.
+        order_by: columns that sort the query. The last one must be unique, so each row has a different key.
+        page: page to retrieve when *after* is None.
+        page_len: rows per page. If None, the query isn't limited.
+        after: key of the last row of the previous page, with one value for each one of the *order_by* columns.
+        descending: if True, the rows are sorted in descending order.
+    """
+    if after is not None:
+        if len(after) != len(order_by):
+            raise ValueError(f"The [after={after}] key doesn't match the [order_by={order_by}] columns.")
+        row = Tuple(*order_by)
+        key = Tuple(*(Value(value, converter=field.db_value) for field, value in zip(order_by, after)))
+        query = query.where(row < key if descending else row > key)
+
+    query = query.order_by(*(field.desc() if descending else field for field in order_by))
+    if page_len is None:
+        return query
+    return query.limit(page_len) if after is not None else query.paginate(page, page_len)
+
+
+def seek_across_tiers(
+        hot_q, archive_q, order_by: tuple[Field, ...], archive_order_by: tuple[Field, ...], page: int,
+        page_len: int | None, after: PageKey | None = None
+) -> list:
+    """Same as seek(), in descending order, over the rows of *hot_q* followed by the rows of *archive_q*. Every
+    archived row must come after every hot row in that order, which holds for rows archived because they are older than
+    the archive horizon.
+
+    The archive is queried only when the hot rows don't fill the page, so the pages that are younger than the horizon
+    cost the same as before archiving.
+
+    Args:
+        hot_q: query over the hot table.
+        archive_q: the same query over the archive table, or None if there is no archive.
+        order_by: columns that sort *hot_q*.
+        archive_order_by: columns of the archive table that match *order_by*.
+        page: page to retrieve when *after* is None.
+        page_len: rows per page. If None, all the rows are retrieved.
+        after: key of the last row of the previous page.
+    """
+    rows = list(seek(hot_q, order_by, page, page_len, after, descending=True))
+    if archive_q is None or (page_len is not None and len(rows) == page_len):
+        return rows
+
+    archive_q = seek(archive_q, archive_order_by, page, None, after, descending=True)
+    if page_len is None:
+        return rows + list(archive_q)
+
+    offset = 0
+    if after is None and len(rows) == 0:
+        # The page starts in the archive, so the archived rows shown in the previous pages are skipped.
+        offset = (page - 1) * page_len - hot_q.count()
+    return rows + list(archive_q.limit(page_len - len(rows)).offset(offset))
+
+
+class CurrencyField(IntegerField):
+    """Stores a Currency as an integer amount of cents, so sums and comparisons can be done by the database.
+
+    Values that aren't a Currency (str, int, float or Decimal) are interpreted as currency units, the same way the
+    Currency constructor does.
+    """
+
+    def db_value(self, value):
+        if value is None:
+            return None
+        if not isinstance(value, Currency):
+            value = Currency(value)
+        return value.as_cents()
+
+    def python_value(self, value):
+        return None if value is None else Currency.from_cents(value)
 
 
 def client_name_like(client, filter_value) -> bool:
     return client.cli_name.contains(filter_value)
 
 
+def prefix_match_query(text: str) -> str:
+    """Builds a full-text query that matches the rows that have words starting with each of the words in *text*.
+    """
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in text.split())
+
+
+def client_name_match(client, filter_value):
+    """Filters the clients that have a name with words starting with the ones in *filter_value*, ignoring accents and
+    case. The lookup is done in the ClientSearch full-text index.
+    """
+    query = prefix_match_query(str(filter_value))
+    if len(query) == 0:  # There are no words to match, so every client passes the filter.
+        return client.id.is_null(False)
+    return client.id.in_(ClientSearch.select(ClientSearch.rowid).where(ClientSearch.match(query)))
+
+
 class ClientTable(Model):
     id = IntegerField(primary_key=True)
     dni = IntegerField(unique=True, null=True)
@@ -43,55 +215,75 @@ class ClientTable(Model):
         database = DATABASE_PROXY
 
 
+class ClientSearch(FTS5Model):
+    """Full-text index of the client names. Its content is read from ClientTable, and it is kept up to date by triggers
+    created in the schema migrations.
+    """
+    rowid = RowIDField()
+    cli_name = SearchField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        # Diacritics are removed, so 'Gonzalez' matches 'González'. Prefixes of 2 and 3 chars are indexed, so the
+        # lookups done while the user is still typing are fast.
+        options = {'content': ClientTable, 'content_rowid': ClientTable.id,
+                   'tokenize': "unicode61 remove_diacritics 2", 'prefix': "2 3"}
+
+
+class ArchivedClientTable(Model):
+    """Inactive clients moved to the archive database. Archived tables have the same columns as their hot tables, but
+    no foreign keys, because sqlite can't enforce them across databases.
+    """
+    id = IntegerField(primary_key=True)
+    dni = IntegerField(null=True, index=True)
+    cli_name = CharField()
+    admission = DateField()
+    birth_day = DateField()
+    is_active = BooleanField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        schema = ARCHIVE_SCHEMA
+        table_name = "clienttable"
+
+
 class SqliteClientRepo(ClientRepo):
     """Clients repository implementation based on Sqlite and peewee ORM.
     """
 
-    def __init__(self, activity_repo: ActivityRepo, transaction_repo: TransactionRepo, cache_len: int = 50) -> None:
+    def __init__(
+            self, activity_repo: ActivityRepo, transaction_repo: TransactionRepo, cache_len: int = 50,
+            cache_budget: CacheBudget | None = None
+    ) -> None:
         DATABASE_PROXY.create_tables([ClientTable, ActivityTable, SubscriptionTable, TransactionTable])
 
         self.activity_repo = activity_repo
         self.transaction_repo = transaction_repo
 
-        self.cache = LRUCache(int, value_type=Client, max_len=cache_len)
+        # The size of a client includes its subscriptions and their charges.
+        self.cache = LRUCache(int, value_type=Client, max_len=cache_len, name="clients", check_types=False,
+                              budget=cache_budget, shared_types=(Activity,))
 
         # Links this repo with the ClientView, so they can be refreshed after a client change.
         ClientView.repository = self
-        self._views: dict[int, ClientView] = {}
-
-    def get(self, id_: int) -> Client:
-        if id_ in self.cache:
-            return self.cache[id_]
+        self.views = ClientViewMap()
 
-        client_q = ClientTable.select().where(ClientTable.id == id_)
+        domain_events.subscribe(ClientUpdated, self._on_client_updated)
+        domain_events.subscribe(ClientRemoved, self._on_client_removed)
+        domain_events.subscribe(ActivityRemoved, self._on_activity_removed)
 
-        # Query that contains subs that don't have a charge associated and subs that do.
-        predicate = (SubscriptionTable.client_id == SubscriptionCharge.client_id) & (SubscriptionTable.activity_id ==
-                                                                                     SubscriptionCharge.activity_id)
-        subscriptions_q = SubscriptionTable.select().join(SubscriptionCharge, JOIN.LEFT_OUTER, on=predicate)
+    def get(self, id_: int) -> Client:
+        client = self.cache.get(id_)
+        if client is not None:
+            return client
 
-        record = [record for record in prefetch(client_q, subscriptions_q)][0]
+        record = ClientTable.get_by_id(id_)
 
         logger.getChild(type(self).__name__).info(f"Creating Client [client.id={record.id}] from queried data.")
-        client = Client(record.id, String(record.cli_name), record.admission, record.birth_day,
-                        Number(record.dni if record.dni is not None else ""))
+        client = Client(record.id, String.trusted(record.cli_name), record.admission, record.birth_day,
+                        Number.trusted(record.dni))
+        self._load_subscriptions({client.id: client})
         self.cache[record.id] = client
-        subs = {}
-        for sub_record in record.subscriptions:
-            subs[sub_record.activity_id] = Subscription(sub_record.when, client,
-                                                        self.activity_repo.get(sub_record.activity_id))
-        for sub_charge in record.subscriptions_charges:
-            year, month = sub_charge.when.year, sub_charge.when.month
-            trans_record = sub_charge.transaction
-            subs[sub_charge.activity_id].add_transaction(
-                year, month, self.transaction_repo.from_data(
-                    trans_record.id, trans_record.type, trans_record.when, trans_record.amount,
-                    trans_record.method, trans_record.responsible, trans_record.description, client,
-                    trans_record.balance_id
-                )
-            )
-        for subscription in subs.values():
-            client.add(subscription)
 
         return client
 
@@ -114,11 +306,14 @@ class SqliteClientRepo(ClientRepo):
 
         record = ClientTable.get_or_none(
             ClientTable.dni == dni.as_primitive()) if dni.as_primitive() is not None else None
+        if record is None and dni.as_primitive() is not None and archive_horizon() is not None:
+            record = self._restore_archived(dni)
         if record is None:
             # record will be None if *dni* is None or if there is no client in the table whose dni matches it.
             logger.getChild(type(self).__name__).info(f"Creating client [client.dni={dni}].")
-            record = ClientTable.create(dni=dni.as_primitive(), cli_name=name.as_primitive(), admission=admission,
-                                        birth_day=birthday, is_active=True)
+            record = ClientTable.create(id=next_id(ClientTable, ArchivedClientTable), dni=dni.as_primitive(),
+                                        cli_name=name.as_primitive(), admission=admission, birth_day=birthday,
+                                        is_active=True)
         else:
             # There is an inactive client whose dni matches with the received one.
             logger.getChild(type(self).__name__).info(f"Reactivating client [client.dni={dni}].")
@@ -127,17 +322,32 @@ class SqliteClientRepo(ClientRepo):
 
         client = Client(record.id, name, admission, birthday, dni)
         self.cache[client.id] = client
-
-        if client.dni.as_primitive() is not None:
-            for view in self._views.values():
-                # If there is a view whose dni matches with the dni of the new (or activated client), update it.
-                if view.dni is not None and client.dni == view.dni:
-                    view.dni = client.dni
-                    view.name = client.name
-                    break
+        domain_events.publish(ClientUpdated(client))
 
         return client
 
+    @staticmethod
+    def _restore_archived(dni: Number) -> ClientTable | None:
+        """Moves the archived client with the given *dni* back to the hot tier, so it is reactivated with its old id.
+
+        Raises:
+            PersistenceError if a hot client already has the id of the archived one.
+        """
+        archived = ArchivedClientTable.get_or_none(ArchivedClientTable.dni == dni.as_primitive())
+        if archived is None:
+            return None
+
+        # New clients never take an id of the archive, see next_id(), so a clash means the tiers are inconsistent.
+        if ClientTable.get_or_none(ClientTable.id == archived.id) is not None:
+            raise PersistenceError(f"The archived client [client.id={archived.id}] can't be restored, because its id "
+                                   f"is used by another client.")
+
+        with DATABASE_PROXY.atomic():
+            record = ClientTable.create(id=archived.id, dni=archived.dni, cli_name=archived.cli_name,
+                                        admission=archived.admission, birth_day=archived.birth_day, is_active=False)
+            ArchivedClientTable.delete_by_id(archived.id)
+        return record
+
     @log_responsible("remove_client", lambda client: f"Eliminado cliente '{client.name}'.")
     def remove(self, client: Client):
         """Marks the given *client* as inactive, and delete its subscriptions.
@@ -145,9 +355,9 @@ class SqliteClientRepo(ClientRepo):
         record = ClientTable.get_by_id(client.id)
         record.is_active = False
         record.save()
-        self.cache.pop(client.id)
-        # The view isn't removed from the view cache, because it still may be used by a Transaction or a Booking.
+        # The view isn't removed from the view map, because it still may be used by a Transaction or a Booking.
         SubscriptionTable.delete().where(SubscriptionTable.client_id == client.id).execute()
+        domain_events.publish(ClientRemoved(client))
 
         return client
 
@@ -163,30 +373,81 @@ class SqliteClientRepo(ClientRepo):
         record.cli_name = client.name.as_primitive()
         record.birth_day = client.birth_day
         record.save()
+        domain_events.publish(ClientUpdated(client))
+
+    def _on_client_updated(self, event: ClientUpdated):
+        # Refreshes the view of the client, or the view whose dni matches with the dni of a new (or activated) client.
+        view = self.views.get(event.client.id)
+        if view is None:
+            view = self.views.match(event.client.dni)
+        if view is not None:
+            self.views.refresh(view, event.client)
+
+    def _on_client_removed(self, event: ClientRemoved):
+        if event.client.id in self.cache:
+            self.cache.pop(event.client.id)
+
+    def _on_activity_removed(self, event: ActivityRemoved):
+        for client in self.cache.values():
+            if client.is_subscribed(event.activity):
+                client.unsubscribe(event.activity)
+
+    def _load_subscriptions(self, clients: dict[int, Client]):
+        """Adds to each one of the *clients* its subscriptions and the charges registered for them. Only the rows of the
+        given clients are queried, so the cost doesn't depend on the amount of transactions in the repository.
+
+        Args:
+            clients: clients to load, keyed by their id.
+        """
+        if len(clients) == 0:
+            return
+
+        subs: dict[tuple[int, int], Subscription] = {}
+        subscriptions_q = SubscriptionTable.select().where(SubscriptionTable.client_id.in_(list(clients)))
+        for sub_record in subscriptions_q:
+            subs[(sub_record.client_id, sub_record.activity_id)] = Subscription(
+                sub_record.when, clients[sub_record.client_id], self.activity_repo.get(sub_record.activity_id)
+            )
 
-        if client.id in self._views:  # Refreshes the view of the updated client, if there is one.
-            self._views[client.id].dni = client.dni
-            self._views[client.id].name = client.name
-
-    def _create_subscriptions(self, client: Client, subscriptions, subscriptions_charges):
-        subs = {}
-        for sub_record in subscriptions:
-            subs[sub_record.activity_id] = Subscription(sub_record.when, client,
-                                                        self.activity_repo.get(sub_record.activity_id))
-        for sub_charge in subscriptions_charges:
-            year, month = sub_charge.year, sub_charge.month
-            trans_record = sub_charge.transaction
-            subs[sub_charge.activity_id].add_transaction(
-                year, month, self.transaction_repo.from_data(
-                    trans_record.id, trans_record.type, trans_record.when, trans_record.amount,
-                    trans_record.method, trans_record.responsible, trans_record.description, client,
-                    trans_record.balance_id
+        # Charges of subscriptions that no longer exist are excluded by the join.
+        charges_q = (SubscriptionCharge.select(SubscriptionCharge.client_id, SubscriptionCharge.activity_id,
+                                               SubscriptionCharge.year, SubscriptionCharge.month, TransactionTable.id,
+                                               TransactionTable.type, TransactionTable.when, TransactionTable.amount,
+                                               TransactionTable.method, TransactionTable.responsible,
+                                               TransactionTable.description, TransactionTable.balance_id)
+                     .join(TransactionTable, on=SubscriptionCharge.transaction == TransactionTable.id)
+                     .switch(SubscriptionCharge)
+                     .join(SubscriptionTable, on=(SubscriptionTable.client_id == SubscriptionCharge.client_id)
+                                                 & (SubscriptionTable.activity_id == SubscriptionCharge.activity_id))
+                     .where(SubscriptionCharge.client_id.in_(list(clients))))
+        if archive_horizon() is not None:  # The charges of the old months may have been archived.
+            charges_q = charges_q | (
+                ArchivedSubscriptionCharge.select(
+                    ArchivedSubscriptionCharge.client_id, ArchivedSubscriptionCharge.activity_id,
+                    ArchivedSubscriptionCharge.year, ArchivedSubscriptionCharge.month, ArchivedTransactionTable.id,
+                    ArchivedTransactionTable.type, ArchivedTransactionTable.when, ArchivedTransactionTable.amount,
+                    ArchivedTransactionTable.method, ArchivedTransactionTable.responsible,
+                    ArchivedTransactionTable.description, ArchivedTransactionTable.balance_id
                 )
+                .join(ArchivedTransactionTable,
+                      on=ArchivedSubscriptionCharge.transaction_id == ArchivedTransactionTable.id)
+                .switch(ArchivedSubscriptionCharge)
+                .join(SubscriptionTable, on=(SubscriptionTable.client_id == ArchivedSubscriptionCharge.client_id)
+                                            & (SubscriptionTable.activity_id == ArchivedSubscriptionCharge.activity_id))
+                .where(ArchivedSubscriptionCharge.client_id.in_(list(clients)))
             )
-        return subs.values()
+        for (client_id, activity_id, year, month, trans_id, type_, when, amount, method, responsible, description,
+             balance_date) in charges_q.tuples():
+            subs[(client_id, activity_id)].add_transaction(year, month, self.transaction_repo.from_data(
+                trans_id, type_, when, amount, method, responsible, description, clients[client_id], balance_date
+            ))
+
+        for subscription in subs.values():
+            subscription.client.add(subscription)
 
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Client, None, None]:
         """Retrieve all the clients in the repository.
 
@@ -194,6 +455,7 @@ class SqliteClientRepo(ClientRepo):
             page: page to retrieve.
             page_len: clients per page. If None, retrieve all clients.
             filters: filters to apply.
+            after: if given, retrieve the page that follows the client with this key, instead of *page*.
         """
         clients_q = ClientTable.select()
         clients_q = clients_q.where(ClientTable.is_active)  # Retrieve only active clients.
@@ -202,28 +464,27 @@ class SqliteClientRepo(ClientRepo):
             for filter_, value in filters:
                 clients_q = clients_q.where(filter_.passes_in_repo(ClientTable, value))
 
-        if page_len is not None:
-            clients_q = clients_q.order_by(ClientTable.cli_name).paginate(page, page_len)
-
-        # Query that contains subs that don't have a charge associated and subs that do.
-        predicate = (SubscriptionTable.client_id == SubscriptionCharge.client_id) & (SubscriptionTable.activity_id ==
-                                                                                     SubscriptionCharge.activity_id)
-        subscriptions_q = SubscriptionTable.select().join(SubscriptionCharge, JOIN.LEFT_OUTER, on=predicate)
-        for record in prefetch(clients_q, subscriptions_q, TransactionTable.select()):
-            if record.id not in self.cache:
-                logger.getChild(type(self).__name__).info(f"Creating Client [client.id={record.id}] from queried data.")
-                client = Client(record.id, String(record.cli_name), record.admission, record.birth_day,
-                                Number(record.dni if record.dni is not None else ""))
-                self.cache[record.id] = client
-                for subscription in self._create_subscriptions(client, record.subscriptions,
-                                                               record.subscriptions_charges):
-                    client.add(subscription)
+        if page_len is not None or after is not None:
+            clients_q = seek(clients_q, (ClientTable.cli_name, ClientTable.id), page, page_len, after)
+
+        clients, loaded = {}, {}
+        for record in clients_q:
+            client = self.cache.get(record.id)
+            if client is not None:
+                clients[record.id] = client
             else:
-                removed_activities = [subscription.activity for subscription in self.cache[record.id].subscriptions()
-                                      if subscription.activity.removed]
-                for activity in removed_activities:
-                    self.cache[record.id].unsubscribe(activity)
-            yield self.cache[record.id]
+                logger.getChild(type(self).__name__).info(f"Creating Client [client.id={record.id}] from queried data.")
+                clients[record.id] = loaded[record.id] = Client(
+                    record.id, String.trusted(record.cli_name), record.admission, record.birth_day,
+                    Number.trusted(record.dni)
+                )
+        # Subscriptions and charges are queried only for the clients of the page that aren't cached.
+        self._load_subscriptions(loaded)
+
+        for id_, client in clients.items():
+            if id_ in loaded:
+                self.cache[id_] = client
+            yield client
 
     def count(self, filters: list[FilterValuePair] | None = None) -> int:
         """Counts the number of clients in the repository.
@@ -234,8 +495,29 @@ class SqliteClientRepo(ClientRepo):
                 clients_q = clients_q.where(filter_.passes_in_repo(ClientTable, value))
         return clients_q.count()
 
+    def name_match(self, to_filter, filter_value):
+        """Translate function of the filters by client name, done with the ClientSearch full-text index. See
+        client_name_match().
+        """
+        return client_name_match(to_filter, filter_value)
+
+    def recently_served(self, limit: int) -> list[int]:
+        """Returns the ids of the *limit* active clients with the most recent transactions, the most recent first.
+        """
+        last_id = fn.MAX(TransactionTable.id)
+        served_q = (TransactionTable.select(TransactionTable.client, last_id)
+                    .join(ClientTable, on=TransactionTable.client == ClientTable.id)
+                    .where(ClientTable.is_active)
+                    .group_by(TransactionTable.client)
+                    .order_by(last_id.desc())
+                    .limit(limit))
+        return [client_id for client_id, _ in served_q.tuples()]
+
     def register_view(self, view: ClientView):
-        self._views[view.id] = view
+        self.views.add(view)
+
+    def get_view(self, id_: int) -> ClientView | None:
+        return self.views.get(id_)
 
     def add_all(self, raw_clients: Iterable[tuple]):
         """Adds the clients in the iterable directly into the repository, without creating Client objects.
@@ -249,7 +531,7 @@ class SqliteClientRepo(ClientRepo):
 class ActivityTable(Model):
     id = IntegerField(primary_key=True)
     act_name = CharField()
-    price = CharField()
+    price = CurrencyField()
     charge_once = BooleanField()
     description = TextField()
     locked = BooleanField()
@@ -265,17 +547,18 @@ class SqliteActivityRepo(ActivityRepo):
     def __init__(self, cache_len: int = 50) -> None:
         DATABASE_PROXY.create_tables([ActivityTable, SubscriptionTable, SubscriptionCharge])
 
-        self.cache = LRUCache(int, Activity, max_len=cache_len)
+        self.cache = LRUCache(int, Activity, max_len=cache_len, name="activities", check_types=False)
 
     def create(
             self, name: String, price: Currency, description: String, charge_once: bool = False, locked: bool = False
     ) -> Activity:
         """Creates an activity with the given data.
         """
-        record = ActivityTable.create(act_name=name.as_primitive(), price=str(price), charge_once=charge_once,
+        record = ActivityTable.create(act_name=name.as_primitive(), price=price, charge_once=charge_once,
                                       description=description.as_primitive(), locked=locked)
-        self.cache[record.id] = Activity(record.id, name, price, description, charge_once, locked)
-        return self.cache[record.id]
+        activity = Activity(record.id, name, price, description, charge_once, locked)
+        self.cache[record.id] = activity
+        return activity
 
     def exists(self, id_: int) -> bool:
         if id_ in self.cache:  # First search in the cache.
@@ -289,19 +572,20 @@ class SqliteActivityRepo(ActivityRepo):
         Raises:
             KeyError if there is no activity with the given *id_*.
         """
-        if id_ in self.cache:
-            return self.cache[id_]
+        activity = self.cache.get(id_)
+        if activity is not None:
+            return activity
 
         record = ActivityTable.get_or_none(id=id_)
         if record is None:
             raise KeyError(f"There is no activity with the id '{id_}'")
 
         # The activity description was validated when it was created.
-        self.cache[id_] = Activity(id_, String(record.act_name), Currency(record.price),
-                                   String(record.description, optional=True), record.charge_once, record.locked)
-        logger.getChild(type(self).__name__).info(f"Creating Activity [activity.name={self.cache[id_]}] from queried "
-                                                  f"data.")
-        return self.cache[id_]
+        activity = Activity(id_, String.trusted(record.act_name), record.price, String.trusted(record.description),
+                            record.charge_once, record.locked)
+        self.cache[id_] = activity
+        logger.getChild(type(self).__name__).info(f"Creating Activity [activity.name={activity}] from queried data.")
+        return activity
 
     def remove(self, activity: Activity):
         """Removes the given *activity*.
@@ -314,39 +598,43 @@ class SqliteActivityRepo(ActivityRepo):
 
         self.cache.pop(activity.id)
         ActivityTable.delete_by_id(activity.id)
+        activity.removed = True
+        domain_events.publish(ActivityRemoved(activity))
 
         return activity
 
     def update(self, activity: Activity):
         record = ActivityTable.get_by_id(activity.id)
         record.act_name = activity.name.as_primitive()
-        record.price = str(activity.price)
+        record.price = activity.price
         record.description = activity.description.as_primitive()
         record.save()
+        domain_events.publish(ActivityUpdated(activity))
 
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Activity, None, None]:
         activities_q = ActivityTable.select()
         if filters is not None:
             for filter_, value in filters:
                 activities_q = activities_q.where(filter_.passes_in_repo(ActivityTable, value))
 
-        if page_len is not None:
-            activities_q = activities_q.order_by(ActivityTable.act_name).paginate(page, page_len)
+        if page_len is not None or after is not None:
+            activities_q = seek(activities_q, (ActivityTable.act_name, ActivityTable.id), page, page_len, after)
 
         for record in activities_q:
             activity: Activity
             # The activity name and description were validated when it was created.
-            activity_name = String(record.act_name)
-            if record.id not in self.cache:
+            activity_name = String.trusted(record.act_name)
+            activity = self.cache.get(record.id)
+            if activity is None:
                 logger.getChild(type(self).__name__).info(f"Creating Activity [activity.name={activity_name}] from "
                                                           f"queried data.")
-                self.cache[record.id] = Activity(
-                    record.id, activity_name, Currency(record.price), String(record.description, optional=True),
-                    record.charge_once, record.locked
-                )
-            yield self.cache[record.id]
+                activity = Activity(record.id, activity_name, record.price, String.trusted(record.description),
+                                    record.charge_once, record.locked)
+                self.cache[record.id] = activity
+            yield activity
 
     def n_subscribers(self, activity: Activity) -> int:
         """Returns the number of clients that are signed up in the given *activity*.
@@ -386,7 +674,6 @@ class SqliteBalanceRepo(BalanceRepo):
         DATABASE_PROXY.create_tables([BalanceTable])
 
         self.transaction_repo = transaction_repo
-        self.client_view_cache = LRUCache(int, ClientView, max_len=64)
 
     def balance_done(self, when: date) -> bool:
         return BalanceTable.get_or_none(BalanceTable.when == when) is not None
@@ -406,12 +693,26 @@ class SqliteBalanceRepo(BalanceRepo):
         for type_, type_balance in json_balance.items():
             _balance[type_] = {}
             for method, method_balance in type_balance.items():
-                _balance[type_][method] = Currency(method_balance)
+                # The amounts were written by balance_to_json as Decimal strings, so they aren't validated again.
+                _balance[type_][method] = Currency.trusted(Decimal(method_balance))
         return _balance
 
-    def add(self, when: date, responsible: String, balance: Balance):
-        BalanceTable.create(when=when, responsible=responsible.as_primitive(),
-                            balance_dict=self.balance_to_json(balance))
+    def add(
+            self, when: date, responsible: String, balance: Balance, transactions: Iterable[Transaction] | None = ()
+    ):
+        """Adds the *balance* of *when* and binds the *transactions* to it. Both things are done atomically, so either
+        the balance is added with all its transactions bound, or nothing is done. If *transactions* is None, all the
+        transactions that aren't bound to a balance are bound to it, with one UPDATE.
+        """
+        with DATABASE_PROXY.atomic():
+            BalanceTable.create(when=when, responsible=responsible.as_primitive(),
+                                balance_dict=self.balance_to_json(balance))
+            if transactions is None:
+                transactions = self.transaction_repo.bind_unbalanced(when)
+            else:
+                transactions = tuple(transactions)
+                self.transaction_repo.bind_to_balance_many(transactions, when)
+        domain_events.publish(TransactionsBound(transactions, when))
 
     def all(
             self, from_date: date, to_date: date
@@ -420,24 +721,41 @@ class SqliteBalanceRepo(BalanceRepo):
         client_q = ClientTable.select(ClientTable.id, ClientTable.dni, ClientTable.cli_name)
         transaction_q = TransactionTable.select().order_by(TransactionTable.id.desc())
 
+        # Transactions of the balances older than the archive horizon may have been archived.
+        archived: dict[date, list[Transaction]] = {}
+        horizon = archive_horizon()
+        if horizon is not None and from_date < horizon:
+            archived_q = archived_transactions_q().where(ArchivedTransactionTable.balance_id >= from_date,
+                                                         ArchivedTransactionTable.balance_id <= to_date)
+            for record in archived_q:
+                client = None
+                if record.client_id is not None:
+                    client = ClientView.of(record.client_id, String.trusted(record.cli_name),
+                                           created_by="SqliteBalanceRepo.all",
+                                           dni=Number.trusted(record.dni))
+                archived.setdefault(record.balance_id, []).append(self.transaction_repo.from_data(
+                    record.id, record.type, record.when, record.amount, record.method, record.responsible,
+                    record.description, client, record.balance_id
+                ))
+
         for record in prefetch(balance_q.order_by(BalanceTable.when.desc()), transaction_q, client_q):
             transactions = []
             for transaction_record in record.transactions:
                 client_record, client = transaction_record.client, None
                 if client_record is not None:
-                    if client_record.id in self.client_view_cache:
-                        client = self.client_view_cache[client_record.id]
-                    else:
-                        client = ClientView(client_record.id, String(client_record.cli_name),
-                                            created_by="SqliteBalanceRepo.all",
-                                            dni=Number(client_record.dni if client_record.dni is not None else ""))
+                    client = ClientView.of(client_record.id, String.trusted(client_record.cli_name),
+                                           created_by="SqliteBalanceRepo.all",
+                                           dni=Number.trusted(client_record.dni))
 
                 transactions.append(self.transaction_repo.from_data(
                     transaction_record.id, transaction_record.type, transaction_record.when,
                     transaction_record.amount, transaction_record.method, transaction_record.responsible,
                     transaction_record.description, client, transaction_record.balance_id
                 ))
-            yield record.when, String(record.responsible), self.json_to_balance(record.balance_dict), transactions
+            if record.when in archived:
+                transactions = sorted(transactions + archived[record.when], key=lambda t: t.id, reverse=True)
+            responsible = String.interned(record.responsible)
+            yield record.when, responsible, self.json_to_balance(record.balance_dict), transactions
 
 
 class TransactionTable(Model):
@@ -445,7 +763,7 @@ class TransactionTable(Model):
     type = CharField()
     client = ForeignKeyField(ClientTable, backref="transactions", null=True)
     when = DateField()
-    amount = CharField()
+    amount = CurrencyField()
     method = CharField()
     responsible = CharField()
     description = CharField()
@@ -455,43 +773,86 @@ class TransactionTable(Model):
         database = DATABASE_PROXY
 
 
+class ArchivedTransactionTable(Model):
+    """Transactions of old balances moved to the archive database.
+    """
+    id = IntegerField(primary_key=True)
+    type = CharField()
+    client_id = IntegerField(null=True)
+    when = DateField()
+    amount = CurrencyField()
+    method = CharField()
+    responsible = CharField()
+    description = CharField()
+    balance_id = DateField(null=True, index=True)
+
+    class Meta:
+        database = DATABASE_PROXY
+        schema = ARCHIVE_SCHEMA
+        table_name = "transactiontable"
+
+
+def archived_transactions_q():
+    """Returns a query of the archived transactions, with the name and dni of their clients. The clients are looked up
+    in both tiers, because they may have been archived too.
+    """
+    return (ArchivedTransactionTable
+            .select(ArchivedTransactionTable,
+                    fn.COALESCE(ClientTable.cli_name, ArchivedClientTable.cli_name).alias("cli_name"),
+                    fn.COALESCE(ClientTable.dni, ArchivedClientTable.dni).alias("dni"))
+            .join_from(ArchivedTransactionTable, ClientTable, JOIN.LEFT_OUTER,
+                       on=ArchivedTransactionTable.client_id == ClientTable.id)
+            .join_from(ArchivedTransactionTable, ArchivedClientTable, JOIN.LEFT_OUTER,
+                       on=ArchivedTransactionTable.client_id == ArchivedClientTable.id)
+            .objects())
+
+
 class SqliteTransactionRepo(TransactionRepo):
     """Transaction repository implementation based on Sqlite and peewee ORM.
     """
 
     # noinspection PyProtectedMember
-    def __init__(self, methods: Iterable[str] | None = None, cache_len: int = 50) -> None:
+    def __init__(
+            self, methods: Iterable[str] | None = None, cache_len: int = 50, cache_budget: CacheBudget | None = None
+    ) -> None:
         super().__init__(methods)
         DATABASE_PROXY.create_tables([TransactionTable, BalanceTable])
 
-        self.cache = LRUCache(int, Transaction, max_len=cache_len)
-        # In the worst case the cache can store as many clients views as transactions, supposing each transaction has
-        # a different client.
-        self.client_view_cache = LRUCache(int, ClientView, max_len=cache_len)
+        # Reports like the balance history go through hundreds of transactions, so the caches resist scans.
+        self.cache = LRUCache(int, Transaction, max_len=cache_len, name="transactions", check_types=False,
+                              policy="2q", budget=cache_budget, shared_types=(Client,))
+        domain_events.subscribe(TransactionsBound, self._on_transactions_bound)
 
     # ToDo make arguments mandatory.
     def from_data(
-            self, id_: int, type_: str | None = None, when: date | None = None, raw_amount: str | None = None,
+            self, id_: int, type_: str | None = None, when: date | None = None, amount: Currency | None = None,
             method: str | None = None, raw_responsible: str | None = None, description: str | None = None,
             client: Client | None = None, balance_date: date | None = None
     ) -> Transaction:
         """If there is an existing Transaction with the given *id_*, return it. If not, and all others arguments aren't
         None, create a new Transaction and return it.
         """
-        if id_ in self.cache:
-            return self.cache[id_]
+        transaction = self.cache.get(id_)
+        if transaction is not None:
+            return transaction
 
-        if (type_ is None and when is None and raw_amount is None and method is None and raw_responsible is None
+        if (type_ is None and when is None and amount is None and method is None and raw_responsible is None
                 and description is None):
-            record = TransactionTable.get_by_id(id_)
-            self.cache[id_] = Transaction(id_, record.type, record.when, Currency(record.amount), record.method,
-                                          String(record.responsible), record.description, client, record.balance_id)
-        else:
-            self.cache[id_] = Transaction(id_, type_, when, Currency(raw_amount), method, String(raw_responsible),
-                                          description, client, balance_date)
+            record = TransactionTable.get_or_none(TransactionTable.id == id_)
+            if record is None and archive_horizon() is not None:
+                record = ArchivedTransactionTable.get_or_none(ArchivedTransactionTable.id == id_)
+            if record is None:
+                raise KeyError(f"There is no transaction with the id '{id_}'")
+            type_, when, amount, method, raw_responsible = (record.type, record.when, record.amount, record.method,
+                                                            record.responsible)
+            description, balance_date = record.description, record.balance_id
+        # Types, methods and responsibles repeat a lot, so all the transactions share the same objects.
+        transaction = Transaction(id_, sys.intern(type_), when, amount, sys.intern(method),
+                                  String.interned(raw_responsible), description, client, balance_date)
+        self.cache[id_] = transaction
 
         logger.getChild(type(self).__name__).info(f"Creating Transaction [transaction.id={id_}] from queried data.")
-        return self.cache[id_]
+        return transaction
 
     # noinspection PyShadowingBuiltins
     def create(
@@ -504,19 +865,22 @@ class SqliteTransactionRepo(TransactionRepo):
             print(type, when, amount, method, description, client.name)
             raise Exception
         # There is no need to check the cache because the Transaction is being created, it didn't exist before.
-        record = TransactionTable.create(type=type, client=client.id if client is not None else None, when=when,
-                                         amount=amount.as_primitive(), method=method,
+        record = TransactionTable.create(id=next_id(TransactionTable, ArchivedTransactionTable), type=type,
+                                         client=client.id if client is not None else None, when=when,
+                                         amount=amount, method=method,
                                          responsible=responsible.as_primitive(), description=description)
 
-        self.cache[record.id] = Transaction(record.id, type, when, amount, method, responsible, description, client)
-        return self.cache[record.id]
+        transaction = Transaction(record.id, type, when, amount, method, responsible, description, client)
+        self.cache[record.id] = transaction
+        return transaction
 
     def all(
             self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
-            without_balance: bool = True, balance_date: date | None = None
+            without_balance: bool = True, balance_date: date | None = None, after: PageKey | None = None
     ) -> Generator[Transaction, None, None]:
-        transactions_q = TransactionTable.select(TransactionTable, ClientTable.cli_name, ClientTable.dni)
-        transactions_q = transactions_q.order_by(TransactionTable.id.desc())
+        # The client id is selected too, otherwise the joined client replaces the foreign key with an empty id.
+        transactions_q = TransactionTable.select(TransactionTable, ClientTable.id, ClientTable.cli_name,
+                                                 ClientTable.dni)
 
         if without_balance:  # Retrieve transactions that weren't linked to a balance.
             transactions_q = transactions_q.where(TransactionTable.balance.is_null())
@@ -530,25 +894,116 @@ class SqliteTransactionRepo(TransactionRepo):
             for filter_, value in filters:
                 transactions_q = transactions_q.where(filter_.passes_in_repo(TransactionTable, value))
 
+        if not self._in_archive(balance_date):
+            transactions_q = seek(transactions_q, (TransactionTable.id,), page, page_len, after, descending=True)
+            yield from self._from_hot(transactions_q, created_by="SqliteTransactionRepo.all")
+            return
+
+        archived_q = archived_transactions_q().where(ArchivedTransactionTable.balance_id == balance_date)
+        if filters is not None:
+            for filter_, value in filters:
+                archived_q = archived_q.where(filter_.passes_in_repo(ArchivedTransactionTable, value))
+        transactions_q = seek(transactions_q, (TransactionTable.id,), page, None, after, descending=True)
+        archived_q = seek(archived_q, (ArchivedTransactionTable.id,), page, None, after, descending=True)
+
+        # Both tiers are sorted by id, so they are merged and paginated without sorting them again.
+        transactions = heapq.merge(self._from_hot(transactions_q, created_by="SqliteTransactionRepo.all"),
+                                   self._from_archive(archived_q, created_by="SqliteTransactionRepo.all"),
+                                   key=lambda transaction: transaction.id, reverse=True)
         if page_len is not None:
-            transactions_q = transactions_q.paginate(page, page_len)
+            skipped = 0 if after is not None else (page - 1) * page_len
+            transactions = itertools.islice(transactions, skipped, skipped + page_len)
+        yield from transactions
 
+    @staticmethod
+    def _in_archive(balance_date: date | None) -> bool:
+        """Returns True if the transactions of the balance of *balance_date* may have been archived.
+        """
+        horizon = archive_horizon()
+        return balance_date is not None and horizon is not None and balance_date < horizon
+
+    def _from_hot(self, transactions_q, created_by: str) -> Generator[Transaction, None, None]:
+        """Creates the transactions of *transactions_q*, a query of TransactionTable joined with ClientTable.
+        """
         for record in transactions_q:
             client_record, client = record.client, None
             if client_record is not None:
-                if client_record.id in self.client_view_cache:
-                    client = self.client_view_cache[client_record.id]
-                else:
-                    client = ClientView(client_record.id, String(client_record.cli_name),
-                                        created_by="SqliteTransactionRepo.all",
-                                        dni=Number(client_record.dni if client_record.dni is not None else ""))
+                client = ClientView.of(client_record.id, String.trusted(client_record.cli_name), created_by=created_by,
+                                       dni=Number.trusted(client_record.dni))
+            yield self.from_data(record.id, record.type, record.when, record.amount, record.method, record.responsible,
+                                 record.description, client, record.balance_id)
+
+    def _from_archive(self, archived_q, created_by: str) -> Generator[Transaction, None, None]:
+        """Creates the transactions of *archived_q*, a query built from archived_transactions_q().
+        """
+        for record in archived_q:
+            client = None
+            if record.client_id is not None:
+                client = ClientView.of(record.client_id, String.trusted(record.cli_name), created_by=created_by,
+                                       dni=Number.trusted(record.dni))
             yield self.from_data(record.id, record.type, record.when, record.amount, record.method, record.responsible,
-                                 record.description, client, record.balance)
+                                 record.description, client, record.balance_id)
 
     def bind_to_balance(self, transaction: Transaction, balance_date: date):
         record = TransactionTable.get_by_id(transaction.id)
         record.balance_id = balance_date
         record.save()
+        domain_events.publish(TransactionsBound((transaction,), balance_date))
+
+    def _on_transactions_bound(self, event: TransactionsBound):
+        # The bound transactions may have been evicted and created again, so the cached objects are updated too.
+        for transaction in event.transactions:
+            transaction.balance_date = event.balance_date
+            cached = self.cache.get(transaction.id)
+            if cached is not None:
+                cached.balance_date = event.balance_date
+
+    def balance_summary(self, balance_date: date | None = None) -> Balance:
+        """Sums the amounts of the transactions, grouped by type and by method. Each type also has the sum of all its
+        methods under the key "Total". The sums are done by the database, so no Transaction is created.
+
+        Args:
+            balance_date: if given, sum the transactions bound to the balance of this date. If not, sum the transactions
+                that aren't bound to any balance.
+        """
+        summary_q = TransactionTable.select(TransactionTable.type, TransactionTable.method,
+                                            fn.SUM(TransactionTable.amount))
+        if balance_date is None:
+            summary_q = summary_q.where(TransactionTable.balance.is_null())
+        else:
+            summary_q = summary_q.where(TransactionTable.balance == balance_date)
+
+        sums = list(summary_q.group_by(TransactionTable.type, TransactionTable.method).tuples())
+        if self._in_archive(balance_date):
+            archived_q = ArchivedTransactionTable.select(ArchivedTransactionTable.type, ArchivedTransactionTable.method,
+                                                         fn.SUM(ArchivedTransactionTable.amount))
+            archived_q = archived_q.where(ArchivedTransactionTable.balance_id == balance_date)
+            sums.extend(archived_q.group_by(ArchivedTransactionTable.type, ArchivedTransactionTable.method).tuples())
+
+        balance = {"Cobro": {"Total": Currency(0)}, "Extracción": {"Total": Currency(0)}}
+        for type_, method, total in sums:
+            type_balance, amount = balance.setdefault(type_, {"Total": Currency(0)}), Currency.from_cents(total)
+            type_balance.setdefault(method, Currency(0)).increase(amount)
+            type_balance["Total"].increase(amount)
+        return balance
+
+    def bind_to_balance_many(self, transactions: Iterable[Transaction], balance_date: date):
+        """Binds all the *transactions* to the balance of *balance_date*, with one UPDATE for each batch of ids.
+        """
+        with DATABASE_PROXY.atomic():
+            for batch in chunked((transaction.id for transaction in transactions), 1024):
+                TransactionTable.update(balance=balance_date).where(TransactionTable.id.in_(batch)).execute()
+
+    def bind_unbalanced(self, balance_date: date) -> tuple[Transaction, ...]:
+        """Binds all the transactions that aren't bound to a balance to the balance of *balance_date*, with one UPDATE.
+
+        Returns:
+            The cached transactions that were bound, so their balance date can be updated.
+        """
+        with DATABASE_PROXY.atomic():
+            bound = tuple(transaction for transaction in self.cache.values() if transaction.balance_date is None)
+            TransactionTable.update(balance=balance_date).where(TransactionTable.balance.is_null()).execute()
+        return bound
 
     def add_raw(self, raw: tuple) -> int:
         """Adds the transaction directly into the repository, without creating Transaction objects. This method should
@@ -557,35 +1012,67 @@ class SqliteTransactionRepo(TransactionRepo):
         Returns:
             Returns the id of the created transaction.
         """
-        return TransactionTable.create(type=raw[0], client=raw[1], when=raw[2], amount=raw[3], method=raw[4],
+        return TransactionTable.create(id=next_id(TransactionTable, ArchivedTransactionTable), type=raw[0],
+                                       client=raw[1], when=raw[2], amount=raw[3], method=raw[4],
                                        responsible=raw[5], description=raw[6], balance_id=raw[7]).id
 
     def add_all(self, raw_transactions: Iterable[tuple]):
         """Adds the transactions in the iterable directly into the repository, without creating Transaction objects.
         """
+        fields = [TransactionTable.type, TransactionTable.client_id, TransactionTable.when, TransactionTable.amount,
+                  TransactionTable.method, TransactionTable.responsible, TransactionTable.description]
         with DATABASE_PROXY.atomic():
+            raw_transactions, fields = with_new_ids(raw_transactions, fields, TransactionTable,
+                                                    ArchivedTransactionTable)
             for batch in chunked(raw_transactions, 1024):
-                TransactionTable.insert_many(
-                    batch, fields=[TransactionTable.type, TransactionTable.client_id, TransactionTable.when,
-                                   TransactionTable.amount, TransactionTable.method, TransactionTable.responsible,
-                                   TransactionTable.description]
-                ).execute()
+                TransactionTable.insert_many(batch, fields=fields).execute()
+
+    @staticmethod
+    def _charges_of_month(query, activity: Activity, when: date):
+        query = query.join(SubscriptionCharge, on=SubscriptionCharge.transaction == TransactionTable.id)
+        return query.where(SubscriptionCharge.activity_id == activity.id, SubscriptionCharge.year == when.year,
+                           SubscriptionCharge.month == when.month)
+
+    @staticmethod
+    def _archived_charges_of_month(query, activity: Activity, when: date):
+        query = query.join_from(ArchivedTransactionTable, ArchivedSubscriptionCharge,
+                                on=ArchivedSubscriptionCharge.transaction_id == ArchivedTransactionTable.id)
+        return query.where(ArchivedSubscriptionCharge.activity_id == activity.id,
+                           ArchivedSubscriptionCharge.year == when.year, ArchivedSubscriptionCharge.month == when.month)
+
+    @staticmethod
+    def _month_in_archive(when: date) -> bool:
+        """Returns True if the charges of the month of *when* may have been archived. Charges are archived only for the
+        months before the one of the archive horizon.
+        """
+        horizon = archive_horizon()
+        return horizon is not None and (when.year, when.month) < (horizon.year, horizon.month)
 
     def charges_by_activity(self, activity: Activity, when: date) -> Generator[Transaction, None, None]:
-        charges_q = TransactionTable.select().join(SubscriptionCharge)
-        charges_q = charges_q.where(SubscriptionCharge.when == when, SubscriptionCharge.activity_id == activity.id)
+        """Retrieves the charges of *activity* registered for the month of *when*.
+        """
+        charges_q = self._charges_of_month(TransactionTable.select(), activity, when)
         charges_q = charges_q.order_by(TransactionTable.id.desc())
-        for record in prefetch(charges_q, ClientTable):
-            client_record, client = record.client, None
-            if client_record is not None:
-                if client_record.id in self.client_view_cache:
-                    client = self.client_view_cache[client_record.id]
-                else:
-                    client = ClientView(client_record.id, String(client_record.cli_name),
-                                        created_by="SqliteTransactionRepo.charges_by_activity",
-                                        dni=Number(client_record.dni if client_record.dni is not None else ""))
-            yield self.from_data(record.id, record.type, record.when, record.amount, record.method, record.responsible,
-                                 record.description, client, record.balance)
+        created_by = "SqliteTransactionRepo.charges_by_activity"
+        charges = self._from_hot(prefetch(charges_q, ClientTable), created_by)
+
+        if self._month_in_archive(when):
+            archived_q = self._archived_charges_of_month(archived_transactions_q(), activity, when)
+            archived_q = archived_q.order_by(ArchivedTransactionTable.id.desc())
+            charges = heapq.merge(charges, self._from_archive(archived_q, created_by),
+                                  key=lambda transaction: transaction.id, reverse=True)
+        yield from charges
+
+    def charges_total_by_activity(self, activity: Activity, when: date) -> Currency:
+        """Returns the sum of the charges of *activity* registered for the month of *when*. The sum is done by the
+        database.
+        """
+        total_q = self._charges_of_month(TransactionTable.select(fn.SUM(TransactionTable.amount)), activity, when)
+        total = total_q.scalar() or 0
+        if self._month_in_archive(when):
+            archived_q = ArchivedTransactionTable.select(fn.SUM(ArchivedTransactionTable.amount))
+            total += self._archived_charges_of_month(archived_q, activity, when).scalar() or 0
+        return Currency.from_cents(total)
 
 
 class SubscriptionTable(Model):
@@ -610,6 +1097,36 @@ class SubscriptionCharge(Model):
         database = DATABASE_PROXY
 
 
+class ArchivedSubscriptionCharge(Model):
+    """Subscription charges moved to the archive database along with their transactions.
+    """
+    id = IntegerField(primary_key=True)
+    year = IntegerField()
+    month = IntegerField()
+    client_id = IntegerField()
+    activity_id = IntegerField()
+    transaction_id = IntegerField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        schema = ARCHIVE_SCHEMA
+        table_name = "subscriptioncharge"
+        indexes = ((("activity_id", "year", "month"), False),)
+
+
+def _insert_sql(model: type[Model], fields: list[Field]) -> str:
+    """Returns a parameterized INSERT statement of *fields* into the table of *model*.
+    """
+    columns = ", ".join(f'"{field.column_name}"' for field in fields)
+    return f'INSERT INTO "{model._meta.table_name}" ({columns}) VALUES ({", ".join("?" * len(fields))})'
+
+
+def _db_values(fields: list[Field], values: Iterable) -> tuple:
+    """Converts *values* into what the database stores for the corresponding *fields*.
+    """
+    return tuple(field.db_value(value) for field, value in zip(fields, values))
+
+
 class SqliteSubscriptionRepo(SubscriptionRepo):
     """Subscriptions repository implementation based on Sqlite and peewee ORM.
     """
@@ -631,8 +1148,9 @@ class SqliteSubscriptionRepo(SubscriptionRepo):
     def register_transaction(self, subscription: Subscription, year: int, month: int, transaction: Transaction):
         """Registers the charge for the subscription.
         """
-        SubscriptionCharge.create(year=year, month=month, client_id=subscription.client.id,
-                                  activity_id=subscription.activity.id, transaction_id=transaction.id)
+        SubscriptionCharge.create(id=next_id(SubscriptionCharge, ArchivedSubscriptionCharge), year=year, month=month,
+                                  client_id=subscription.client.id, activity_id=subscription.activity.id,
+                                  transaction_id=transaction.id)
 
     def add_all(self, raw_subscriptions: Iterable[tuple]):
         """Adds the subscriptions in the iterable directly into the repository, without creating Subscription
@@ -646,12 +1164,85 @@ class SqliteSubscriptionRepo(SubscriptionRepo):
     def register_raw_charges(self, raw_charges: Iterable[tuple]):
         """Links transactions with pairs (client, activity).
         """
+        fields = [SubscriptionCharge.year, SubscriptionCharge.month, SubscriptionCharge.client_id,
+                  SubscriptionCharge.activity_id, SubscriptionCharge.transaction_id]
         with DATABASE_PROXY.atomic():
+            raw_charges, fields = with_new_ids(raw_charges, fields, SubscriptionCharge, ArchivedSubscriptionCharge)
             for batch in chunked(raw_charges, 1024):
-                SubscriptionCharge.insert_many(batch, fields=[SubscriptionCharge.year, SubscriptionCharge.month,
-                                                              SubscriptionCharge.client_id,
-                                                              SubscriptionCharge.activity_id,
-                                                              SubscriptionCharge.transaction_id]).execute()
+                SubscriptionCharge.insert_many(batch, fields=fields).execute()
+
+    def import_charges(self, raw_charges: Iterable[tuple], batch_len: int = 1024) -> int:
+        """Adds the charges in the iterable along with their transactions, in batches and in one database transaction.
+
+        Each charge is a tuple (year, month, client_id, activity_id, raw_transaction), where raw_transaction is the
+        tuple expected by TransactionRepo.add_raw. The ids of the transactions are assigned here, following the
+        greatest id in use in the main database and in the archive, so the transactions and the charges that reference
+        them are inserted with one prepared statement each, without building the queries row by row.
+
+        Returns:
+            The number of imported charges.
+        """
+        transaction_fields = [TransactionTable.id, TransactionTable.type, TransactionTable.client,
+                              TransactionTable.when, TransactionTable.amount, TransactionTable.method,
+                              TransactionTable.responsible, TransactionTable.description, TransactionTable.balance]
+        charge_fields = [SubscriptionCharge.year, SubscriptionCharge.month, SubscriptionCharge.client,
+                         SubscriptionCharge.activity, SubscriptionCharge.transaction]
+
+        imported = 0
+        with DATABASE_PROXY.atomic():
+            conn = DATABASE_PROXY.connection()
+            first_id = next_id(TransactionTable, ArchivedTransactionTable)
+            if first_id is None:
+                first_id = (TransactionTable.select(fn.MAX(TransactionTable.id)).scalar() or 0) + 1
+            for batch in chunked(raw_charges, batch_len):
+                ids = range(first_id, first_id + len(batch))
+                conn.executemany(_insert_sql(TransactionTable, transaction_fields),
+                                 ((id_, *_db_values(transaction_fields[1:], raw_transaction))
+                                  for id_, (*_, raw_transaction) in zip(ids, batch)))
+                conn.executemany(_insert_sql(SubscriptionCharge, charge_fields),
+                                 ((*charge, id_) for id_, (*charge, _) in zip(ids, batch)))
+                first_id, imported = ids.stop, imported + len(batch)
+        return imported
+
+
+class ChangeCounter(Model):
+    """Single row table whose *seq* is increased by triggers each time a tracked table changes. Created by a migration.
+    """
+    id = IntegerField(primary_key=True)
+    seq = IntegerField()
+
+    class Meta:
+        database = DATABASE_PROXY
+
+
+class ImportStageTable(Model):
+    import_id = CharField()
+    stage = CharField()
+    completed = DateTimeField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        primary_key = CompositeKey("import_id", "stage")
+
+
+class SqliteImportLog(ImportLog):
+    """Import log implementation based on Sqlite and peewee ORM.
+    """
+
+    def __init__(self) -> None:
+        DATABASE_PROXY.create_tables([ImportStageTable])
+
+    def completed(self, import_id: str) -> set[str]:
+        return {record.stage for record in ImportStageTable.select().where(ImportStageTable.import_id == import_id)}
+
+    @contextmanager
+    def stage(self, import_id: str, stage: str) -> Generator[None, None, None]:
+        """Runs the *stage* of the import *import_id* in a database transaction, that also records the stage as
+        completed.
+        """
+        with DATABASE_PROXY.atomic():
+            yield
+            ImportStageTable.create(import_id=import_id, stage=stage, completed=datetime.now())
 
 
 class ResponsibleTable(Model):
@@ -673,6 +1264,22 @@ class ActionTable(Model):
         database = DATABASE_PROXY
 
 
+class ArchivedActionTable(Model):
+    """Actions moved to the archive database.
+    """
+    id = IntegerField(primary_key=True)
+    when = DateTimeField(index=True)
+    responsible_id = CharField()
+    action_tag = CharField()
+    action_name = CharField()
+
+    class Meta:
+        database = DATABASE_PROXY
+        schema = ARCHIVE_SCHEMA
+        table_name = "actiontable"
+        indexes = ((("action_tag", "when"), False),)
+
+
 class SqliteSecurityRepo(SecurityRepo):
 
     def __init__(self) -> None:
@@ -680,7 +1287,7 @@ class SqliteSecurityRepo(SecurityRepo):
 
     def responsible(self) -> Generator[Responsible, None, None]:
         for record in ResponsibleTable.select():
-            yield Responsible(String(record.resp_name), String(record.resp_code))
+            yield Responsible(String.trusted(record.resp_name), String.trusted(record.resp_code))
 
     def add_responsible(self, responsible: Responsible):
         record = ResponsibleTable.get_or_none(resp_code=responsible.code)
@@ -689,15 +1296,46 @@ class SqliteSecurityRepo(SecurityRepo):
             ResponsibleTable.create(resp_code=responsible.code, resp_name=responsible.name)
 
     def log_action(self, when: datetime, responsible: Responsible, action_tag: str, action_name: str):
-        ActionTable.create(when=when, responsible_id=responsible.code.as_primitive(), action_tag=action_tag,
+        ActionTable.create(id=next_id(ActionTable, ArchivedActionTable), when=when,
+                           responsible_id=responsible.code.as_primitive(), action_tag=action_tag,
                            action_name=action_name)
 
-    def actions(self, page: int = 1, page_len: int = 20, tag: str | None = None) -> Generator[Action, None, None]:
-        actions_q = ActionTable.select().order_by(ActionTable.when.desc())
+    def log_actions(self, actions: Iterable[Action]):
+        """Logs all the *actions* in one database transaction.
+        """
+        rows = ((when, responsible.code.as_primitive(), action_tag, action_name)
+                for when, responsible, action_tag, action_name in actions)
+        fields = [ActionTable.when, ActionTable.responsible, ActionTable.action_tag, ActionTable.action_name]
+        with DATABASE_PROXY.atomic():
+            rows, fields = with_new_ids(rows, fields, ActionTable, ArchivedActionTable)
+            for batch in chunked(rows, 256):
+                ActionTable.insert_many(batch, fields=fields).execute()
+
+    def close_connection(self):
+        if DATABASE_PROXY.obj is not None and not DATABASE_PROXY.is_closed():
+            DATABASE_PROXY.close()
+
+    def actions(
+            self, page: int = 1, page_len: int = 20, tag: str | None = None, after: PageKey | None = None
+    ) -> Generator[Action, None, None]:
+        actions_q = (ActionTable.select(ActionTable.id, ActionTable.when, ResponsibleTable.resp_name,
+                                        ResponsibleTable.resp_code, ActionTable.action_tag, ActionTable.action_name)
+                     .join(ResponsibleTable))
+        archived_q = None
+        if archive_horizon() is not None:  # Actions older than the horizon are read only if the page needs them.
+            archived_q = (ArchivedActionTable.select(ArchivedActionTable.id, ArchivedActionTable.when,
+                                                     ResponsibleTable.resp_name, ResponsibleTable.resp_code,
+                                                     ArchivedActionTable.action_tag, ArchivedActionTable.action_name)
+                          .join(ResponsibleTable, on=ArchivedActionTable.responsible_id == ResponsibleTable.resp_code))
         if tag is not None:
             actions_q = actions_q.where(ActionTable.action_tag == tag)
-        actions_q = actions_q.paginate(page, page_len)
-
-        for record in prefetch(actions_q, ResponsibleTable.select()):
-            resp = Responsible(String(record.responsible.resp_name), String(record.responsible.resp_code))
-            yield record.when, resp, record.action_tag, record.action_name
+            archived_q = None if archived_q is None else archived_q.where(ArchivedActionTable.action_tag == tag)
+
+        # The id breaks the ties between the actions logged at the same datetime.
+        actions = seek_across_tiers(
+            actions_q.tuples(), None if archived_q is None else archived_q.tuples(), (ActionTable.when, ActionTable.id),
+            (ArchivedActionTable.when, ArchivedActionTable.id), page, page_len, after
+        )
+        for id_, when, resp_name, resp_code, action_tag, action_name in actions:
+            yield LoggedAction(id_, when, Responsible(String.interned(resp_name), String.interned(resp_code)),
+                               action_tag, action_name)
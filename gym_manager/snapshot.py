@@ -0,0 +1,111 @@
+"""Warm-start snapshot of the repository caches.
+
+Every launch created again, from sql, the same activities, clients and fixed bookings. At shutdown the contents of the
+caches are saved into a compressed snapshot file, and on the next start they are loaded back into the empty caches, so
+those objects don't need to be queried and created again.
+
+A snapshot is loaded only if the database didn't change since it was saved. That is checked with a fingerprint made of
+the schema version (PRAGMA user_version), the ChangeCounter increased by triggers on each change to the tracked tables,
+and the row count and max rowid of those tables, so an older backup restored over the database isn't taken as unchanged.
+PRAGMA data_version can't be used, because it only reports changes done by other connections while a connection is open.
+
+The snapshot is a pickle, so it must be stored in a trusted location, like the application directory.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+from typing import Mapping
+
+import zstandard
+
+from gym_manager.core.persistence import LRUCache, PersistenceError
+from gym_manager.migrations import TRACKED_MODELS
+from gym_manager.peewee import DATABASE_PROXY, ChangeCounter
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 3  # Increased when the pickled domain classes change.
+
+
+def fingerprint() -> tuple:
+    """Returns the state of the database that the objects of a snapshot depend on.
+    """
+    tables = tuple(
+        DATABASE_PROXY.execute_sql(f'SELECT COUNT(*), MAX(rowid) FROM "{model._meta.table_name}"').fetchone()
+        for model in TRACKED_MODELS
+    )
+    return DATABASE_PROXY.pragma("user_version"), ChangeCounter.get_by_id(1).seq, tables
+
+
+def save(path: str, caches: Mapping[str, LRUCache]) -> int:
+    """Saves the contents of the *caches* in a snapshot at *path*. The caches are pickled together, so objects shared
+    between them are still shared after loading the snapshot.
+
+    Returns:
+        The size of the snapshot, in bytes.
+
+    Raises:
+        PersistenceError if the snapshot can't be written.
+    """
+    header = {"format": SNAPSHOT_FORMAT, "fingerprint": fingerprint()}
+    payload = {name: list(cache.items()) for name, cache in caches.items()}
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, "wb") as file, zstandard.ZstdCompressor().stream_writer(file) as writer:
+            pickle.dump(header, writer, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(payload, writer, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)  # A crash while writing doesn't leave a truncated snapshot.
+    except Exception as e:  # Besides the io errors, any object of the caches may fail to be pickled.
+        raise PersistenceError(f"The snapshot '{path}' couldn't be saved.") from e
+
+    size = os.path.getsize(path)
+    logger.info(f"Saved snapshot '{path}' [size={size}, objects={sum(len(items) for items in payload.values())}].")
+    return size
+
+
+def _discard(path: str, reason: str):
+    logger.info(f"Discarded snapshot '{path}' [reason={reason}].")
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def load(path: str, caches: Mapping[str, LRUCache]) -> int:
+    """Loads the snapshot at *path* into the *caches*, if it exists and the database didn't change since it was saved.
+    Otherwise the snapshot is discarded. Keys already in a cache aren't overwritten.
+
+    Returns:
+        The number of objects loaded into the caches.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    try:
+        with open(path, "rb") as file, zstandard.ZstdDecompressor().stream_reader(file) as reader:
+            header = pickle.load(reader)
+            if header.get("format") != SNAPSHOT_FORMAT:
+                _discard(path, f"format {header.get('format')}")
+                return 0
+            if header.get("fingerprint") != fingerprint():
+                _discard(path, "stale")
+                return 0
+            payload = pickle.load(reader)
+    except (OSError, EOFError, pickle.UnpicklingError, zstandard.ZstdError, AttributeError, TypeError) as e:
+        # A snapshot that can't be read is discarded like a stale one, because the caches can be filled from sql.
+        _discard(path, f"unreadable ({e!r})")
+        return 0
+
+    loaded = 0
+    for name, items in payload.items():
+        cache = caches.get(name)
+        if cache is None:
+            continue
+        for key, value in reversed(items):  # The most recently used values are stored last, like they were.
+            if key not in cache:
+                cache[key] = value
+                loaded += 1
+    logger.info(f"Loaded snapshot '{path}' [objects={loaded}].")
+    return loaded
@@ -3,7 +3,7 @@ from typing import Generator
 
 from gym_manager.core.api import CreateTransactionFn
 from gym_manager.core.base import Currency, String, Number, OperationalError
-from gym_manager.core.persistence import FilterValuePair
+from gym_manager.core.persistence import FilterValuePair, PageKey
 from gym_manager.core.security import log_responsible
 
 
@@ -43,10 +43,25 @@ class ItemRepo(abc.ABC):
 
     @abc.abstractmethod
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Item, None, None]:
+        """Retrieves the items, sorted by name.
+
+        Args:
+            page: page to retrieve.
+            page_len: items per page. If None, retrieve all items.
+            filters: filters to apply.
+            after: if given, retrieve the page that follows the item with this key, instead of *page*.
+        """
         raise NotImplementedError
 
+    @staticmethod
+    def page_key(item: Item) -> PageKey:
+        """Returns the key of *item* in the listing done by all().
+        """
+        return item.name.as_primitive(), item.code
+
 
 def create_item(item_repo: ItemRepo, name: String, amount: Number, price: Currency, is_fixed: bool = False) -> Item:
     return item_repo.create(name, amount, price, is_fixed)
@@ -3,8 +3,8 @@ from typing import Generator
 from peewee import Model, IntegerField, CharField, BooleanField
 
 from gym_manager.core.base import String, Number, Currency
-from gym_manager.core.persistence import FilterValuePair
-from gym_manager.peewee import DATABASE_PROXY
+from gym_manager.core.persistence import FilterValuePair, PageKey
+from gym_manager.peewee import DATABASE_PROXY, CurrencyField, seek
 from gym_manager.stock.core import ItemRepo, Item
 
 
@@ -12,7 +12,7 @@ class ItemModel(Model):
     code = IntegerField(primary_key=True)
     item_name = CharField()
     amount = IntegerField()
-    price = CharField()
+    price = CurrencyField()
     fixed = BooleanField()
 
     class Meta:
@@ -25,7 +25,7 @@ class SqliteItemRepo(ItemRepo):
 
     def create(self, name: String, amount: Number, price: Currency, is_fixed: bool = False) -> Item:
         record = ItemModel.create(item_name=name.as_primitive(), amount=amount.as_primitive(),
-                                  price=price.as_primitive(), fixed=is_fixed)
+                                  price=price, fixed=is_fixed)
         return Item(record.code, name, amount, price, is_fixed)
 
     def remove(self, item: Item):
@@ -34,19 +34,20 @@ class SqliteItemRepo(ItemRepo):
     def update(self, item: Item):
         # Replace can be used because there is no other model that references ItemModel.
         ItemModel.replace(code=item.code, item_name=item.name.as_primitive(), amount=item.amount.as_primitive(),
-                          price=item.price.as_primitive(), fixed=item.is_fixed).execute()
+                          price=item.price, fixed=item.is_fixed).execute()
 
     def all(
-            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None
+            self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
+            after: PageKey | None = None
     ) -> Generator[Item, None, None]:
         query = ItemModel.select()
         if filters is not None:
             for filter_, value in filters:
                 query = query.where(filter_.passes_in_repo(ItemModel, value))
 
-        if page_len is not None:
-            query = query.order_by(ItemModel.item_name).paginate(page, page_len)
+        if page_len is not None or after is not None:
+            query = seek(query, (ItemModel.item_name, ItemModel.code), page, page_len, after)
 
         for record in query:
-            yield Item(record.code, String(record.item_name), Number(record.amount), Currency(record.price),
+            yield Item(record.code, String.trusted(record.item_name), Number.trusted(record.amount), record.price,
                        record.fixed)
@@ -0,0 +1,110 @@
+"""Background warm-up of the repository caches.
+
+After a cold start, the first client lookup, the first render of the booking grid and the first opening of the
+accounting pay the whole cost of querying and creating the objects. The warm-up does that work on a background thread
+while the user is idle, so the objects are already cached when they are asked for.
+
+User queries have priority. The UI calls pause() before handling each user input, which waits for the running step to
+end, and calls resume() once the handling is done. Steps are small (one query and the objects created from it), so a
+user query waits for one step at most. The caches aren't thread safe, but they are never used by the warm-up while a
+user query runs.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Any, Iterable
+
+from gym_manager.peewee import DATABASE_PROXY
+
+logger = logging.getLogger(__name__)
+
+Step = Callable[[], Any]
+
+
+class WarmUp:
+    """Runs warm-up tasks on a background thread. Each task is an iterable of steps, and each step is a callable that
+    does an atomic piece of work, so no data read before a pause is cached after it.
+    """
+
+    def __init__(self) -> None:
+        self._tasks: list[tuple[str, Iterable[Step]]] = []
+        self._step_lock = threading.Lock()
+        self._resumed = threading.Event()
+        self._resumed.set()
+        self._stopped = False
+        self._thread: threading.Thread | None = None
+        self.steps_done = 0
+
+    def add(self, name: str, steps: Iterable[Step]):
+        """Adds a task. Tasks run in the order they were added. *steps* is iterated from the background thread, so it can
+        be a generator that queries the database.
+        """
+        if self._thread is not None:
+            raise RuntimeError("Tasks can't be added after the warm-up started.")
+        self._tasks.append((name, steps))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cache-warm-up", daemon=True)
+        self._thread.start()
+
+    def pause(self):
+        """Stops the warm-up until resume() is called. If a step is running, waits until it ends.
+        """
+        self._resumed.clear()
+        with self._step_lock:
+            pass
+
+    def resume(self):
+        self._resumed.set()
+
+    def join(self, timeout: float | None = None):
+        """Waits up to *timeout* seconds for all the tasks to end.
+        """
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stop(self, timeout: float | None = None):
+        """Stops the warm-up after the running step, and waits up to *timeout* seconds for the thread to end.
+        """
+        self._stopped = True
+        self._resumed.set()
+        self.join(timeout)
+
+    @property
+    def done(self) -> bool:
+        return self._thread is not None and not self._thread.is_alive()
+
+    def _next_step(self, steps: Iterable[Step]) -> bool:
+        """Runs the next step of *steps*. Returns False if there are no more steps, or if the warm-up was stopped.
+        """
+        while True:
+            self._resumed.wait()
+            if self._stopped:
+                return False
+            with self._step_lock:
+                if not self._resumed.is_set():  # Paused while waiting for the lock.
+                    continue
+                step = next(steps, None)
+                if step is None:
+                    return False
+                step()
+                self.steps_done += 1
+                return True
+
+    def _run(self):
+        try:
+            for name, steps in self._tasks:
+                steps = iter(steps)
+                try:
+                    while self._next_step(steps):
+                        pass
+                except Exception:  # The warm-up is an optimization, so its failure mustn't affect the application.
+                    logger.exception(f"Cache warm-up task '{name}' failed.")
+                if self._stopped:
+                    break
+            logger.info(f"Cache warm-up finished [steps_done={self.steps_done}, stopped={self._stopped}].")
+        finally:
+            # Each thread has its own connection.
+            if DATABASE_PROXY.obj is not None and not DATABASE_PROXY.is_closed():
+                DATABASE_PROXY.close()
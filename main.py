@@ -3,21 +3,22 @@ import json
 import logging
 import sys
 import traceback
-from datetime import time, datetime
+from datetime import time, datetime, date, timedelta
 from logging import config
 from os import path
 
 from PyQt5.QtWidgets import QApplication
 
-from gym_manager import peewee
+from gym_manager import peewee, migrations, backup, archive, warmup, snapshot
 from gym_manager.booking import peewee as booking_peewee
 from gym_manager.booking.core import BookingSystem, BookingRepo
 from gym_manager.contact.peewee import SqliteContactRepo
 from gym_manager.core.base import Currency, String
-from gym_manager.core.persistence import create_backup
-from gym_manager.core.security import log_responsible, SimpleSecurityHandler, Responsible
+from gym_manager.core.persistence import cache_stats, CacheBudget, PersistenceError
+from gym_manager.core.security import log_responsible, SimpleSecurityHandler, Responsible, WriteBehindSecurityRepo
 from gym_manager.stock.peewee import SqliteItemRepo
 from ui.main import MainUI
+from ui.widgets import PauseOnInput
 
 stylesheet = """
 QCheckBox::indicator { 
@@ -49,18 +50,40 @@ def _save_bookings(booking_repo: BookingRepo):
         json.dump({"fixed": all_fixed, "temp": all_temp}, file)
 
 
-def main():
+def _warm_up_tasks(
+        warm_up: warmup.WarmUp, activity_repo: peewee.SqliteActivityRepo, client_repo: peewee.SqliteClientRepo,
+        booking_repo: BookingRepo, n_clients: int
+):
+    """Adds the warm-up of the activities, the bookings of today and tomorrow, and the *n_clients* clients served most
+    recently.
+    """
+    warm_up.add("activities", [lambda: list(activity_repo.all())])
+    today = date.today()
+    warm_up.add("bookings", [lambda when=when: list(booking_repo.all_temporal(when))
+                             for when in (today, today + timedelta(days=1))])
+
+    def client_steps():  # The ids are queried by the warm-up thread too.
+        for id_ in client_repo.recently_served(n_clients):
+            yield functools.partial(client_repo.get, id_)
+    warm_up.add("clients", client_steps())
+
+
+def _load_config() -> dict:
     with open(path.join(path.dirname(path.abspath(__file__)), 'config.json')) as config_file:
-        config_dict = json.load(config_file)
+        return json.load(config_file)
 
+
+def main(config_dict: dict):
     # PyQt App.
     app = QApplication(sys.argv)
     app.setStyleSheet(stylesheet)
 
-    # Repository initialization
+    # Repository initialization. The caches of clients, transactions, bookings and contacts share one memory ceiling.
+    cache_budget = CacheBudget(config_dict.get("cache_budget_mb", 16) * 2 ** 20)
     activity_repo = peewee.SqliteActivityRepo()
-    transaction_repo = peewee.SqliteTransactionRepo(methods=("Efectivo", "Débito", "Crédito"))
-    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    transaction_repo = peewee.SqliteTransactionRepo(methods=("Efectivo", "Débito", "Crédito"),
+                                                    cache_budget=cache_budget)
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo, cache_budget=cache_budget)
     subscription_repo = peewee.SqliteSubscriptionRepo()
     balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
 
@@ -75,21 +98,30 @@ def main():
     else:
         booking_double = activity_repo.create(String("Padel Dobles"), Currency(200.00), String("Precio por media hora"),
                                               charge_once=True, locked=True)
-    booking_repo = booking_peewee.SqliteBookingRepo(transaction_repo, cache_len=128)
+    booking_repo = booking_peewee.SqliteBookingRepo(transaction_repo, cache_len=128, cache_budget=cache_budget)
+
+    # The objects cached at the last shutdown are loaded, if the database didn't change since then. It is done before
+    # creating the BookingSystem, that lists all the fixed bookings.
+    snapshot_caches = {"activities": activity_repo.cache, "clients": client_repo.cache,
+                       "fixed_bookings": booking_repo.fixed_booking_cache}
+    snapshot_path = config_dict.get("cache_snapshot", "cache_snapshot.zst")
+    snapshot.load(snapshot_path, snapshot_caches)
+
     booking_system = BookingSystem(
         booking_repo, courts=(("1", booking_double), ("2", booking_double), ("3", booking_single)),
         start=time(8, 0), end=time(23, 0), minute_step=30
     )
 
     # Contact initialization.
-    contact_repo = SqliteContactRepo()
+    contact_repo = SqliteContactRepo(cache_budget=cache_budget)
 
     # Stock initialization.
     item_repo = SqliteItemRepo()
 
     # Security initialization.
+    security_repo = WriteBehindSecurityRepo(peewee.SqliteSecurityRepo(), **config_dict.get("audit_log", {}))
     security_handler = SimpleSecurityHandler(
-        peewee.SqliteSecurityRepo(),
+        security_repo,
         action_tags={"subscribe", "cancel", "register_subscription_charge", "close_balance", "cancel_booking",
                      "charge_booking", "update_item_amount", "register_item_charge", "extract",
                      "confirm_subscription_charge", "remove_client"},
@@ -100,14 +132,43 @@ def main():
     security_handler.add_responsible(Responsible(String("Admin"), String("python")))
     log_responsible.config(security_handler)
 
-    backup_fn = functools.partial(create_backup, "gym_manager.db", config_dict["backups_dir"])
+    def backup_fn():
+        store = backup.ChunkStore(config_dict["backups_dir"])
+        store.backup("gym_manager.db")
+        store.prune(**config_dict.get("backup_retention", {}))
+        if "archive" in config_dict:  # The archive rarely changes, so its snapshots add only a few chunks.
+            archive_store = backup.ChunkStore(path.join(config_dict["backups_dir"], "archive"))
+            archive_store.backup(config_dict["archive"]["path"])
+            archive_store.prune(**config_dict.get("backup_retention", {}))
 
     # Main window launch.
     window = MainUI(client_repo, activity_repo, subscription_repo, transaction_repo, balance_repo, booking_system,
                     contact_repo, item_repo, security_handler, enable_tools=config_dict["enable_utility_functions"],
-                    allow_passed_time_modifications=config_dict["allow_passed_time_modifications"], backup_fn=backup_fn)
+                    allow_passed_time_modifications=config_dict["allow_passed_time_modifications"], backup_fn=backup_fn,
+                    import_log=peewee.SqliteImportLog())
     window.show()
-    app.exec()
+
+    # The caches are filled in the background while the user is idle.
+    warm_up = warmup.WarmUp()
+    _warm_up_tasks(warm_up, activity_repo, client_repo, booking_repo, config_dict.get("warm_up_clients", 50))
+    app.installEventFilter(PauseOnInput(warm_up, parent=app))
+    warm_up.start()
+    try:
+        app.exec()
+    finally:
+        warm_up.stop(timeout=5)
+        security_repo.close()  # Logs the actions that are still queued.
+        if warm_up.done:  # Otherwise a warm-up step may still be filling the caches that would be saved.
+            try:
+                snapshot.save(snapshot_path, snapshot_caches)
+            except PersistenceError:
+                logging.getLogger(__name__).exception("The cache snapshot couldn't be saved.")
+        else:
+            logging.getLogger(__name__).warning("The cache snapshot wasn't saved, the warm-up didn't stop in time.")
+        for stats in cache_stats():  # Used to tune the cache sizes.
+            logging.getLogger(__name__).info(f"Cache stats {stats} [hit_ratio={stats.hit_ratio:.2f}].")
+        logging.getLogger(__name__).info(f"Cache budget [bytes_used={cache_budget.bytes_used}, "
+                                         f"max_bytes={cache_budget.max_bytes}].")
 
 
 def logging_excepthook(exc_type, exc_value, exc_tb):
@@ -122,13 +183,20 @@ if __name__ == "__main__":
     logging_config_path = path.join(path.dirname(path.abspath(__file__)), 'logging.conf')
     config.fileConfig(logging_config_path)
 
-    peewee.create_database("gym_manager.db")
+    config_dict = _load_config()
+
+    peewee.create_database("gym_manager.db", config_dict.get("sqlite_pragmas"))
+    logging.getLogger(__name__).info(f"Sqlite connection profile {peewee.connection_profile()}.")
+    logging.getLogger(__name__).info(f"Database schema version {migrations.migrate()}.")
+    if "archive" in config_dict:
+        archive.attach(config_dict["archive"]["path"])
+        archive.archive(date.today() - timedelta(days=config_dict["archive"]["horizon_days"]))
     peewee_logger = logging.getLogger("peewee")
     peewee_logger.setLevel(logging.WARNING)
 
     # noinspection PyBroadException
     try:
-        main()
+        main(config_dict)
     except Exception as e:
         print("exception caught")
         logging.exception(e)
@@ -0,0 +1,239 @@
+import logging
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from gym_manager import peewee, archive
+from gym_manager.booking.core import TempBooking
+from gym_manager.booking.peewee import SqliteBookingRepo, CancelledLog
+from gym_manager.core.base import String, Number, Currency, Subscription
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.core.security import log_responsible, Responsible, SecurityRepo
+from gym_manager.migrations import migrate
+from test.test_core_api import MockSecurityHandler
+
+HORIZON = date(2022, 1, 1)
+
+
+class _QueryRecorder(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = []
+
+    def emit(self, record: logging.LogRecord):
+        self.queries.append(record.msg[0])
+
+
+def _recorded_queries(fn) -> list[str]:
+    peewee_logger, handler = logging.getLogger("peewee"), _QueryRecorder()
+    peewee_logger.setLevel(logging.DEBUG)
+    peewee_logger.addHandler(handler)
+    try:
+        fn()
+    finally:
+        peewee_logger.removeHandler(handler)
+        peewee_logger.setLevel(logging.NOTSET)
+    return handler.queries
+
+
+@pytest.fixture
+def repos(tmp_path):
+    log_responsible.config(MockSecurityHandler())
+    peewee.create_database(str(tmp_path / "gym.db"))
+    migrate()
+
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    subscription_repo = peewee.SqliteSubscriptionRepo()
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    security_repo = peewee.SqliteSecurityRepo()
+    booking_repo = SqliteBookingRepo(transaction_repo, cache_len=8)
+
+    responsible = Responsible(String("Admin"), String("code"))
+    security_repo.add_responsible(responsible)
+    client = client_repo.create(String("Client"), date(2020, 1, 1), date(2000, 1, 1), Number(1))
+    activity = activity_repo.create(String("Activity"), Currency(100), String("Description"))
+    subscription = Subscription(date(2020, 1, 1), client, activity)
+    subscription_repo.add(subscription)
+
+    # One charge and one extraction a month, from 2021 to 2022, each one closed in the balance of its month.
+    for month in range(24):
+        when = date(2021 + month // 12, month % 12 + 1, 10)
+        charge = transaction_repo.create("Cobro", when, Currency(100 + month), "Efectivo", String("Admin"), "Cobro",
+                                         client)
+        subscription_repo.register_transaction(subscription, when.year, when.month, charge)
+        extraction = transaction_repo.create("Extracción", when, Currency(10), "Débito", String("Admin"), "Extracción")
+        balance = transaction_repo.balance_summary()
+        balance_repo.add(when, String("Admin"), balance, [charge, extraction])
+
+    start = datetime(2021, 1, 1, 10)
+    security_repo.log_actions((start + timedelta(days=15 * i), responsible, "tag", f"Action {i}") for i in range(48))
+    for i in range(24):
+        booking = TempBooking("1", String(f"Client {i}"), time(10), time(11), date(2021, 1, 1) + timedelta(days=30 * i))
+        booking_repo.log_cancellation(start + timedelta(days=30 * i), String("Admin"), booking, True)
+
+    removed = client_repo.create(String("Removed"), date(2020, 1, 1), date(2000, 1, 1), Number(2))
+    client_repo.remove(removed)
+
+    peewee.SqliteClientRepo(activity_repo, transaction_repo)  # Links the ClientView with a fresh repository.
+    return {"client": client_repo, "activity": activity, "transaction": transaction_repo, "balance": balance_repo,
+            "security": security_repo, "booking": booking_repo, "removed": removed}
+
+
+def _history(repos) -> dict:
+    transaction_repo, activity = repos["transaction"], repos["activity"]
+    actions_by_key, after = [], None
+    while len(page := list(repos["security"].actions(page_len=7, after=after))) > 0:
+        actions_by_key.extend(page)
+        after = SecurityRepo.page_key(page[-1])
+
+    return {
+        "actions": [list(repos["security"].actions(page, page_len=7)) for page in range(1, 9)],
+        "actions_by_key": actions_by_key,
+        "cancelled": [[c.number for c in repos["booking"].cancelled(page, page_len=5)] for page in range(1, 6)],
+        "balances": [(when, [t.id for t in transactions]) for when, _, _, transactions
+                     in repos["balance"].all(date(2021, 1, 1), date(2022, 12, 31))],
+        "summary": transaction_repo.balance_summary(date(2021, 3, 10)),
+        "transactions": [t.id for t in transaction_repo.all(without_balance=False, balance_date=date(2021, 3, 10))],
+        "charges": [[t.id for t in transaction_repo.charges_by_activity(activity, date(2021, month, 1))]
+                    for month in (3, 12)],
+        "charges_total": transaction_repo.charges_total_by_activity(activity, date(2021, 3, 1)),
+    }
+
+
+def test_archive_historyReadAcrossTiers(repos, tmp_path):
+    before = _history(repos)
+
+    archive.attach(str(tmp_path / "archive.db"))
+    moved = archive.archive(HORIZON)
+
+    assert moved == {"subscription_charges": 12, "transactions": 24, "actions": 25, "cancellations": 13,
+                     "clients": 1}
+    assert peewee.TransactionTable.select().where(peewee.TransactionTable.when < HORIZON).count() == 0
+    assert CancelledLog.select().count() == 11
+    assert _history(repos) == before
+    assert repos["transaction"].charges_total_by_activity(repos["activity"], date(2021, 3, 1)) == Currency(102)
+
+
+def test_archive_crashBeforeDelete_rowsRemovedByNextCall(repos, tmp_path, monkeypatch):
+    before = _history(repos)
+    archive.attach(str(tmp_path / "archive.db"))
+
+    def crash(*args):
+        raise OSError("crash")
+    monkeypatch.setattr(archive, "_delete", crash)
+    with pytest.raises(OSError):
+        archive.archive(HORIZON)
+    monkeypatch.undo()
+
+    # The copy was committed, so the rows are in both databases.
+    assert peewee.ArchivedTransactionTable.select().count() == 24
+    assert peewee.TransactionTable.select().where(peewee.TransactionTable.when < HORIZON).count() == 24
+
+    moved = archive.archive(HORIZON)
+
+    assert moved["transactions"] == 24 and moved["subscription_charges"] == 12
+    assert peewee.TransactionTable.select().where(peewee.TransactionTable.when < HORIZON).count() == 0
+    assert _history(repos) == before
+
+
+def test_archive_reloadedClient_keepsArchivedCharges(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+
+    client_id = peewee.ClientTable.get(peewee.ClientTable.cli_name == "Client").id
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    subscription = next(iter(client_repo.get(client_id).subscriptions()))
+
+    assert all(subscription.is_charged(2021, month) for month in range(1, 13))
+    assert subscription.charged_amount(2021, 3) == Currency(102)
+    assert subscription.is_charged(2022, 3) and not subscription.is_charged(2023, 1)
+
+
+def test_archive_recentReads_dontQueryArchive(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+    transaction_repo, activity = repos["transaction"], repos["activity"]
+
+    queries = _recorded_queries(lambda: (
+        list(repos["security"].actions(page=1, page_len=7)),
+        list(repos["booking"].cancelled(page=1, page_len=5)),
+        list(repos["balance"].all(date(2022, 3, 1), date(2022, 6, 30))),
+        list(transaction_repo.charges_by_activity(activity, date(2022, 3, 1))),
+        transaction_repo.charges_total_by_activity(activity, date(2022, 3, 1)),
+        transaction_repo.balance_summary(date(2022, 3, 10)),
+    ))
+
+    assert len(queries) > 0 and not any('"archive"' in query for query in queries)
+
+
+def test_archive_archivedClient_reactivatedWithSameId(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+    assert peewee.ClientTable.get_or_none(peewee.ClientTable.id == repos["removed"].id) is None
+
+    client = repos["client"].create(String("Back"), date(2022, 6, 1), date(2000, 1, 1), Number(2))
+
+    assert client.id == repos["removed"].id
+    assert peewee.ArchivedClientTable.select().count() == 0
+
+
+def test_archive_insertAfterArchive_idsNotReused(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+
+    # The removed client had the greatest id, and it is now archived.
+    client = repos["client"].create(String("New"), date(2022, 6, 1), date(2000, 1, 1), Number(3))
+    assert client.id > repos["removed"].id
+    repos["client"].remove(client)
+
+    moved = archive.archive(HORIZON)
+
+    assert moved["clients"] == 1
+    assert {c.dni for c in peewee.ArchivedClientTable.select()} == {2, 3}
+    assert repos["client"].create(String("Back"), date(2022, 7, 1), date(2000, 1, 1), Number(3)).id == client.id
+
+
+def test_archive_importChargesAfterArchive_idsNotReused(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+    # The greatest transaction id is now in the archive, as it happens after the newest transactions are archived.
+    archived = peewee.ArchivedTransactionTable.select().first()
+    peewee.ArchivedTransactionTable.update(id=1000).where(peewee.ArchivedTransactionTable.id == archived.id).execute()
+
+    client_id = peewee.ClientTable.get(peewee.ClientTable.cli_name == "Client").id
+    raw_charges = [(2023, 1, client_id, repos["activity"].id,
+                    ("Cobro", client_id, date(2023, 1, 10), 10, "Efectivo", "Admin", "Imported", None))]
+    peewee.SqliteSubscriptionRepo().import_charges(raw_charges)
+
+    assert peewee.TransactionTable.get(peewee.TransactionTable.description == "Imported").id == 1001
+
+
+def test_archive_conflictingArchivedRow_raisesPersistenceError(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    removed = peewee.ClientTable.get_by_id(repos["removed"].id)
+    peewee.ArchivedClientTable.create(id=removed.id, dni=9, cli_name="Other", admission=removed.admission,
+                                      birth_day=removed.birth_day, is_active=False)
+
+    with pytest.raises(PersistenceError):
+        archive.archive(HORIZON)
+
+    assert peewee.ClientTable.get_by_id(removed.id).cli_name == "Removed"
+    assert peewee.ArchivedClientTable.get_by_id(removed.id).cli_name == "Other"
+
+
+def test_archive_horizonKeptAfterReattach(repos, tmp_path):
+    archive.attach(str(tmp_path / "archive.db"))
+    archive.archive(HORIZON)
+    archive.archive(date(2021, 6, 1))  # An older horizon doesn't hide the rows already archived.
+
+    peewee.DATABASE_PROXY.close()
+    peewee.set_archive_horizon(None)
+    archive.attach(str(tmp_path / "archive.db"))
+
+    assert peewee.archive_horizon() == HORIZON
+
+
+def test_archive_notAttached_raisesPersistenceError(repos):
+    with pytest.raises(PersistenceError):
+        archive.archive(HORIZON)
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from gym_manager import peewee
+from gym_manager.backup import create_backup, restore_backup, ChunkStore
+from gym_manager.core.base import String, Number
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.core.security import log_responsible
+from gym_manager.migrations import migrate
+from test.test_core_api import MockSecurityHandler
+
+
+def _setup(database_path: str, n_clients: int):
+    peewee.create_database(database_path, {"journal_mode": "wal"})
+    log_responsible.config(MockSecurityHandler())
+    migrate()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    for i in range(n_clients):
+        client_repo.create(String(f"Client {i}"), date(2022, 5, 5), date(2000, 5, 5), Number(i + 1))
+
+
+def test_createBackup_includesUncheckpointedWrites(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=200)
+
+    stats = create_backup(database_path, str(tmp_path / "backups"), pages_per_step=4, step_sleep=0)
+
+    assert os.listdir(tmp_path / "backups") == [os.path.basename(stats.path)]
+    assert 0 < stats.backup_size < stats.database_size and stats.throughput > 0
+
+    # The writes are still in the write-ahead log, but they are included in the backup.
+    restore_backup(stats.path, str(tmp_path / "restored.db"))
+    restored = sqlite3.connect(tmp_path / "restored.db")
+    assert restored.execute("SELECT count(*) FROM clienttable").fetchone()[0] == 200
+    restored.close()
+
+
+def test_restoreBackup_replacesDatabase(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=3)
+    stats = create_backup(database_path, str(tmp_path / "backups"))
+
+    peewee.ClientTable.delete().execute()
+    peewee.DATABASE_PROXY.close()
+    restore_backup(stats.path, database_path)
+
+    assert peewee.ClientTable.select().count() == 3
+
+
+def test_restoreBackup_damagedBackup_databaseUntouched(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=3)
+    stats = create_backup(database_path, str(tmp_path / "backups"))
+    peewee.DATABASE_PROXY.close()
+
+    with open(stats.path, 'r+b') as backup_file:
+        backup_file.seek(stats.backup_size // 2)
+        backup_file.write(b"damaged")
+    with open(database_path, 'rb') as database_file:
+        original = database_file.read()
+
+    with pytest.raises(PersistenceError):
+        restore_backup(stats.path, database_path)
+
+    with open(database_path, 'rb') as database_file:
+        assert database_file.read() == original
+    assert not os.path.exists(database_path + ".restore")
+
+
+def test_chunkStore_smallChange_storesFewNewChunks(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=2000)
+    store = ChunkStore(str(tmp_path / "store"), chunk_len=4096)
+
+    first = store.backup(database_path, datetime(2022, 5, 5), step_sleep=0)
+    peewee.ClientTable.update(cli_name="Changed").where(peewee.ClientTable.id == 1).execute()
+    second = store.backup(database_path, datetime(2022, 5, 6), step_sleep=0)
+
+    assert 0 < second.backup_size < first.backup_size / 10
+    assert [snapshot.name for snapshot in store.snapshots()] == ["2022_05_06_000000", "2022_05_05_000000"]
+
+
+def test_chunkStore_sameSecond_snapshotsKept(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=3)
+    store = ChunkStore(str(tmp_path / "store"))
+    store.backup(database_path, datetime(2022, 5, 5), step_sleep=0)
+    peewee.ClientTable.delete().where(peewee.ClientTable.id == 1).execute()
+    store.backup(database_path, datetime(2022, 5, 5), step_sleep=0)
+    peewee.DATABASE_PROXY.close()
+
+    assert [snapshot.name for snapshot in store.snapshots()] == ["2022_05_05_000000_1", "2022_05_05_000000"]
+    store.restore("2022_05_05_000000", database_path)
+    peewee.create_database(database_path)
+    assert peewee.ClientTable.select().count() == 3
+
+
+def test_chunkStore_restore_anySnapshot(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=3)
+    store = ChunkStore(str(tmp_path / "store"))
+    store.backup(database_path, datetime(2022, 5, 5), step_sleep=0)
+    peewee.ClientTable.delete().where(peewee.ClientTable.id == 1).execute()
+    store.backup(database_path, datetime(2022, 5, 6), step_sleep=0)
+    peewee.DATABASE_PROXY.close()
+
+    store.restore("2022_05_05_000000", database_path)
+    assert peewee.ClientTable.select().count() == 3
+    peewee.DATABASE_PROXY.close()
+
+    store.restore("2022_05_06_000000", database_path)
+    assert peewee.ClientTable.select().count() == 2
+
+    with pytest.raises(KeyError):
+        store.restore("2022_05_07_000000", database_path)
+
+
+def test_chunkStore_prune(tmp_path):
+    database_path = str(tmp_path / "gym.db")
+    _setup(database_path, n_clients=3)
+    store = ChunkStore(str(tmp_path / "store"))
+
+    # Two snapshots a day, for 60 days. Each one of them has a chunk of its own.
+    start = datetime(2022, 3, 1)
+    for i in range(120):
+        peewee.ClientTable.update(cli_name=str(i)).where(peewee.ClientTable.id == 1).execute()
+        store.backup(database_path, start + timedelta(hours=12 * i), step_sleep=0)
+
+    removed = store.prune(daily=3, weekly=2, monthly=2)
+
+    kept = [snapshot.name for snapshot in store.snapshots()]
+    assert kept == ["2022_04_29_120000", "2022_04_28_120000", "2022_04_27_120000", "2022_04_24_120000",
+                    "2022_03_31_120000"]
+    assert len(removed) == 115
+    # The chunks used only by the removed snapshots are removed too.
+    used = {chunk_hash for snapshot in store.snapshots() for chunk_hash in snapshot.chunks}
+    stored = {name.removesuffix(".zst") for _, _, names in os.walk(tmp_path / "store" / "chunks") for name in names}
+    assert stored == used
+    # Remaining snapshots can still be restored.
+    peewee.DATABASE_PROXY.close()
+    store.restore("2022_03_31_120000", database_path)
+    assert peewee.ClientTable.get_by_id(1).cli_name == "61"
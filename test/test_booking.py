@@ -196,6 +196,24 @@ def test_BookingSystem_blocks():
     assert [] == [b for b in booking_system.blocks(start=time(12, 30))]
 
 
+def test_BookingSystem_amountToCharge_followsActivityUpdates():
+    peewee.create_database(":memory:")
+    activity_repo = peewee.SqliteActivityRepo(cache_len=0)
+    activity = activity_repo.create(String("Padel"), Currency(100), String("Descr"))
+    booking_system = BookingSystem(courts=(("1", activity), ("2", activity)), start=time(8, 0), end=time(12, 0),
+                                   minute_step=60, repo=MockBookingRepo())
+
+    # The activity isn't cached, so the updated activity is a different object.
+    updated = activity_repo.get(activity.id)
+    updated.price = Currency(150)
+    activity_repo.update(updated)
+
+    # noinspection PyTypeChecker
+    booking = TempBooking("1", client_name=None, is_fixed=False, when=date(2022, 7, 11), start=time(8, 0),
+                          end=time(10, 0))
+    assert booking_system.amount_to_charge(booking) == Currency(300)
+
+
 def test_BookingSystem_blockRange():
     # noinspection PyTypeChecker
     booking_system = BookingSystem(courts=(("1", Currency(0)), ("2", Currency(0))), start=time(8, 0),
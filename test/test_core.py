@@ -26,6 +26,13 @@ def test_base_Number():
         Number(Number.OPTIONAL_INT)
 
 
+def test_base_String_interned():
+    responsible = String.interned("Admin")
+
+    assert responsible is String.interned("Admin") and responsible == String("Admin")
+    assert not hasattr(responsible, "__dict__") and not hasattr(Currency(1), "__dict__")
+
+
 # noinspection PyTypeChecker
 def test_base_Subscription_isCharged():
     subscription = Subscription(date(2022, 8, 8), client=None, activity=None)
@@ -42,6 +49,23 @@ def test_base_Subscription_isCharged():
             and subscription.is_charged(2022, 6))
 
 
+def test_base_Subscription_chargeLedger():
+    subscription = Subscription(date(2022, 1, 8), client=None, activity=None)
+    december = Transaction(3, None, date(2022, 12, 8), Currency(10), None, None, None)
+    late, early = (Transaction(id_, None, date(2022, 4, 8), Currency(5), None, None, None) for id_ in (2, 1))
+    for month, transaction in ((12, december), (4, late), (4, early)):
+        subscription.add_transaction(2022, month, transaction)
+
+    assert subscription.charged_amount(2022, 4) == Currency(10) and subscription.charged_amount(2022, 5) == Currency(0)
+    assert subscription.last_transaction(2022, 4) is late
+    assert list(subscription.transactions(2022)) == [(4, late), (4, early), (12, december)]
+    assert list(subscription.transactions(2021)) == []
+
+    # The returned amount can be increased without changing the ledger.
+    subscription.charged_amount(2022, 4).increase(Currency(1))
+    assert subscription.charged_amount(2022, 4) == Currency(10)
+
+
 def test_generateBalance():
     total = "Total"
     # Transaction types.
@@ -1,4 +1,5 @@
 import functools
+import logging
 from datetime import date
 from typing import Iterable
 
@@ -324,6 +325,82 @@ def test_closeBalance_withCreateExtractionFn():
     assert transactions == [t for t in transaction_repo.all(without_balance=False, balance_date=date(2022, 5, 5))]
 
 
+def _close_balance_queries(n_transactions: int) -> int:
+    """Closes a balance with *n_transactions* and returns the number of UPDATE statements executed.
+    """
+    log_responsible.config(MockSecurityHandler())
+    peewee.create_database(":memory:")
+    transaction_repo = peewee.SqliteTransactionRepo()
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo)
+    transaction_repo.add_all(("Cobro", None, date(2022, 5, 4), "10", "Efectivo", "TestResp", "TestDescr")
+                             for _ in range(n_transactions))
+    balance, transactions = generate_balance(transaction_repo.all())
+
+    updates = []
+    peewee_logger = logging.getLogger("peewee")
+    handler = logging.Handler(logging.DEBUG)
+    handler.emit = lambda record: updates.append(record) if record.msg[0].startswith("UPDATE") else None
+    peewee_logger.setLevel(logging.DEBUG)
+    peewee_logger.addHandler(handler)
+    try:
+        close_balance(transaction_repo, balance_repo, balance, transactions, date(2022, 5, 4), String("TestResp"))
+    finally:
+        peewee_logger.removeHandler(handler)
+        peewee_logger.setLevel(logging.NOTSET)
+
+    assert len(list(transaction_repo.all(without_balance=False, balance_date=date(2022, 5, 4)))) == n_transactions
+    return len(updates)
+
+
+def test_closeBalance_bindsTransactionsInBulk():
+    assert _close_balance_queries(5) == _close_balance_queries(1000) == 1
+
+
+def test_closeBalance_unbalancedBoundInDatabase():
+    log_responsible.config(MockSecurityHandler())
+    peewee.create_database(":memory:")
+    transaction_repo = peewee.SqliteTransactionRepo()
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo)
+    cached = transaction_repo.create("Cobro", date(2022, 5, 4), Currency(10), "Efectivo", String("TestResp"),
+                                     "TestDescr")
+    transaction_repo.add_all(("Cobro", None, date(2022, 5, 4), "10", "Efectivo", "TestResp", "TestDescr")
+                             for _ in range(5))
+    balance = transaction_repo.balance_summary()
+
+    close_balance(transaction_repo, balance_repo, balance, None, date(2022, 5, 4), String("TestResp"),
+                  functools.partial(_create_extraction_fn, transaction_repo, date(2022, 5, 4)))
+
+    assert len(list(transaction_repo.all())) == 0
+    assert len(list(transaction_repo.all(without_balance=False, balance_date=date(2022, 5, 4)))) == 7
+    assert cached.balance_date == date(2022, 5, 4)
+    assert balance["Extracción"] == {"Débito": Currency(100), "Total": Currency(100)}
+
+
+def test_closeBalance_failedBinding_nothingIsDone(monkeypatch):
+    log_responsible.config(MockSecurityHandler())
+    peewee.create_database(":memory:")
+    transaction_repo = peewee.SqliteTransactionRepo()
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo)
+    for _ in range(3):
+        transaction_repo.create("Cobro", date(2022, 5, 4), Currency(10), "Efectivo", String("TestResp"), "TestDescr")
+    balance, transactions = generate_balance(transaction_repo.all())
+
+    def failing_bind(transactions_, balance_date):
+        peewee.SqliteTransactionRepo.bind_to_balance_many(transaction_repo, transactions_, balance_date)
+        raise OSError("Simulated crash after binding the transactions.")
+
+    monkeypatch.setattr(transaction_repo, "bind_to_balance_many", failing_bind)
+    with pytest.raises(OSError):
+        close_balance(transaction_repo, balance_repo, balance, transactions, date(2022, 5, 4), String("TestResp"))
+
+    assert not balance_repo.balance_done(date(2022, 5, 4))
+    assert len(list(transaction_repo.all())) == 3  # All the transactions are still without balance.
+    assert all(transaction.balance_date is None for transaction in transactions)
+
+
 def test_registerSubscriptionCharge_firstChargeOfMonth():
     # Repos setup.
     log_responsible.config(MockSecurityHandler())
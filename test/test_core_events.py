@@ -0,0 +1,36 @@
+import gc
+
+from gym_manager.core.base import Activity, String, Currency
+from gym_manager.core.events import EventBus, ActivityUpdated, ActivityRemoved
+
+
+class _Handler:
+
+    def __init__(self):
+        self.events = []
+
+    def on_event(self, event):
+        self.events.append(event)
+
+
+def test_EventBus_publish_onlyHandlersOfTheEventTypeCalled():
+    bus, updated, removed = EventBus(), _Handler(), _Handler()
+    bus.subscribe(ActivityUpdated, updated.on_event)
+    bus.subscribe(ActivityRemoved, removed.on_event)
+
+    event = ActivityUpdated(Activity(1, String("Act"), Currency(10), String("Descr")))
+    bus.publish(event)
+
+    assert updated.events == [event] and removed.events == []
+
+
+def test_EventBus_deadHandlersDropped():
+    bus, handler = EventBus(), _Handler()
+    bus.subscribe(ActivityUpdated, handler.on_event)
+    assert bus.n_handlers(ActivityUpdated) == 1
+
+    del handler
+    gc.collect()
+    bus.publish(ActivityUpdated(Activity(1, String("Act"), Currency(10), String("Descr"))))
+
+    assert bus.n_handlers(ActivityUpdated) == 0
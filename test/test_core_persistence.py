@@ -1,7 +1,7 @@
 import pytest
 
 from gym_manager.core.base import Number
-from gym_manager.core.persistence import LRUCache
+from gym_manager.core.persistence import LRUCache, CacheStats, cache_stats, CacheBudget, estimate_size
 
 
 def test_LRUCache_getItem_raisesTypeError():
@@ -129,3 +129,93 @@ def test_LRUCache_moveToFront():
     cache.move_to_front(2)
 
     assert [2, 3, 1] == [key for key in cache]
+
+
+def test_LRUCache_stats_countsHitsMissesAndEvictions():
+    cache = LRUCache(key_type=int, value_type=int, max_len=2, name="numbers")
+    cache[1] = 1
+    cache[2] = 2
+    assert cache.get(1) == 1 and cache.get(3) is None
+
+    cache[3] = 3  # 2 is the LRU key, because 1 was used after it.
+    with pytest.raises(KeyError):
+        value = cache[2]
+
+    assert cache.stats() == CacheStats("numbers", hits=1, misses=2, evictions=1, size=2, max_len=2)
+    assert cache.stats().hit_ratio == 1 / 3
+
+
+def test_LRUCache_withoutTypeChecks_acceptsAnyType():
+    cache = LRUCache(key_type=int, value_type=int, max_len=2, check_types=False)
+    cache["abc"] = "abc"
+
+    assert cache.get("abc") == "abc"
+
+
+def test_cacheStats_includesLiveCaches():
+    cache = LRUCache(key_type=int, value_type=str, max_len=3, name="live")
+
+    assert cache.stats() in cache_stats()
+
+
+def test_LRUCache_2q_scanDoesntDiscardReusedKeys():
+    cache = LRUCache(key_type=int, value_type=int, max_len=8, policy="2q")
+    for key in (1, 2, 1, 2):  # The keys used twice move to the main queue.
+        if cache.get(key) is None:
+            cache[key] = key
+
+    for key in range(100, 200):
+        cache[key] = key
+
+    assert 1 in cache and 2 in cache and len(cache) == 8
+    assert [key for key in cache][:2] == [2, 1]
+
+
+def test_LRUCache_2q_keyReusedAfterDiscarded_movesToMainQueue():
+    cache = LRUCache(key_type=int, value_type=int, max_len=4, policy="2q")
+    for key in range(5):  # The key 0 is discarded from the queue of keys seen once.
+        cache[key] = key
+    assert 0 not in cache
+
+    cache[0] = 0
+    for key in range(10, 20):
+        cache[key] = key
+
+    assert 0 in cache
+
+
+def test_LRUCache_unknownPolicy_raisesValueError():
+    with pytest.raises(ValueError):
+        LRUCache(key_type=int, value_type=int, max_len=3, policy="mru")
+
+
+class _Owner:
+    def __init__(self, items: list, shared: Number):
+        self.items = items
+        self.shared = shared
+
+
+def test_estimateSize_sharedTypesNotCounted():
+    small, big = _Owner([1], Number(1)), _Owner(list(range(1000)), Number(1))
+
+    assert estimate_size(big) > estimate_size(small) + 1000 * 8
+    assert estimate_size(small, shared_types=(Number,)) < estimate_size(small)
+
+
+def test_CacheBudget_evictsLeastRecentlyUsedAcrossCaches():
+    value_size = estimate_size(list(range(100)))
+    budget = CacheBudget(max_bytes=3 * value_size)
+    first = LRUCache(key_type=int, value_type=list, max_len=10, budget=budget)
+    second = LRUCache(key_type=int, value_type=list, max_len=10, budget=budget)
+
+    first[1] = list(range(100))
+    second[1] = list(range(100))
+    first[2] = list(range(100))
+    first.get(1)  # The value of the second cache is now the least recently used.
+    first[3] = list(range(100))
+
+    assert list(first) == [3, 1, 2] and len(second) == 0
+    assert budget.bytes_used == first.stats().bytes_used == 3 * value_size
+
+    first.pop(2)
+    assert budget.bytes_used == 2 * value_size
@@ -1,3 +1,4 @@
+import threading
 from datetime import datetime
 from typing import Generator
 
@@ -5,7 +6,7 @@ import pytest
 
 from gym_manager.core.base import String
 from gym_manager.core.security import (
-    SimpleSecurityHandler, SecurityRepo, Responsible, SecurityError, Action)
+    SimpleSecurityHandler, SecurityRepo, Responsible, SecurityError, Action, WriteBehindSecurityRepo)
 
 
 class MockSecurityRepo(SecurityRepo):
@@ -67,3 +68,92 @@ def test_SimpleSecurityHandler_CantPerformAction():
     assert not security_handler.cant_perform_action("b")
 
 
+
+
+class RecordingSecurityRepo(MockSecurityRepo):
+    """Keeps the logged actions, and the batches in which they were logged.
+    """
+
+    def __init__(self, fail_first: bool = False):
+        self.batches: list[list[Action]] = []
+        self.fail_first = fail_first
+        self.release = threading.Event()
+        self.release.set()
+        self.closed_by: list[str] = []
+
+    def log_actions(self, actions):
+        self.release.wait()
+        if self.fail_first:
+            self.fail_first = False
+            raise OSError("Simulated failure.")
+        self.batches.append(list(actions))
+
+    def actions(self, page: int = 1, page_len: int = 20, tag: str | None = None, after=None):
+        yield from (action for batch in self.batches for action in batch)
+
+    def close_connection(self):
+        self.closed_by.append(threading.current_thread().name)
+
+
+def _action(i: int) -> Action:
+    return datetime(2022, 5, 5, 10, 0, i), Responsible(String("RespA"), String("1")), "tag", f"Action {i}"
+
+
+def test_WriteBehindSecurityRepo_logsInBatches_afterClose():
+    repo = RecordingSecurityRepo()
+    repo.release.clear()  # Holds the writer, so the actions pile up in the queue.
+    write_behind = WriteBehindSecurityRepo(repo, queue_len=100, batch_len=4)
+
+    for i in range(10):
+        write_behind.log_action(*_action(i))
+    repo.release.set()
+    write_behind.close()
+
+    assert [action for batch in repo.batches for action in batch] == [_action(i) for i in range(10)]
+    assert all(len(batch) <= 4 for batch in repo.batches) and len(repo.batches) < 10
+    with pytest.raises(RuntimeError):
+        write_behind.log_action(*_action(11))
+
+
+def test_WriteBehindSecurityRepo_actions_includesQueuedActions():
+    write_behind = WriteBehindSecurityRepo(RecordingSecurityRepo())
+
+    for i in range(3):
+        write_behind.log_action(*_action(i))
+
+    assert list(write_behind.actions()) == [_action(i) for i in range(3)]
+    write_behind.close()
+
+
+def test_WriteBehindSecurityRepo_failedBatch_writerKeepsRunning():
+    repo = RecordingSecurityRepo(fail_first=True)
+    write_behind = WriteBehindSecurityRepo(repo)
+
+    write_behind.log_action(*_action(0))
+    write_behind.flush()
+    write_behind.log_action(*_action(1))
+    write_behind.close()
+
+    assert repo.batches == [[_action(1)]]
+
+
+def test_WriteBehindSecurityRepo_close_writerClosesItsConnection():
+    repo = RecordingSecurityRepo()
+    write_behind = WriteBehindSecurityRepo(repo)
+
+    write_behind.log_action(*_action(0))
+    write_behind.close()
+
+    assert repo.closed_by == ["WriteBehindSecurityRepo"]
+
+
+def test_WriteBehindSecurityRepo_syncDurability_logsInCaller():
+    repo = RecordingSecurityRepo()
+    repo.log_action = lambda *action: repo.batches.append([action])
+    write_behind = WriteBehindSecurityRepo(repo, durability=WriteBehindSecurityRepo.SYNC)
+
+    write_behind.log_action(*_action(0))
+
+    assert repo.batches == [[_action(0)]] and write_behind._writer is None
+    with pytest.raises(ValueError):
+        WriteBehindSecurityRepo(repo, durability="other")
@@ -0,0 +1,227 @@
+import logging
+from datetime import date, datetime
+
+import pytest
+
+from gym_manager import peewee
+from gym_manager.booking.peewee import SqliteBookingRepo
+from gym_manager.core.base import String, Number, TextLike, Currency
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.core.security import log_responsible, Responsible
+from gym_manager.migrations import migrate, schema_version, MIGRATIONS
+from test.test_core_api import MockSecurityHandler
+
+
+class _SqlRecorder(logging.Handler):
+    """Records the SELECT statements executed by peewee.
+    """
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.selects: list[tuple[str, list]] = []
+
+    def emit(self, record: logging.LogRecord):
+        sql, params = record.msg
+        if sql.startswith("SELECT"):
+            self.selects.append((sql, params))
+
+
+def _query_plans(fn, table: str) -> list[str]:
+    """Executes *fn* and returns the query plans of the SELECT statements that it executed over *table*.
+    """
+    peewee_logger, recorder = logging.getLogger("peewee"), _SqlRecorder()
+    level = peewee_logger.level
+    peewee_logger.setLevel(logging.DEBUG)
+    peewee_logger.addHandler(recorder)
+    try:
+        fn()
+    finally:
+        peewee_logger.removeHandler(recorder)
+        peewee_logger.setLevel(level)
+
+    plans = []
+    for sql, params in recorder.selects:
+        if f'FROM "{table}"' in sql:
+            rows = peewee.DATABASE_PROXY.execute_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans.append(" | ".join(row[-1] for row in rows))
+    assert len(plans) > 0, f"No query over the table '{table}' was executed."
+    return plans
+
+
+def _setup():
+    peewee.create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    migrate()
+
+
+def test_migrate_fromEmptyDatabase_reachesLatestVersion():
+    peewee.create_database(":memory:")
+
+    assert schema_version() == 0
+    assert migrate() == len(MIGRATIONS) == schema_version()
+
+
+def test_migrate_isIdempotent():
+    _setup()
+
+    assert migrate() == len(MIGRATIONS)
+
+
+def test_migrate_existingDatabase_dataPreserved():
+    peewee.create_database(":memory:")
+    transaction_repo = peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), transaction_repo)
+    client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+
+    migrate()
+
+    assert peewee.ClientTable.select().count() == 1
+
+
+def test_migrate_decimalStringCurrencies_convertedToCents():
+    peewee.create_database(":memory:")
+    peewee.DATABASE_PROXY.execute_sql(
+        'CREATE TABLE "activitytable" ("id" INTEGER NOT NULL PRIMARY KEY, "act_name" VARCHAR(255) NOT NULL, '
+        '"price" VARCHAR(255) NOT NULL, "charge_once" INTEGER NOT NULL, "description" TEXT NOT NULL, '
+        '"locked" INTEGER NOT NULL)'
+    )
+    peewee.DATABASE_PROXY.execute_sql(
+        "INSERT INTO activitytable VALUES (1, 'Act', '1500.5', 0, 'Desc', 0), (2, 'Other', '0.07', 0, 'Desc', 0)"
+    )
+
+    migrate()
+
+    prices = peewee.DATABASE_PROXY.execute_sql("SELECT price, typeof(price) FROM activitytable ORDER BY id").fetchall()
+    assert prices == [(150050, "integer"), (7, "integer")]
+    assert peewee.SqliteActivityRepo().get(1).price == Currency("1500.50")
+
+
+def test_migrate_newerSchema_raisesPersistenceError():
+    peewee.create_database(":memory:")
+    peewee.DATABASE_PROXY.pragma('user_version', len(MIGRATIONS) + 1)
+
+    with pytest.raises(PersistenceError):
+        migrate()
+
+
+def test_queryPlan_clientsPage_usesIndex():
+    _setup()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+
+    for plan in _query_plans(lambda: list(client_repo.all(page=3, page_len=20)), "clienttable"):
+        assert "clienttable_active_cli_name" in plan and "TEMP B-TREE" not in plan
+    for plan in _query_plans(lambda: client_repo.count(), "clienttable"):
+        assert "clienttable_active_cli_name" in plan
+
+
+def test_queryPlan_unbalancedTransactions_usesIndex():
+    _setup()
+    transaction_repo = peewee.SqliteTransactionRepo()
+
+    for plan in _query_plans(lambda: list(transaction_repo.all()), "transactiontable"):
+        assert "transactiontable_balance_id" in plan and "TEMP B-TREE" not in plan
+
+
+def test_queryPlan_subscriptionCharges_usesIndex():
+    _setup()
+    activity_repo = peewee.SqliteActivityRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, peewee.SqliteTransactionRepo())
+    client = client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    client_repo.cache.pop(client.id)
+
+    for plan in _query_plans(lambda: client_repo.get(client.id), "subscriptioncharge"):
+        assert "SEARCH" in plan and "USING INDEX" in plan
+
+
+def test_queryPlan_actions_usesIndex():
+    _setup()
+    security_repo = peewee.SqliteSecurityRepo()
+    security_repo.add_responsible(Responsible(String("Admin"), String("code")))
+    security_repo.log_action(datetime(2022, 5, 5), Responsible(String("Admin"), String("code")), "tag", "name")
+
+    for plan in _query_plans(lambda: list(security_repo.actions(page=5)), "actiontable"):
+        assert "actiontable_when" in plan and "TEMP B-TREE" not in plan
+    for plan in _query_plans(lambda: list(security_repo.actions(page=5, tag="tag")), "actiontable"):
+        assert "actiontable_action_tag_when" in plan and "TEMP B-TREE" not in plan
+
+
+def test_queryPlan_cancelledBookings_usesIndex():
+    _setup()
+    booking_repo = SqliteBookingRepo(peewee.SqliteTransactionRepo(), cache_len=10)
+
+    for plan in _query_plans(lambda: list(booking_repo.cancelled(page=5)), "cancelledlog"):
+        assert "cancelledlog_cancel_datetime" in plan and "TEMP B-TREE" not in plan
+
+
+def test_queryPlan_pageAfterKey_seeksIndex():
+    _setup()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    security_repo = peewee.SqliteSecurityRepo()
+    booking_repo = SqliteBookingRepo(peewee.SqliteTransactionRepo(), cache_len=10)
+    when = datetime(2022, 5, 5)
+
+    for plan in _query_plans(lambda: list(client_repo.all(page_len=20, after=("Name", 5))), "clienttable"):
+        assert "SEARCH" in plan and "clienttable_active_cli_name" in plan and "TEMP B-TREE" not in plan
+    for plan in _query_plans(lambda: list(security_repo.actions(after=(when, 5))), "actiontable"):
+        assert "SEARCH" in plan and "actiontable_when" in plan and "TEMP B-TREE" not in plan
+    for plan in _query_plans(lambda: list(security_repo.actions(tag="tag", after=(when, 5))), "actiontable"):
+        assert "SEARCH" in plan and "actiontable_action_tag_when" in plan and "TEMP B-TREE" not in plan
+    for plan in _query_plans(lambda: list(booking_repo.cancelled(after=(when, 5))), "cancelledlog"):
+        assert "SEARCH" in plan and "cancelledlog_cancel_datetime" in plan and "TEMP B-TREE" not in plan
+
+
+def test_queryPlan_temporalBookingsOfDay_usesIndex():
+    _setup()
+    booking_repo = SqliteBookingRepo(peewee.SqliteTransactionRepo(), cache_len=10)
+
+    for plan in _query_plans(lambda: list(booking_repo.all_temporal(date(2022, 5, 5))), "bookingtable"):
+        assert "SEARCH" in plan and "sqlite_autoindex_bookingtable_1" in plan
+
+
+def _search(client_repo, text: str) -> list[str]:
+    filters = [(TextLike("name", "Nombre", "name", translate_fun=client_repo.name_match), text)]
+    return sorted(client.name.as_primitive() for client in client_repo.all(filters=filters))
+
+
+def test_clientSearch_prefixAndAccentInsensitive():
+    _setup()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    client_repo.create(String("María González"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    client_repo.create(String("Gonzalo Pérez"), date(2022, 5, 5), date(2000, 5, 5), Number(2))
+    client_repo.create(String("Juan Lopez"), date(2022, 5, 5), date(2000, 5, 5), Number(3))
+
+    assert _search(client_repo, "gonz") == ["Gonzalo Pérez", "María González"]
+    assert _search(client_repo, "Gonzalez") == ["María González"]
+    assert _search(client_repo, "maria gon") == ["María González"]
+    assert _search(client_repo, 'perez "') == ["Gonzalo Pérez"]
+    assert _search(client_repo, "nzal") == []
+
+
+def test_clientSearch_keptInSyncWithClients():
+    _setup()
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    client = client_repo.create(String("Juan Lopez"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+
+    client.name = String("Pedro Lopez")
+    client_repo.update(client)
+    assert _search(client_repo, "juan") == [] and _search(client_repo, "pedro") == ["Pedro Lopez"]
+
+    # Reactivating the client replaces its row.
+    client_repo.remove(client)
+    assert _search(client_repo, "pedro") == []
+    client_repo.create(String("Ana Lopez"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    assert _search(client_repo, "pedro") == [] and _search(client_repo, "ana") == ["Ana Lopez"]
+
+    peewee.ClientTable.delete().execute()
+    assert peewee.ClientSearch.select().where(peewee.ClientSearch.match("lopez")).count() == 0
+
+
+def test_clientSearch_existingClientsIndexedByMigration():
+    peewee.create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    client_repo = peewee.SqliteClientRepo(peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo())
+    client_repo.create(String("Juan Lopez"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+
+    migrate()
+
+    assert _search(client_repo, "lop") == ["Juan Lopez"]
@@ -1,8 +1,15 @@
+import os
+import sqlite3
 from datetime import date
 
+import pytest
+
 from gym_manager import peewee
 from gym_manager.contact.peewee import SqliteContactRepo
-from gym_manager.parsing import parse
+from gym_manager.core.base import String
+from gym_manager.core.persistence import PersistenceError
+from gym_manager.parsing import (
+    parse, iter_inserts, transfer_backup, _create_temp_tables, TUPLE_RE, dry_run, IMPORT_STAGES, to_sqlite, parse_tuples)
 
 
 def test_parse():
@@ -18,3 +25,154 @@ def test_parse():
           since=date(2022, 1, 1), backup_path=r"E:\bruno\projects\gym_manager\test\backup.sql",
           contact_repo=contact_repo)
 
+
+DUMP = r"""-- MySQL dump 10.13
+DROP TABLE IF EXISTS `cliente`;
+CREATE TABLE `cliente` (`id` int(10) NOT NULL);
+LOCK TABLES `usuario` WRITE;
+INSERT INTO `usuario` VALUES (1,'admin','x',0);
+UNLOCK TABLES;
+INSERT INTO `actividad` VALUES (1,'Musculación','Sala (planta baja); con \'aparatos\'',1),(2,'Yoga','It''s\nnew',1);
+INSERT INTO `otra` VALUES (1,'not loaded');
+INSERT INTO `cliente` VALUES (1,'O\'Brien','Calle 1',NULL,NULL,30,NULL,NULL,'2021-12-01',NULL),(2,'Ana, María',NULL,NULL,NULL,NULL,NULL,1.75,'2022-01-03','');
+INSERT INTO `cliente_actividad` VALUES (1,1),(2,2);
+INSERT INTO `pago` VALUES ('2022-01-05',1,1,100.50,'2022-01-05',1),('2022-02-05',1,1,100.50,'2022-02-05',1),('2022-01-10',2,2,80.00,'2022-01-10',1);
+"""
+
+
+def _write_dump(tmp_path) -> str:
+    dump_path = tmp_path / "dump.sql"
+    dump_path.write_text(DUMP, encoding="utf-8")
+    return str(dump_path)
+
+
+def _staging_rows(dump_path: str) -> dict[str, list[tuple]]:
+    conn = sqlite3.connect(":memory:")
+    tables = _create_temp_tables(conn)
+    loaded, _ = transfer_backup(dump_path, conn, tables, batch_len=2)
+    rows = {table: conn.execute(f"SELECT * FROM {table}").fetchall() for table in tables}
+    assert loaded == {table: len(table_rows) for table, table_rows in rows.items()}
+    conn.close()
+    return rows
+
+
+def test_iterInserts_valuesSplitAcrossBlocks(tmp_path):
+    dump_path = _write_dump(tmp_path)
+    tables = {"actividad", "cliente", "pago"}
+
+    progress = []
+    small_blocks = list(iter_inserts(dump_path, tables, batch_len=2, block_len=7,
+                                     progress_fn=lambda read, total: progress.append((read, total))))
+
+    batches = list(iter_inserts(dump_path, tables, batch_len=2))
+    assert [table for table, _ in batches] == ["actividad", "cliente", "pago", "pago"]
+    # Blocks shorter than a tuple split the batches at other places, but the tuples are the same.
+    assert [(table, tuple_) for table, tuples in small_blocks for tuple_ in TUPLE_RE.findall(tuples)] == \
+           [(table, tuple_) for table, tuples in batches for tuple_ in TUPLE_RE.findall(tuples)]
+    assert progress[-1] == (os.path.getsize(dump_path), os.path.getsize(dump_path))
+
+
+def test_iterInserts_truncatedDump_raisesPersistenceError(tmp_path):
+    dump_path = tmp_path / "dump.sql"
+    dump_path.write_text("INSERT INTO `usuario` VALUES (1,'admin','x',0),(2,'trunc", encoding="utf-8")
+
+    with pytest.raises(PersistenceError):
+        list(iter_inserts(str(dump_path), {"usuario"}))
+
+
+def test_transferBackup_parsesMysqlValues(tmp_path):
+    rows = _staging_rows(_write_dump(tmp_path))
+
+    assert rows["actividad"] == [(1, "Musculación", "Sala (planta baja); con 'aparatos'", 1),
+                                 (2, "Yoga", "It's\nnew", 1)]
+    assert rows["cliente"][0][:4] == (1, "O'Brien", "Calle 1", None)
+    assert rows["cliente"][1][1] == "Ana, María" and rows["cliente"][1][7] == 1.75
+    assert len(rows["pago"]) == 3 and rows["item_texto_caja"] == []
+
+
+def test_transferBackup_wrongNumberOfValues_rowRejected(tmp_path):
+    dump_path = tmp_path / "dump.sql"
+    dump_path.write_text("INSERT INTO `usuario` VALUES (1,'admin','x',0),(2,'extra','x',0,1),(3,'nul\\0','x',0);",
+                         encoding="utf-8")
+
+    rows = _staging_rows(str(dump_path))
+
+    assert rows["usuario"] == [(1, "admin", "x", 0), (3, "nul\0", "x", 0)]
+
+
+def test_toSqlite_rewritesMysqlEscapes():
+    tuples = r"""(1,'It\'s','a''b','back\\slash','new\nline','nul\0char','quote\"d',NULL,1.5)"""
+    conn = sqlite3.connect(":memory:")
+
+    row = conn.execute(f"SELECT * FROM (VALUES {to_sqlite(tuples)})").fetchone()
+
+    assert row == (1, "It's", "a'b", "back\\slash", "new\nline", "nul\0char", 'quote"d', None, 1.5)
+    conn.close()
+
+
+def test_parseTuples_matchesSqliteParsing():
+    tuples = TUPLE_RE.findall(r"""(1,'It\'s, (not) a tuple','a''b',NULL,-2.5),(2,'new\nline','nul\0',3,4)""")
+
+    assert parse_tuples("t", tuples) == ("t", [(1, "It's, (not) a tuple", "a'b", None, -2.5),
+                                               (2, "new\nline", "nul\0", 3, 4)])
+
+
+def _repos() -> tuple:
+    peewee.create_database(":memory:")
+    activity_repo = peewee.SqliteActivityRepo()
+    transaction_repo = peewee.SqliteTransactionRepo()
+    balance_repo = peewee.SqliteBalanceRepo(transaction_repo)
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    return activity_repo, client_repo, peewee.SqliteSubscriptionRepo(), transaction_repo, balance_repo
+
+
+def test_parse_syntheticDump(tmp_path):
+    activity_repo, client_repo, subscription_repo, transaction_repo, balance_repo = _repos()
+
+    parse(activity_repo, client_repo, subscription_repo, transaction_repo, balance_repo, since=date(2022, 1, 1),
+          backup_path=_write_dump(tmp_path))
+
+    assert {client.name for client in client_repo.all()} == {String("O'Brien"), String("Ana, María")}
+    assert peewee.SubscriptionTable.select().count() == 2
+    assert peewee.SubscriptionCharge.select().count() == 3
+
+
+class FailingSubscriptionRepo(peewee.SqliteSubscriptionRepo):
+    def import_charges(self, raw_charges, batch_len: int = 1024) -> int:
+        super().import_charges(raw_charges, batch_len)
+        raise OSError("The import was interrupted.")
+
+
+def test_parse_failedStage_resumedByRerun(tmp_path):
+    activity_repo, client_repo, subscription_repo, transaction_repo, balance_repo = _repos()
+    import_log, dump_path = peewee.SqliteImportLog(), _write_dump(tmp_path)
+
+    with pytest.raises(OSError):
+        parse(activity_repo, client_repo, FailingSubscriptionRepo(), transaction_repo, balance_repo,
+              since=date(2022, 1, 1), backup_path=dump_path, import_log=import_log)
+    # The charges written before the failure were rolled back along with their stage.
+    assert peewee.SubscriptionCharge.select().count() == 0 and peewee.TransactionTable.select().count() == 0
+    assert peewee.ClientTable.select().count() == 2
+
+    assert parse(activity_repo, client_repo, subscription_repo, transaction_repo, balance_repo, since=date(2022, 1, 1),
+                 backup_path=dump_path, import_log=import_log) == ["charges"]
+    assert peewee.SubscriptionTable.select().count() == 2
+    assert peewee.SubscriptionCharge.select().count() == peewee.TransactionTable.select().count() == 3
+
+    assert parse(activity_repo, client_repo, subscription_repo, transaction_repo, balance_repo, since=date(2022, 1, 1),
+                 backup_path=dump_path, import_log=import_log) == []
+    assert peewee.SubscriptionCharge.select().count() == 3
+
+
+def test_dryRun_reportsWithoutWriting(tmp_path):
+    _repos()
+
+    stats = dry_run(_write_dump(tmp_path), since=date(2022, 1, 1))
+
+    assert stats.loaded == {"usuario": 1, "actividad": 2, "cliente": 2, "cliente_actividad": 2, "item_texto_caja": 0,
+                            "pago": 3}
+    assert sum(stats.rejected.values()) == 0
+    assert stats.written == {"activities": 2, "clients": 2, "subscriptions": 2, "balance": 1, "charges": 3}
+    assert list(stats.written) == list(IMPORT_STAGES)
+    assert stats.projected_duration > stats.load_duration
+    assert peewee.ClientTable.select().count() == 0 and peewee.TransactionTable.select().count() == 0
@@ -1,14 +1,19 @@
-from datetime import date
+import logging
+import tracemalloc
+from datetime import date, datetime
 from typing import Generator, Iterable
 
 import pytest
 
-from gym_manager.core.base import Activity, String, Transaction, Currency, Client, Number, Subscription
-from gym_manager.core.persistence import ActivityRepo, FilterValuePair, TransactionRepo, PersistenceError, ClientView
-from gym_manager.core.security import log_responsible
+from gym_manager.core.api import generate_balance
+from gym_manager.core.base import Activity, String, Transaction, Currency, Client, Number, Subscription, Balance
+from gym_manager.core.persistence import (
+    ActivityRepo, FilterValuePair, TransactionRepo, PersistenceError, ClientView, LRUCache, PageKey)
+from gym_manager.core.security import log_responsible, Responsible, WriteBehindSecurityRepo, SecurityRepo
 from gym_manager.peewee import (
     SqliteClientRepo, create_database, ClientTable, SqliteActivityRepo,
-    SqliteTransactionRepo, SqliteSubscriptionRepo, TransactionTable, SqliteBalanceRepo)
+    SqliteTransactionRepo, SqliteSubscriptionRepo, TransactionTable, SqliteBalanceRepo, connection_profile, seek,
+    SqliteSecurityRepo)
 from test.test_core_api import MockSecurityHandler
 
 
@@ -67,7 +72,7 @@ class MockTransactionRepo(TransactionRepo):
 
     def all(
             self, page: int = 1, page_len: int | None = None, filters: list[FilterValuePair] | None = None,
-            without_balance: bool = True, balance_date: date | None = None
+            without_balance: bool = True, balance_date: date | None = None, after: PageKey | None = None
     ) -> Generator[Transaction, None, None]:
         pass
 
@@ -77,6 +82,18 @@ class MockTransactionRepo(TransactionRepo):
     def charges_by_activity(self, activity: Activity, when: date) -> Generator[Transaction, None, None]:
         pass
 
+    def balance_summary(self, balance_date: date | None = None) -> Balance:
+        pass
+
+    def bind_to_balance_many(self, transactions: Iterable[Transaction], balance_date: date):
+        pass
+
+    def bind_unbalanced(self, balance_date: date) -> tuple[Transaction, ...]:
+        pass
+
+    def charges_total_by_activity(self, activity: Activity, when: date) -> Currency:
+        pass
+
 
 def test_ClientRepo_remove():
     create_database(":memory:")
@@ -240,6 +257,55 @@ def test_ClientView_Transaction_updatedAfterReactivatingClient():
     assert transaction.client.name == client.name
 
 
+def test_ClientView_sharedByListings_droppedWhenUnused():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    transaction_repo = SqliteTransactionRepo(cache_len=0)
+    client_repo = SqliteClientRepo(SqliteActivityRepo(), transaction_repo)
+
+    client = client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    for _ in range(2):
+        transaction_repo.create("type", date(2022, 2, 2), Currency(1), "method", String("Resp"), "desc", client)
+
+    transactions = list(transaction_repo.all())
+    assert transactions[0].client is transactions[1].client
+    assert transactions[0].client is list(transaction_repo.all())[0].client
+
+    del transactions
+    assert len(client_repo.views) == 0
+
+
+def test_ActivityRepo_remove_cachedClientsUnsubscribed():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    activity_repo = SqliteActivityRepo()
+    client_repo = SqliteClientRepo(activity_repo, SqliteTransactionRepo())
+    subscription_repo = SqliteSubscriptionRepo()
+
+    activity = activity_repo.create(String("Act"), Currency(100), String("Descr"))
+    client = client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    subscription = Subscription(date(2022, 5, 5), client, activity)
+    subscription_repo.add(subscription)
+    client.add(subscription)
+
+    activity_repo.remove(activity)
+
+    assert activity.removed and not client.is_subscribed(activity)
+
+
+def test_ClientRepo_recentlyServed():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    transaction_repo = SqliteTransactionRepo()
+    client_repo = SqliteClientRepo(SqliteActivityRepo(), transaction_repo)
+    clients = [client_repo.create(String(f"Name{i}"), date(2022, 5, 5), date(2000, 5, 5), Number(i)) for i in range(4)]
+    for client in (clients[0], clients[1], clients[2], clients[0], clients[3]):
+        transaction_repo.create("Cobro", date(2022, 5, 5), Currency(1), "Efectivo", String("Resp"), "Descr", client)
+    client_repo.remove(clients[3])
+
+    assert client_repo.recently_served(2) == [clients[0].id, clients[2].id]
+
+
 def test_ActivityRepo_update_subsAreNotRemoved():
     create_database(":memory:")
     log_responsible.config(MockSecurityHandler())
@@ -265,3 +331,252 @@ def test_ActivityRepo_update_subsAreNotRemoved():
 
 
 
+
+
+def test_create_database_appliesConnectionProfile(tmp_path):
+    create_database(str(tmp_path / "profile.db"), {"journal_mode": "wal", "synchronous": "normal", "cache_size": -4000,
+                                                   "busy_timeout": 1000})
+    profile = connection_profile()
+
+    assert (profile["journal_mode"] == "wal" and profile["synchronous"] == 1 and profile["cache_size"] == -4000
+            and profile["busy_timeout"] == 1000 and profile["foreign_keys"] == 1)
+
+
+def test_create_database_requiredPragmasCantBeOverridden():
+    create_database(":memory:", {"foreign_keys": 0})
+
+    assert connection_profile()["foreign_keys"] == 1
+
+
+def test_TransactionRepo_amountsStoredAsCents():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    transaction_repo = SqliteTransactionRepo()
+    SqliteClientRepo(SqliteActivityRepo(), transaction_repo)
+
+    transaction_repo.create("type", date(2022, 2, 2), Currency("10.55"), "method", String("Resp"), "desc")
+    transaction_repo.create("type", date(2022, 2, 2), Currency("0.45"), "method", String("Resp"), "desc")
+
+    assert [record.amount for record in TransactionTable.select().where(TransactionTable.amount > Currency(1))] == [
+        Currency("10.55")]
+    assert TransactionTable.select(TransactionTable.amount).tuples().first() == (Currency("10.55"),)
+
+
+def test_TransactionRepo_chargesTotalByActivity():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    activity_repo, transaction_repo = SqliteActivityRepo(), SqliteTransactionRepo()
+    client_repo = SqliteClientRepo(activity_repo, transaction_repo)
+    subscription_repo = SqliteSubscriptionRepo()
+
+    client = client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    activity = activity_repo.create(String("Act"), Currency("10.10"), String("Desc"))
+    other = activity_repo.create(String("Other"), Currency(1), String("Desc"))
+    subscription = Subscription(date(2022, 2, 2), client, activity)
+    subscription_repo.add(subscription)
+    other_subscription = Subscription(date(2022, 2, 2), client, other)
+    subscription_repo.add(other_subscription)
+
+    for sub, year, month, amount in ((subscription, 2022, 5, "10.10"), (subscription, 2022, 5, "0.33"),
+                                     (subscription, 2022, 6, "10.10"), (other_subscription, 2022, 5, "1")):
+        transaction = transaction_repo.create("type", date(year, month, 1), Currency(amount), "method",
+                                              String("Resp"), "desc", client)
+        subscription_repo.register_transaction(sub, year, month, transaction)
+
+    assert transaction_repo.charges_total_by_activity(activity, date(2022, 5, 20)) == Currency("10.43")
+    assert len(list(transaction_repo.charges_by_activity(activity, date(2022, 5, 20)))) == 2
+    assert transaction_repo.charges_total_by_activity(activity, date(2022, 7, 1)) == Currency(0)
+
+
+def _page_cost(extra_transactions: int) -> tuple[int, int, list[Client]]:
+    """Loads the first page of clients, with *extra_transactions* that aren't subscription charges.
+
+    Returns:
+        The number of executed queries, the peak of memory allocated while loading the page, and the loaded clients.
+    """
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    activity_repo, transaction_repo = SqliteActivityRepo(), SqliteTransactionRepo()
+    client_repo = SqliteClientRepo(activity_repo, transaction_repo)
+    subscription_repo = SqliteSubscriptionRepo()
+
+    activity = activity_repo.create(String("Act"), Currency(1), String("Desc"))
+    for i, name in enumerate(("A", "B", "Y", "Z")):
+        client = client_repo.create(String(name), date(2022, 5, 5), date(2000, 5, 5), Number(i + 1))
+        subscription = Subscription(date(2022, 2, 2), client, activity)
+        subscription_repo.add(subscription)
+        transaction = transaction_repo.create("type", date(2022, 5, 1), Currency(1), "method", String("Resp"), "desc",
+                                              client)
+        subscription_repo.register_transaction(subscription, 2022, 5, transaction)
+
+    # The page holds the clients "A" and "B", but the extra transactions are spread between all the clients.
+    transaction_repo.add_all(("type", client_id, date(2022, 5, 1), "1", "method", "Resp", "desc")
+                             for client_id in (1, 2, 3, 4) for _ in range(extra_transactions // 4))
+    client_repo.cache = LRUCache(int, Client, max_len=50)
+
+    peewee_logger, handler = logging.getLogger("peewee"), _QueryCounter()
+    peewee_logger.setLevel(logging.DEBUG)
+    peewee_logger.addHandler(handler)
+    tracemalloc.start()
+    try:
+        clients = list(client_repo.all(page=1, page_len=2))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        peewee_logger.removeHandler(handler)
+        peewee_logger.setLevel(logging.NOTSET)
+
+    return handler.count, peak, clients
+
+
+class _QueryCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord):
+        self.count += 1
+
+
+def test_ClientRepo_all_pageLoadsOnlyItsClientsCharges():
+    _, _, clients = _page_cost(extra_transactions=10)
+
+    assert [client.name for client in clients] == [String("A"), String("B")]
+    for client in clients:
+        subscription = list(client.subscriptions())[0]
+        assert [transaction.client for _, transaction in subscription.transactions(2022)] == [client]
+
+
+def test_ClientRepo_all_pageCostIndependentOfTransactionVolume():
+    few_queries, few_peak, _ = _page_cost(extra_transactions=10)
+    many_queries, many_peak, _ = _page_cost(extra_transactions=20000)
+
+    assert few_queries == many_queries <= 4
+    # Loading all the transactions would allocate several megabytes.
+    assert many_peak < few_peak + 256 * 1024
+
+
+def test_ClientRepo_all_pagesAfterKey_matchOffsetPages():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    client_repo = SqliteClientRepo(SqliteActivityRepo(), SqliteTransactionRepo())
+    # Repeated names, so the pages also depend on the ids of the clients.
+    for i, name in enumerate(("B", "A", "C", "B", "A", "B", "D", "A", "C", "B", "E")):
+        client_repo.create(String(name), date(2022, 5, 5), date(2000, 5, 5), Number(i + 1))
+
+    for descending in (False, True):
+        query = ClientTable.select(ClientTable.id)
+        offset_pages = [[r.id for r in seek(query, (ClientTable.cli_name, ClientTable.id), page, 3,
+                                            descending=descending)] for page in range(1, 5)]
+        key_pages, after = [], None
+        for _ in range(4):
+            page = list(seek(ClientTable.select(), (ClientTable.cli_name, ClientTable.id), 1, 3, after, descending))
+            key_pages.append([r.id for r in page])
+            after = (page[-1].cli_name, page[-1].id) if len(page) > 0 else after
+        assert key_pages == offset_pages
+
+    pages, after = [], None
+    while len(page := list(client_repo.all(page_len=4, after=after))) > 0:
+        pages.extend(client.id for client in page)
+        after = client_repo.page_key(page[-1])
+    assert pages == [client.id for client in client_repo.all(page=1, page_len=11)]
+
+
+def test_seek_afterKeyOfWrongLen_raisesValueError():
+    create_database(":memory:")
+    ClientTable.create_table()
+
+    with pytest.raises(ValueError):
+        seek(ClientTable.select(), (ClientTable.cli_name, ClientTable.id), 1, 3, after=("A",))
+
+
+def test_TransactionRepo_allAfterKey_matchesOffsetPages():
+    create_database(":memory:")
+    transaction_repo = SqliteTransactionRepo()
+    SqliteClientRepo(SqliteActivityRepo(), transaction_repo)
+    transaction_repo.add_all(("Cobro", None, date(2022, 5, 4), "10", "Efectivo", "Resp", f"Descr {i}")
+                             for i in range(23))
+
+    by_key, after = [], None
+    while len(page := list(transaction_repo.all(page_len=5, after=after))) > 0:
+        by_key.append(page)
+        after = TransactionRepo.page_key(page[-1])
+
+    assert by_key == [list(transaction_repo.all(page, page_len=5)) for page in range(1, 6)]
+
+
+def test_TransactionRepo_balanceSummary_matchesGeneratedBalance():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    transaction_repo = SqliteTransactionRepo()
+    balance_repo = SqliteBalanceRepo(transaction_repo)
+    SqliteClientRepo(SqliteActivityRepo(), transaction_repo)
+
+    for type_, method, amount in (("Cobro", "Efectivo", "10.50"), ("Cobro", "Débito", "20"), ("Cobro", "Efectivo", "5"),
+                                  ("Extracción", "Efectivo", "7.25")):
+        transaction_repo.create(type_, date(2022, 5, 4), Currency(amount), method, String("Resp"), "desc")
+    balance, transactions = generate_balance(transaction_repo.all())
+
+    assert transaction_repo.balance_summary() == balance == {
+        "Cobro": {"Efectivo": Currency("15.50"), "Débito": Currency(20), "Total": Currency("35.50")},
+        "Extracción": {"Efectivo": Currency("7.25"), "Total": Currency("7.25")}
+    }
+
+    balance_repo.add(date(2022, 5, 4), String("Resp"), balance, transactions)
+    assert transaction_repo.balance_summary(date(2022, 5, 4)) == balance
+    assert transaction_repo.balance_summary() == {"Cobro": {"Total": Currency(0)}, "Extracción": {"Total": Currency(0)}}
+
+
+def test_SubscriptionRepo_importCharges_transactionsLinkedToTheirCharges():
+    create_database(":memory:")
+    log_responsible.config(MockSecurityHandler())
+    activity_repo, transaction_repo = SqliteActivityRepo(), SqliteTransactionRepo()
+    client_repo = SqliteClientRepo(activity_repo, transaction_repo)
+    subscription_repo = SqliteSubscriptionRepo()
+
+    client = client_repo.create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    activity = activity_repo.create(String("Act"), Currency(10), String("Desc"))
+    subscription_repo.add(Subscription(date(2022, 1, 1), client, activity))
+    transaction_repo.create("type", date(2022, 1, 1), Currency(1), "method", String("Resp"), "desc")
+
+    raw_charges = ((2022, month, client.id, activity.id,
+                    ("Cobro", client.id, date(2022, month, 10), 10 + month, "Efectivo", "Resp", f"desc {month}", None))
+                   for month in range(1, 13))
+    assert subscription_repo.import_charges(raw_charges, batch_len=5) == 12
+
+    assert [(t.description, t.amount) for t in transaction_repo.charges_by_activity(activity, date(2022, 7, 1))] == [
+        ("desc 7", Currency(17))]
+    assert transaction_repo.charges_total_by_activity(activity, date(2022, 12, 1)) == Currency(22)
+    assert TransactionTable.select().count() == 13
+
+
+def test_SecurityRepo_writeBehind_actionsLoggedFromWriterThread(tmp_path):
+    # The writer thread opens its own connection, so the database can't be in memory.
+    create_database(str(tmp_path / "actions.db"))
+    security_repo = SqliteSecurityRepo()
+    responsible = Responsible(String("Admin"), String("code"))
+    security_repo.add_responsible(responsible)
+    write_behind = WriteBehindSecurityRepo(security_repo, batch_len=16)
+
+    for i in range(50):
+        write_behind.log_action(datetime(2022, 5, 5, 10, 0, i), responsible, "tag", f"Action {i}")
+    write_behind.close()
+
+    assert [name for _, _, _, name in security_repo.actions(page_len=50)] == [f"Action {i}" for i in range(49, -1, -1)]
+
+
+def test_SecurityRepo_actionsAfterKey_sameDatetimeNotSkipped():
+    create_database(":memory:")
+    security_repo = SqliteSecurityRepo()
+    responsible = Responsible(String("Admin"), String("code"))
+    security_repo.add_responsible(responsible)
+    # Groups of three actions share the same datetime, so some groups are split between pages.
+    security_repo.log_actions((datetime(2022, 5, 5, 10, i // 3), responsible, "tag", f"Action {i}") for i in range(20))
+
+    names, after = [], None
+    while len(page := list(security_repo.actions(page_len=4, after=after))) > 0:
+        names.extend(name for _, _, _, name in page)
+        after = SecurityRepo.page_key(page[-1])
+
+    assert names == [name for _, _, _, name in security_repo.actions(page_len=20)]
+    assert sorted(names) == sorted(f"Action {i}" for i in range(20))
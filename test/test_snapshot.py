@@ -0,0 +1,105 @@
+from datetime import date, time
+
+import pytest
+
+pytest.importorskip("zstandard")
+
+from gym_manager import peewee, snapshot
+from gym_manager.booking.core import FixedBooking
+from gym_manager.booking.peewee import SqliteBookingRepo
+from gym_manager.core.base import String, Number, Currency, Subscription
+from gym_manager.core.security import log_responsible
+from gym_manager.migrations import migrate
+from test.test_core_api import MockSecurityHandler
+
+
+def _repos() -> dict:
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    booking_repo = SqliteBookingRepo(transaction_repo, cache_len=16)
+    return {"activity": activity_repo, "transaction": transaction_repo, "client": client_repo,
+            "subscription": peewee.SqliteSubscriptionRepo(), "booking": booking_repo,
+            "caches": {"activities": activity_repo.cache, "clients": client_repo.cache,
+                       "fixed_bookings": booking_repo.fixed_booking_cache}}
+
+
+def _populate(repos: dict):
+    activity = repos["activity"].create(String("Act"), Currency(100), String("Descr"))
+    client = repos["client"].create(String("Name"), date(2022, 5, 5), date(2000, 5, 5), Number(1))
+    subscription = Subscription(date(2022, 5, 5), client, activity)
+    repos["subscription"].add(subscription)
+    client.add(subscription)
+    transaction = repos["transaction"].create("Cobro", date(2022, 5, 5), Currency(100), "Efectivo", String("Resp"),
+                                              "Descr", client)
+    repos["subscription"].register_transaction(subscription, 2022, 5, transaction)
+    client.mark_as_charged(activity.name, 2022, 5, transaction)
+    repos["booking"].add(FixedBooking("1", String("Name"), time(8, 0), time(9, 0), 0, date(2022, 5, 2)))
+    list(repos["booking"].all_fixed())
+
+
+def test_snapshot_loadedIntoEmptyCaches_sharedObjectsKept(tmp_path):
+    peewee.create_database(":memory:")
+    migrate()
+    log_responsible.config(MockSecurityHandler())
+    repos = _repos()
+    _populate(repos)
+    path = str(tmp_path / "snapshot.zst")
+    snapshot.save(path, repos["caches"])
+
+    repos = _repos()
+    assert snapshot.load(path, repos["caches"]) == 3
+
+    activity, client = repos["activity"].get(1), repos["client"].get(1)
+    assert repos["activity"].cache.misses == repos["client"].cache.misses == 0
+    assert next(iter(client.subscriptions())).activity is activity
+    assert len(list(next(iter(client.subscriptions())).transactions(2022))) == 1
+    assert len(list(repos["booking"].all_fixed())) == 1 and repos["booking"].fixed_booking_cache.misses == 0
+
+
+def test_snapshot_databaseChanged_discarded(tmp_path):
+    peewee.create_database(":memory:")
+    migrate()
+    log_responsible.config(MockSecurityHandler())
+    repos = _repos()
+    _populate(repos)
+    path = str(tmp_path / "snapshot.zst")
+    snapshot.save(path, repos["caches"])
+
+    # The update doesn't change the row counts, so only the change counter detects it.
+    client = repos["client"].get(1)
+    client.name = String("Other")
+    repos["client"].update(client)
+
+    repos = _repos()
+    assert snapshot.load(path, repos["caches"]) == 0
+    assert repos["client"].get(1).name == String("Other")
+    assert not (tmp_path / "snapshot.zst").exists()
+
+
+def test_snapshot_unreadable_discarded(tmp_path):
+    peewee.create_database(":memory:")
+    migrate()
+    path = tmp_path / "snapshot.zst"
+    path.write_bytes(b"not a snapshot")
+
+    assert snapshot.load(str(path), _repos()["caches"]) == 0
+    assert not path.exists()
+
+
+def test_snapshot_chargeLoadedWithClientView_saved(tmp_path):
+    peewee.create_database(":memory:")
+    migrate()
+    log_responsible.config(MockSecurityHandler())
+    _populate(_repos())
+
+    # The charge is loaded first by the transaction repo, so its client is a ClientView.
+    repos = _repos()
+    list(repos["transaction"].all(without_balance=True))
+    client = repos["client"].get(1)
+    path = str(tmp_path / "snapshot.zst")
+    snapshot.save(path, repos["caches"])
+
+    repos = _repos()
+    assert snapshot.load(path, repos["caches"]) == 2
+    (_, transaction), = next(iter(repos["client"].get(1).subscriptions())).transactions(2022)
+    assert transaction.client.id == client.id and transaction.client.name == String("Name")
@@ -0,0 +1,72 @@
+import threading
+import time
+from datetime import date
+
+from gym_manager import peewee
+from gym_manager.core.base import String, Currency, Number
+from gym_manager.core.security import log_responsible
+from gym_manager.warmup import WarmUp
+from test.test_core_api import MockSecurityHandler
+
+
+def test_WarmUp_pause_waitsForRunningStep_noStepsUntilResumed():
+    warm_up, done = WarmUp(), []
+    step_started, release_step = threading.Event(), threading.Event()
+
+    def blocking_step():
+        step_started.set()
+        release_step.wait(5)
+        done.append(0)
+
+    warm_up.add("task", [blocking_step, lambda: done.append(1), lambda: done.append(2)])
+    warm_up.start()
+    assert step_started.wait(5)
+
+    # The running step ends before pause() returns.
+    threading.Timer(0.05, release_step.set).start()
+    warm_up.pause()
+    assert done == [0]
+
+    # No step runs while paused.
+    time.sleep(0.1)
+    assert done == [0]
+
+    warm_up.resume()
+    warm_up.join(timeout=5)
+    assert warm_up.done and done == [0, 1, 2]
+
+
+def test_WarmUp_failedTask_nextTasksRun():
+    warm_up, done = WarmUp(), []
+    warm_up.add("failing", [lambda: 1 / 0, lambda: done.append("skipped")])
+    warm_up.add("other", [lambda: done.append("other")])
+
+    warm_up.start()
+    warm_up.join(timeout=5)
+
+    assert done == ["other"]
+
+
+def test_WarmUp_cachesFilledFromBackgroundThread(tmp_path):
+    # An in-memory database can't be used, because each thread has its own connection.
+    peewee.create_database(str(tmp_path / "warmup.db"))
+    log_responsible.config(MockSecurityHandler())
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    for dni in range(3):
+        client = client_repo.create(String(f"Name{dni}"), date(2022, 5, 5), date(2000, 5, 5), Number(dni))
+        transaction_repo.create("Cobro", date(2022, 5, 5), Currency(1), "Efectivo", String("Resp"), "Descr", client)
+    activity_repo.create(String("Act"), Currency(100), String("Descr"))
+
+    # Repositories with empty caches, like after a start.
+    activity_repo, transaction_repo = peewee.SqliteActivityRepo(), peewee.SqliteTransactionRepo()
+    client_repo = peewee.SqliteClientRepo(activity_repo, transaction_repo)
+    warm_up = WarmUp()
+    warm_up.add("activities", [lambda: list(activity_repo.all())])
+    warm_up.add("clients", (lambda id_=id_: client_repo.get(id_) for id_ in client_repo.recently_served(2)))
+    warm_up.start()
+    warm_up.join(timeout=5)
+
+    assert len(activity_repo.cache) == 1
+    assert list(client_repo.cache) == [2, 3]
+    peewee.DATABASE_PROXY.close()
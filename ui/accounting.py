@@ -19,7 +19,7 @@ from ui.utils import MESSAGE
 from ui.widget_config import (
     config_lbl, config_btn, config_line, fill_cell, config_combobox, fill_combobox,
     new_config_table, config_date_edit)
-from ui.widgets import Separator, Field, Dialog, responsible_field, valid_text_value
+from ui.widgets import Separator, Field, Dialog, responsible_field, valid_text_value, PageIndex
 
 
 class MainController:
@@ -33,22 +33,20 @@ class MainController:
         self.security_handler = security_handler
 
         fill_combobox(self.acc_main_ui.method_combobox, self.transaction_repo.methods, display=lambda method: method)
-        self._today_transactions: list[Transaction] = [t for t in transaction_repo.all()]
 
         # Calculates charges of the day.
-        self.balance, self._today_transactions = api.generate_balance(self._today_transactions)
+        self.balance = self.transaction_repo.balance_summary()
         self.acc_main_ui.today_charges_line.setText(Currency.fmt(self.balance["Cobro"].get("Total", Currency(0))))
         self.acc_main_ui.today_extractions_line.setText(
             Currency.fmt(self.balance["Extracción"].get("Total", Currency(0)))
         )
 
+        # Configures the page index, so only the transactions of the page in display are created.
+        self.acc_main_ui.page_index.config(refresh_table=self.fill_transaction_table, page_len=20, show_info=False,
+                                           page_key=self.transaction_repo.page_key)
+
         # Shows transactions of the day.
-        for i, transaction in enumerate(self._today_transactions):
-            fill_cell(self.acc_main_ui.transaction_table, i, 0, transaction.responsible, data_type=str)
-            name = transaction.client.name if transaction.client is not None else "-"
-            fill_cell(self.acc_main_ui.transaction_table, i, 1, name, data_type=str)
-            fill_cell(self.acc_main_ui.transaction_table, i, 2, Currency.fmt(transaction.amount), data_type=int)
-            fill_cell(self.acc_main_ui.transaction_table, i, 3, transaction.description, data_type=str)
+        self.fill_transaction_table()
 
         # Sets callbacks.
         # noinspection PyUnresolvedReferences
@@ -58,6 +56,18 @@ class MainController:
         # noinspection PyUnresolvedReferences
         self.acc_main_ui.history_btn.clicked.connect(self.balance_history)
 
+    def fill_transaction_table(self):
+        self.acc_main_ui.transaction_table.setRowCount(0)
+
+        page_index = self.acc_main_ui.page_index
+        transactions_it = self.transaction_repo.all(page_index.page, page_index.page_len, after=page_index.after)
+        for i, transaction in enumerate(page_index.track(transactions_it)):
+            fill_cell(self.acc_main_ui.transaction_table, i, 0, transaction.responsible, data_type=str)
+            name = transaction.client.name if transaction.client is not None else "-"
+            fill_cell(self.acc_main_ui.transaction_table, i, 1, name, data_type=str)
+            fill_cell(self.acc_main_ui.transaction_table, i, 2, Currency.fmt(transaction.amount), data_type=int)
+            fill_cell(self.acc_main_ui.transaction_table, i, 3, transaction.description, data_type=str)
+
     def close_balance(self):
         self.acc_main_ui.responsible_field.setStyleSheet("")
 
@@ -85,10 +95,14 @@ class MainController:
                     self.acc_main_ui.method_combobox.currentText(), self.security_handler.current_responsible.name,
                     description=f"Extracción al cierre de caja diaria del día {today}."
                 )
+                # The transactions without balance are bound by the repository, so the balance is summed again to
+                # include exactly the same transactions.
+                self.balance = self.transaction_repo.balance_summary()
                 # noinspection PyTypeChecker
-                api.close_balance(self.transaction_repo, self.balance_repo, self.balance, self._today_transactions,
-                                  today, self.security_handler.current_responsible.name, create_extraction_fn)
+                api.close_balance(self.transaction_repo, self.balance_repo, self.balance, None, today,
+                                  self.security_handler.current_responsible.name, create_extraction_fn)
 
+                self.acc_main_ui.page_index.reset()
                 self.acc_main_ui.transaction_table.setRowCount(0)
                 self.acc_main_ui.today_charges_line.setText(Currency.fmt(Currency(0)))
                 self.acc_main_ui.today_extractions_line.setText(Currency.fmt(Currency(0)))
@@ -110,20 +124,16 @@ class MainController:
         try:
             self.security_handler.current_responsible = self.acc_main_ui.responsible_field.value()
             # noinspection PyTypeChecker
-            extraction = api.extract(self.transaction_repo, date.today(), self.acc_main_ui.amount_line.value(),
-                                     self.acc_main_ui.method_combobox.currentData(Qt.UserRole),
-                                     self.security_handler.current_responsible.name, descr)
-
-            row = self.acc_main_ui.transaction_table.rowCount()
-            fill_cell(self.acc_main_ui.transaction_table, row, 0, extraction.responsible, data_type=str)
-            name = extraction.client.name if extraction.client is not None else "-"
-            fill_cell(self.acc_main_ui.transaction_table, row, 1, name, data_type=str)
-            fill_cell(self.acc_main_ui.transaction_table, row, 2, Currency.fmt(extraction.amount), data_type=int)
-            fill_cell(self.acc_main_ui.transaction_table, row, 3, extraction.description, data_type=str)
-
-            # Adds the extraction to the transactions of the day and recalculates the balance.
-            self._today_transactions.append(extraction)
-            self.balance, self._today_transactions = api.generate_balance(self._today_transactions)
+            api.extract(self.transaction_repo, date.today(), self.acc_main_ui.amount_line.value(),
+                        self.acc_main_ui.method_combobox.currentData(Qt.UserRole),
+                        self.security_handler.current_responsible.name, descr)
+
+            # The extraction is the newest transaction, so it is shown at the top of the first page.
+            self.acc_main_ui.page_index.reset()
+            self.fill_transaction_table()
+
+            # Recalculates the balance.
+            self.balance = self.transaction_repo.balance_summary()
             self.acc_main_ui.today_extractions_line.setText(
                 Currency.fmt(self.balance["Extracción"].get("Total", Currency(0)))
             )
@@ -247,6 +257,10 @@ class AccountingMainUI(QMainWindow):
                          columns={"Responsable": (.2, str), "Cliente": (.2, str), "Monto": (.12, int),
                                   "Descripción": (.48, str)}, min_rows_to_show=13)
 
+        # Index.
+        self.page_index = PageIndex(self)
+        self.layout.addWidget(self.page_index)
+
         self.setFixedWidth(self.minimumSizeHint().width())
 
         self.move(int(QDesktopWidget().geometry().center().x() - self.sizeHint().width() / 2),
@@ -26,11 +26,13 @@ class MainController:
         # Configure the filtering widget.
         filters = (TextLike("name", display_name="Nombre", attr="name",
                             translate_fun=lambda activity, value: activity.act_name.contains(value)),)
-        self.main_ui.filter_header.config(filters, on_search_click=self.fill_activity_table)
+        self.main_ui.filter_header.config(filters, on_search_click=self.fill_activity_table,
+                                          on_new_search=self.main_ui.page_index.reset)
 
         # Configures the page index.
         self.main_ui.page_index.config(refresh_table=self.main_ui.filter_header.on_search_click,
-                                       page_len=10, total_len=self.activity_repo.count())
+                                       page_len=10, total_len=self.activity_repo.count(),
+                                       page_key=self.activity_repo.page_key)
 
         # Fills the table.
         self.main_ui.filter_header.on_search_click()
@@ -62,7 +64,9 @@ class MainController:
         self.main_ui.activity_table.setRowCount(0)
 
         self.main_ui.page_index.total_len = self.activity_repo.count(filters)
-        for activity in self.activity_repo.all(self.main_ui.page_index.page, self.main_ui.page_index.page_len, filters):
+        page_index = self.main_ui.page_index
+        for activity in page_index.track(self.activity_repo.all(page_index.page, page_index.page_len, filters,
+                                                                page_index.after)):
             self._add_activity(activity, check_filters=False)  # Activities are filtered in the repo.
 
     def create_activity(self):
@@ -105,7 +109,6 @@ class MainController:
 
         if Dialog.confirm(f"¿Desea eliminar la actividad '{activity.name}'?"):
             self.activity_repo.remove(activity)
-            activity.removed = True
 
             self._activities.pop(self.main_ui.activity_table.currentRow())
             self.main_ui.filter_header.on_search_click()  # Refreshes the table.
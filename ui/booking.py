@@ -78,7 +78,6 @@ class MainController:
     def refresh_booking_info(self):
         row, col = self.main_ui.booking_table.currentRow(), self.main_ui.booking_table.currentColumn()
         if col in self._bookings and row in self._bookings[col]:
-            self.booking_system.update_prices(self.activity_repo)
             booking = self._bookings[col][row]
             self.main_ui.charge_btn.setEnabled(True)
             self.main_ui.cancel_btn.setEnabled(True)
@@ -574,11 +573,13 @@ class HistoryController:
             "to", display_name="Hasta", attr="when",
             translate_fun=lambda cancelled, datetime_: cancelled.cancel_datetime <= datetime_
         )
-        self.history_ui.filter_header.config(filters, self.fill_booking_table, date_greater_filter, date_lesser_filter)
+        self.history_ui.filter_header.config(filters, self.fill_booking_table, date_greater_filter, date_lesser_filter,
+                                             on_new_search=self.history_ui.page_index.reset)
 
         # Configures the page index.
         self.history_ui.page_index.config(refresh_table=self.history_ui.filter_header.on_search_click,
-                                          page_len=20, show_info=False)
+                                          page_len=20, show_info=False,
+                                          page_key=self.booking_system.repo.cancelled_page_key)
 
         # Fills the table.
         self.history_ui.filter_header.on_search_click()
@@ -586,9 +587,10 @@ class HistoryController:
     def fill_booking_table(self, filters: list[FilterValuePair]):
         self.history_ui.booking_table.setRowCount(0)
 
-        for row, cancelled in enumerate(self.booking_system.repo.cancelled(self.history_ui.page_index.page,
-                                                                           self.history_ui.page_index.page_len,
-                                                                           filters)):
+        page_index = self.history_ui.page_index
+        cancelled_it = self.booking_system.repo.cancelled(page_index.page, page_index.page_len, filters,
+                                                          page_index.after)
+        for row, cancelled in enumerate(page_index.track(cancelled_it)):
             fill_cell(self.history_ui.booking_table, row, 0,
                       cancelled.cancel_datetime.strftime(utils.DATE_TIME_FORMAT), bool)
             fill_cell(self.history_ui.booking_table, row, 1, cancelled.when.strftime(utils.DATE_FORMAT), bool)
@@ -50,12 +50,14 @@ class MainController:
 
         # Configure the filtering widget.
         filters = (TextLike("name", display_name="Nombre", attr="name",
-                            translate_fun=lambda client, value: client.cli_name.contains(value)),)
-        self.main_ui.filter_header.config(filters, on_search_click=self.fill_client_table)
+                            translate_fun=self.client_repo.name_match),)
+        self.main_ui.filter_header.config(filters, on_search_click=self.fill_client_table,
+                                          on_new_search=self.main_ui.page_index.reset)
 
         # Configures the page index.
         self.main_ui.page_index.config(refresh_table=self.main_ui.filter_header.on_search_click,
-                                       page_len=20, total_len=self.client_repo.count())
+                                       page_len=20, total_len=self.client_repo.count(),
+                                       page_key=self.client_repo.page_key)
 
         self.main_ui.all_charges.setChecked(True)  # By default, all months are displayed.
 
@@ -141,7 +143,9 @@ class MainController:
         self._enable_subscribe()
 
         self.main_ui.page_index.total_len = self.client_repo.count(filters)
-        for client in self.client_repo.all(self.main_ui.page_index.page, self.main_ui.page_index.page_len, filters):
+        page_index = self.main_ui.page_index
+        for client in page_index.track(self.client_repo.all(page_index.page, page_index.page_len, filters,
+                                                            page_index.after)):
             self._add_client(client, check_filters=False)  # Clients are filtered in the repo.
 
     def update_client_info(self):
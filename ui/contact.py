@@ -32,11 +32,12 @@ class MainController:
 
         # Configure the filtering widget.
         filters = (TextLike("name", display_name="Nombre", attr="name"),)
-        self.main_ui.filter_header.config(filters, on_search_click=self.fill_contact_table)
+        self.main_ui.filter_header.config(filters, on_search_click=self.fill_contact_table,
+                                          on_new_search=self.main_ui.page_index.reset)
 
         # Configures the page index.
         self.main_ui.page_index.config(refresh_table=self.main_ui.filter_header.on_search_click, page_len=20,
-                                       show_info=False)
+                                       show_info=False, page_key=self.contact_repo.page_key)
 
         # Fills the table.
         self.fill_contact_table([])
@@ -70,7 +71,9 @@ class MainController:
         self._contacts.clear()
 
         name = String(self.main_ui.filter_header.filter_line_edit.text())
-        for contact in self.contact_repo.all(self.main_ui.page_index.page, self.main_ui.page_index.page_len, name=name):
+        page_index = self.main_ui.page_index
+        for contact in page_index.track(self.contact_repo.all(page_index.page, page_index.page_len, name=name,
+                                                              after=page_index.after)):
             self._add_contact(contact, check_filters=False)  # Contacts are filtered in the repo.
 
     def update_description(self):
@@ -210,7 +213,7 @@ class CreateController:
 
         # Configure the filtering widget.
         filters = (TextLike("client_name", display_name="Nombre cliente", attr="name",
-                            translate_fun=lambda client, value: client.cli_name.contains(value)),)
+                            translate_fun=self.client_repo.name_match),)
         self.create_ui.filter_header.config(filters, self.fill_client_combobox, allow_empty_filter=False)
 
         # noinspection PyUnresolvedReferences
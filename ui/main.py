@@ -17,8 +17,8 @@ from gym_manager.booking.core import BookingSystem
 from gym_manager.contact.core import ContactRepo
 from gym_manager.core.base import String, Currency
 from gym_manager.core.persistence import (
-    ActivityRepo, ClientRepo, SubscriptionRepo, BalanceRepo, TransactionRepo)
-from gym_manager.core.security import SecurityHandler, Responsible
+    ActivityRepo, ClientRepo, SubscriptionRepo, BalanceRepo, TransactionRepo, ImportLog)
+from gym_manager.core.security import SecurityHandler, Responsible, SecurityRepo
 from gym_manager.stock.core import ItemRepo
 from ui import utils
 from ui.accounting import AccountingMainUI, BalanceHistoryUI
@@ -133,7 +133,8 @@ class Controller:
             item_repo: ItemRepo,
             security_handler: SecurityHandler,
             allow_passed_time_modifications: bool = False,
-            backup_fn: Callable = None
+            backup_fn: Callable = None,
+            import_log: ImportLog | None = None
     ):
         self.main_ui = main_ui
         self.client_repo = client_repo
@@ -146,6 +147,7 @@ class Controller:
         self.item_repo = item_repo
         self.security_handler = security_handler
         self.backup_fn = backup_fn
+        self.import_log = import_log
 
         # Sets callbacks
         # noinspection PyUnresolvedReferences
@@ -179,10 +181,17 @@ class Controller:
             self._backup_ui = LoadBackupFromOld()
             self._backup_ui.setWindowModality(Qt.ApplicationModal)
             self._backup_ui.exec_()
-            if self._backup_ui.confirmed:
+            if not self._backup_ui.confirmed:
+                return
+            stats = parsing.dry_run(self._backup_ui.path, self._backup_ui.since)
+            question = (f"Se importarán {stats.written['clients']} clientes, {stats.written['subscriptions']} "
+                        f"inscripciones y {stats.written['charges']} cobros. Filas rechazadas del respaldo: "
+                        f"{sum(stats.rejected.values())}. Tiempo estimado: {stats.projected_duration:.0f} segundos. "
+                        f"¿Desea continuar?")
+            if Dialog.confirm(question):
                 parsing.parse(self.activity_repo, self.client_repo, self.subscription_repo, self.transaction_repo,
                               self.balance_repo, since=self._backup_ui.since, backup_path=self._backup_ui.path,
-                              contact_repo=self.contact_repo)
+                              contact_repo=self.contact_repo, import_log=self.import_log)
                 if len(self._backup_ui.booking_path) != 0:
                     parsing.load_bookings(self.booking_system, self._backup_ui.booking_path)
 
@@ -284,13 +293,14 @@ class MainUI(QMainWindow):
             security_handler: SecurityHandler,
             enable_tools: bool = False,
             allow_passed_time_modifications: bool = False,
-            backup_fn: Callable = None
+            backup_fn: Callable = None,
+            import_log: ImportLog | None = None
     ):
         super().__init__()
         self._setup_ui(enable_tools)
         self.controller = Controller(self, client_repo, activity_repo, subscription_repo, transaction_repo,
                                      balance_repo, booking_system, contact_repo, item_repo, security_handler,
-                                     allow_passed_time_modifications, backup_fn)
+                                     allow_passed_time_modifications, backup_fn, import_log)
 
     def _setup_ui(self, enable_tools: bool):
         self.setWindowTitle("Gestor La Cascada")
@@ -454,29 +464,36 @@ class ActionController:
         config_combobox(self.action_ui.action_combobox)
 
         # Configures the page index.
-        self.action_ui.page_index.config(refresh_table=self.fill_action_table, page_len=20, show_info=False)
+        self.action_ui.page_index.config(refresh_table=self.fill_action_table, page_len=20, show_info=False,
+                                         page_key=SecurityRepo.page_key)
 
+        # Fills the table with the first page.
         self.enable_filtering()
 
-        # Fills the table.
-        self.fill_action_table()
-
         # noinspection PyUnresolvedReferences
-        self.action_ui.action_combobox.currentIndexChanged.connect(self.fill_action_table)
+        self.action_ui.action_combobox.currentIndexChanged.connect(self.search_actions)
         # noinspection PyUnresolvedReferences
         self.action_ui.filter_checkbox.stateChanged.connect(self.enable_filtering)
 
     def enable_filtering(self):
         self.action_ui.action_combobox.setEnabled(self.action_ui.filter_checkbox.isChecked())
+        self.search_actions()
+
+    def search_actions(self):
+        """Fills the table with the first page of the actions that pass the new filter.
+        """
+        self.action_ui.page_index.reset()
         self.fill_action_table()
 
     def fill_action_table(self):
         self.action_ui.action_table.setRowCount(0)
 
         tag = self.action_ui.action_combobox.currentData(Qt.UserRole)[1]
-        actions_it = self.security_handler.actions(self.action_ui.page_index.page, self.action_ui.page_index.page_len,
-                                                   tag=tag if self.action_ui.filter_checkbox.isChecked() else None)
-        for row, (when, resp, _, action_name) in enumerate(actions_it):
+        page_index = self.action_ui.page_index
+        actions_it = self.security_handler.actions(page_index.page, page_index.page_len,
+                                                   tag=tag if self.action_ui.filter_checkbox.isChecked() else None,
+                                                   after=page_index.after)
+        for row, (when, resp, _, action_name) in enumerate(page_index.track(actions_it)):
             fill_cell(self.action_ui.action_table, row, 0, when.strftime(utils.DATE_TIME_FORMAT), bool)
             fill_cell(self.action_ui.action_table, row, 1, resp.name, str)
             fill_cell(self.action_ui.action_table, row, 2, action_name, str)
@@ -545,18 +562,16 @@ class ChargesController:
             Dialog.info("Error", "No hay actividades registradas.")
         else:
             activity = self.charges_ui.activity_combobox.currentData(Qt.UserRole)
+            when = self.charges_ui.date_edit.date().toPyDate()
 
-            total = Currency(0)
-            for row, charge in enumerate(
-                    self.transaction_repo.charges_by_activity(activity, self.charges_ui.date_edit.date().toPyDate())
-            ):
+            for row, charge in enumerate(self.transaction_repo.charges_by_activity(activity, when)):
                 name = charge.client.name if charge.client is not None else "-"
                 fill_cell(self.charges_ui.charge_table, row, 0, name, data_type=str)
                 fill_cell(self.charges_ui.charge_table, row, 1, charge.responsible, data_type=str)
                 fill_cell(self.charges_ui.charge_table, row, 2, Currency.fmt(charge.amount), data_type=int)
-                total.increase(charge.amount)
 
-            self.charges_ui.total_line.setText(Currency.fmt(total))
+            self.charges_ui.total_line.setText(Currency.fmt(self.transaction_repo.charges_total_by_activity(activity,
+                                                                                                          when)))
 
 
 class ChargesByMonthUI(QMainWindow):
@@ -36,11 +36,12 @@ class MainController:
 
         # Configure the filtering widget.
         filters = (TextLike("name", display_name="Nombre", attr="name"),)
-        self.main_ui.filter_header.config(filters, on_search_click=self.fill_item_table)
+        self.main_ui.filter_header.config(filters, on_search_click=self.fill_item_table,
+                                          on_new_search=self.main_ui.page_index.reset)
 
         # Configures the page index.
         self.main_ui.page_index.config(refresh_table=self.main_ui.filter_header.on_search_click, page_len=40,
-                                       show_info=False)
+                                       show_info=False, page_key=self.item_repo.page_key)
 
         # Fills the table.
         self.main_ui.filter_header.on_search_click()
@@ -85,7 +86,9 @@ class MainController:
     def fill_item_table(self, filters: list[FilterValuePair]):
         self.main_ui.item_table.setRowCount(0)
 
-        for item in self.item_repo.all(self.main_ui.page_index.page, self.main_ui.page_index.page_len, filters):
+        page_index = self.main_ui.page_index
+        for item in page_index.track(self.item_repo.all(page_index.page, page_index.page_len, filters,
+                                                        page_index.after)):
             self._add_item(item, check_filters=False)  # Activities are filtered in the repo.
 
     def create_item(self):
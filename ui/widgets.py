@@ -1,16 +1,17 @@
 from __future__ import annotations
 
 from datetime import date, datetime, time
-from typing import Type, Any, Callable
+from typing import Type, Any, Callable, Iterable, Generator
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QEvent, QTimer
 from PyQt5.QtWidgets import (
     QLineEdit, QWidget, QTextEdit, QHBoxLayout, QComboBox, QDialog, QVBoxLayout, QLabel,
     QPushButton, QDateEdit, QSpacerItem, QSizePolicy, QFrame)
 
 from gym_manager.core.base import Validatable, ValidationError, String, Filter, ONE_MONTH_TD, DateGreater, DateLesser
-from gym_manager.core.persistence import FilterValuePair
+from gym_manager.core.persistence import FilterValuePair, PageKey
 from gym_manager.core.security import SecurityHandler, SecurityError
+from gym_manager.warmup import WarmUp
 from ui import utils
 from ui.utils import MESSAGE
 from ui.widget_config import (
@@ -96,23 +97,24 @@ class FilterHeader(QWidget):
         self._date_lesser_filter: DateLesser | None = None
 
         self._on_search_click: Callable[[list[FilterValuePair]], None] | None = None
+        self._on_new_search: Callable[[], None] | None = None
         self.allow_empty_filter: bool = True
 
         # noinspection PyUnresolvedReferences
-        self.search_btn.clicked.connect(self.on_search_click)
+        self.search_btn.clicked.connect(self.on_new_search)
         # noinspection PyUnresolvedReferences
         self.clear_filter_btn.clicked.connect(self.on_clear_click)
         # noinspection PyUnresolvedReferences
-        self.filter_line_edit.returnPressed.connect(self.on_search_click)
+        self.filter_line_edit.returnPressed.connect(self.on_new_search)
         if date_greater_filtering:
             # noinspection PyUnresolvedReferences
-            self.from_date_edit.dateChanged.connect(self.on_search_click)
+            self.from_date_edit.dateChanged.connect(self.on_new_search)
         if date_lesser_filtering:
             # noinspection PyUnresolvedReferences
-            self.to_date_edit.dateChanged.connect(self.on_search_click)
+            self.to_date_edit.dateChanged.connect(self.on_new_search)
         if detect_text_change:
             # noinspection PyUnresolvedReferences
-            self.filter_line_edit.textChanged.connect(self.on_search_click)
+            self.filter_line_edit.textChanged.connect(self.on_new_search)
 
     def _setup_ui(self, date_greater_filtering: bool, date_lesser_filtering: bool, show_clear_button: bool):
         self.layout = QHBoxLayout(self)
@@ -187,8 +189,16 @@ class FilterHeader(QWidget):
             on_search_click: Callable[[list[FilterValuePair]], None],
             date_greater_filter: DateGreater | None = None,
             date_lesser_filter: DateLesser | None = None,
-            allow_empty_filter: bool = True
+            allow_empty_filter: bool = True,
+            on_new_search: Callable[[], None] | None = None
     ):
+        """Configures the filters.
+
+        Args:
+            on_search_click: function that fills the table with the rows that pass the given filters.
+            on_new_search: function called before a search done by the user with new filters, so for example the
+                PageIndex of the table goes back to the first page.
+        """
         # Some checks to ensure that date filters are set in case their corresponding flags were True.
         if self.from_lbl is None and date_greater_filter is not None:
             raise AttributeError("date_greater_filtering flag was False, but a DateGreater filter was configured.")
@@ -207,6 +217,7 @@ class FilterHeader(QWidget):
         self.allow_empty_filter = allow_empty_filter
 
         self._on_search_click = on_search_click
+        self._on_new_search = on_new_search
 
     def set_filter(self, name: str, value: str):
         self.filter_combobox.setCurrentIndex(self._filter_number[name])
@@ -258,9 +269,16 @@ class FilterHeader(QWidget):
             else:
                 self._on_search_click(self._generate_filters(from_date, to_date))
 
+    def on_new_search(self):
+        if self._on_new_search is not None:
+            self._on_new_search()
+        self.on_search_click()
+
     def on_clear_click(self):
         if self._on_search_click is None:
             raise AttributeError("Function 'on_search_click' was not defined.")
+        if self._on_new_search is not None:
+            self._on_new_search()
         self.filter_line_edit.clear()
         if self.from_date_edit is not None:
             self.from_date_edit.setDate(date.today() - ONE_MONTH_TD)
@@ -428,6 +446,8 @@ class PageIndex(QWidget):
         + Call (BEFORE FILLING THE TABLE IN DISPLAY) the method config(args). Pass the Callable to run when changing page, the page length, and the total length.
         + Inside the method that fills the table in display, set the PageIndex total_len property with the amount of expected rows (with the active filters applied).
         + If it is possible to add or remove rows manually, after each of these actions update the PageIndex total_len property accordingly.
+        + To paginate with keys instead of offsets, pass the page_key Callable of the repository in config(args), query the page with the PageIndex after property, and iterate the retrieved rows through track(rows).
+        + Before filling the table with new filters, call reset(). If the filters come from a FilterHeader, pass reset as its on_new_search Callable.
         """
 
     def __init__(self, parent: QWidget | None = None):
@@ -438,6 +458,11 @@ class PageIndex(QWidget):
 
         self._refresh_table: Callable[[], None] | None = None
 
+        # self._keys[i] is the key of the last row before page i + 1.
+        self._page_key: Callable[[Any], PageKey] | None = None
+        self._keys: list[PageKey | None] = [None]
+        self._last_key: PageKey | None = None
+
         # noinspection PyUnresolvedReferences
         self.prev_btn.clicked.connect(self.on_prev_clicked)
         # noinspection PyUnresolvedReferences
@@ -482,9 +507,27 @@ class PageIndex(QWidget):
         self._total_len = total_len
         self._update()
 
-    def config(self, refresh_table: Callable[[], None], page_len: int, total_len: int = 0, show_info: bool = True):
+    @property
+    def after(self) -> PageKey | None:
+        """Key of the last row before the current page, or None if there is no key for it.
+        """
+        return self._keys[self.page - 1] if self.page <= len(self._keys) else None
+
+    def track(self, rows: Iterable[Any]) -> Generator[Any, None, None]:
+        """Yields the *rows* of the current page, keeping the key of the last one so the next page starts after it.
+        """
+        for row in rows:
+            if self._page_key is not None:
+                self._last_key = self._page_key(row)
+            yield row
+
+    def config(
+            self, refresh_table: Callable[[], None], page_len: int, total_len: int = 0, show_info: bool = True,
+            page_key: Callable[[Any], PageKey] | None = None
+    ):
         self.page_len, self.total_len = page_len, total_len if total_len != 0 else float("inf")
         self._refresh_table = refresh_table
+        self._page_key = page_key
 
         if not show_info:
             self.info_lbl.hide()
@@ -492,6 +535,16 @@ class PageIndex(QWidget):
 
         self._update()
 
+    def reset(self):
+        """Goes back to the first page and forgets the keys of the visited pages. Call it before filling the table with
+        new filters, so the first page of the new results doesn't start after a key of the previous ones.
+        """
+        self.page = 1
+        self._keys = [None]
+        self._last_key = None
+        if self.page_len is not None:
+            self._update()
+
     def _update(self):
         roof = self.page * self.page_len if self.page * self.page_len < self.total_len else self.total_len
         self.info_lbl.setText(f"{(self.page - 1) * self.page_len + 1} - {roof}, de {self.total_len}")
@@ -512,6 +565,37 @@ class PageIndex(QWidget):
         if self.page_len is None or self.total_len is None or self._refresh_table is None:
             raise AttributeError("PageIndex widget was not configured.")
 
+        if self._page_key is not None:
+            del self._keys[self.page:]
+            self._keys.append(self._last_key)
         self.page += 1
         self._update()
         self._refresh_table()
+
+
+class PauseOnInput(QObject):
+    """Application event filter that pauses the *warm_up* while the user input is handled.
+
+    The warm-up is resumed by a timer of the main thread, that fires *quiet_ms* after the last input once the event loop
+    is idle again, so no warm-up step runs while the handler of an input is running. Releases pause the warm-up too,
+    because buttons run their actions on release, which may come after the timer fired if a press is held.
+    """
+
+    INPUT_EVENTS = frozenset({QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick,
+                              QEvent.KeyPress, QEvent.KeyRelease, QEvent.Wheel, QEvent.Shortcut})
+
+    def __init__(self, warm_up: WarmUp, quiet_ms: int = 500, parent: QObject | None = None):
+        super().__init__(parent)
+        self.warm_up = warm_up
+
+        self._resume_timer = QTimer(self)
+        self._resume_timer.setSingleShot(True)
+        self._resume_timer.setInterval(quiet_ms)
+        # noinspection PyUnresolvedReferences
+        self._resume_timer.timeout.connect(warm_up.resume)
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() in self.INPUT_EVENTS and not self.warm_up.done:
+            self.warm_up.pause()
+            self._resume_timer.start()
+        return False